@@ -1,18 +1,25 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from .models import Tenant, User
+
+
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    """Админка для арендаторов"""
+    list_display = ('name', 'slug', 'created_at')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     """Админка для пользователей"""
-    list_display = ('email', 'username', 'first_name', 'last_name', 'is_active', 'is_staff', 'created_at')
-    list_filter = ('is_active', 'is_staff', 'is_superuser', 'created_at')
+    list_display = ('email', 'username', 'first_name', 'last_name', 'tenant', 'is_active', 'is_staff', 'created_at')
+    list_filter = ('tenant', 'is_active', 'is_staff', 'is_superuser', 'created_at')
     search_fields = ('email', 'username', 'first_name', 'last_name')
     ordering = ('-created_at',)
     
     fieldsets = (
-        (None, {'fields': ('email', 'username', 'password')}),
+        (None, {'fields': ('tenant', 'email', 'username', 'password')}),
         ('Персональная информация', {'fields': ('first_name', 'last_name')}),
         ('Права доступа', {'fields': ('is_active', 'is_staff', 'is_superuser')}),
         ('Важные даты', {'fields': ('last_login', 'date_joined', 'created_at', 'updated_at')}),
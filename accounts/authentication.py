@@ -0,0 +1,106 @@
+"""JWT-аутентификация с привязкой токена к арендатору."""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from backend.profiling import phase
+
+TENANT_CLAIM = 'tenant_id'
+
+
+def tokens_for_user(user):
+    """Пара JWT-токенов; арендатор пользователя записывается в claim."""
+    refresh = RefreshToken.for_user(user)
+    # Access-токен копирует claims refresh-токена.
+    refresh[TENANT_CLAIM] = user.tenant_id
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication, отклоняющая токены другого арендатора.
+
+    Арендатор запроса - ``request.user.tenant_id``; если пользователя
+    перевели к другому арендатору, выданные раньше токены перестают
+    действовать. Токены без claim арендатора не принимаются.
+    """
+
+    def authenticate(self, request):
+        with phase('auth'):
+            return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        """authenticate для асинхронных view (пользователь - async ORM)."""
+        with phase('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        self._check_tenant(user, validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        """Асинхронный get_user с теми же проверками, что в simplejwt."""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification')
+            ) from e
+
+        try:
+            user = await self.user_model.objects.aget(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(
+                _('User not found'), code='user_not_found'
+            ) from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(
+                _('User is inactive'), code='user_inactive'
+            )
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."),
+                    code='password_changed'
+                )
+
+        self._check_tenant(user, validated_token)
+        return user
+
+    def _check_tenant(self, user, validated_token):
+        tenant_id = validated_token.get(TENANT_CLAIM)
+        if tenant_id is None:
+            raise AuthenticationFailed(
+                'Токен не привязан к арендатору',
+                code='tenant_missing'
+            )
+        if tenant_id != user.tenant_id:
+            raise AuthenticationFailed(
+                'Токен выдан для другого арендатора',
+                code='tenant_mismatch'
+            )
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_default_tenant(apps, schema_editor):
+    Tenant = apps.get_model('accounts', 'Tenant')
+    User = apps.get_model('accounts', 'User')
+    tenant, _ = Tenant.objects.get_or_create(
+        slug=settings.DEFAULT_TENANT_SLUG,
+        defaults={'name': settings.DEFAULT_TENANT_SLUG}
+    )
+    User.objects.filter(tenant__isnull=True).update(tenant=tenant)
+
+
+class Migration(migrations.Migration):
+    # Данные отдельно от схемы: на PostgreSQL ALTER TABLE в одной
+    # транзакции с UPDATE строк с отложенными внешними ключами падает с
+    # "pending trigger events".
+
+    dependencies = [
+        ('accounts', '0002_tenants'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_tenant, migrations.RunPython.noop),
+    ]
@@ -3,12 +3,62 @@ from django.contrib.auth.hashers import (
     check_password as django_check_password,
     make_password,
 )
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from backend.metrics import Histogram
+from backend.profiling import phase
+
+PASSWORD_SECONDS = Histogram(
+    'auth_password_seconds',
+    'Хеширование (hash) и проверка (check) паролей.',
+    ('operation',)
+)
+
+
+class Tenant(models.Model):
+    """Клиент (арендатор): свои пользователи, роли и правила доступа."""
+    name = models.CharField(max_length=100, verbose_name='Название')
+    slug = models.SlugField(
+        max_length=50,
+        unique=True,
+        verbose_name='Идентификатор'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+
+    class Meta:
+        verbose_name = 'Арендатор'
+        verbose_name_plural = 'Арендаторы'
+        db_table = 'tenants'
+        ordering = ['slug']
+
+    def __str__(self):
+        return self.name
+
+
+def get_default_tenant_id():
+    """Арендатор для объектов, созданных без явного указания."""
+    tenant, _ = Tenant.objects.get_or_create(
+        slug=settings.DEFAULT_TENANT_SLUG,
+        defaults={'name': settings.DEFAULT_TENANT_SLUG}
+    )
+    return tenant.pk
+
 
 class User(AbstractUser):
     """Кастомная модель пользователя."""
+    # tenant_id - первая колонка индекса users_tenant_email_idx.
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.PROTECT,
+        related_name='users',
+        db_index=False,
+        verbose_name='Арендатор'
+    )
     email = models.EmailField(unique=True, verbose_name='Email')
     first_name = models.CharField(max_length=150, verbose_name='Имя')
     last_name = models.CharField(max_length=150, verbose_name='Фамилия')
@@ -32,16 +82,29 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         db_table = 'users'
+        indexes = [
+            # Пользователи арендатора.
+            models.Index(
+                fields=['tenant', 'email'],
+                name='users_tenant_email_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.email} ({self.get_full_name()})"
 
+    def save(self, *args, **kwargs):
+        if self.tenant_id is None:
+            self.tenant_id = get_default_tenant_id()
+        super().save(*args, **kwargs)
+
     def set_password(self, raw_password):
         """Хеширование пароля с помощью bcrypt."""
         if raw_password:
             # Используем bcrypt для хеширования
-            salt = bcrypt.gensalt()
-            hashed = bcrypt.hashpw(raw_password.encode('utf-8'), salt)
+            with phase('password'), PASSWORD_SECONDS.time(operation='hash'):
+                salt = bcrypt.gensalt()
+                hashed = bcrypt.hashpw(raw_password.encode('utf-8'), salt)
             # Сохраняем с префиксом для идентификации
             self.password = f'bcrypt${hashed.decode("utf-8")}'
         else:
@@ -52,16 +115,16 @@ class User(AbstractUser):
         if not raw_password:
             return False
 
-        # Проверяем, используется ли bcrypt
-        if self.password.startswith('bcrypt$'):
-            try:
-                hashed = self.password.replace('bcrypt$', '')
-                return bcrypt.checkpw(
-                    raw_password.encode('utf-8'),
-                    hashed.encode('utf-8')
-                )
-            except (ValueError, AttributeError):
-                return False
-        else:
+        with phase('password'), PASSWORD_SECONDS.time(operation='check'):
+            # Проверяем, используется ли bcrypt
+            if self.password.startswith('bcrypt$'):
+                try:
+                    hashed = self.password.replace('bcrypt$', '')
+                    return bcrypt.checkpw(
+                        raw_password.encode('utf-8'),
+                        hashed.encode('utf-8')
+                    )
+                except (ValueError, AttributeError):
+                    return False
             # Используем стандартный метод Django
             return django_check_password(raw_password, self.password)
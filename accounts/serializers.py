@@ -2,11 +2,17 @@ from rest_framework import serializers
 
 from permissions.models import Role, UserRole
 
-from .models import User
+from .models import Tenant, User
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Сериализатор для регистрации пользователя."""
+    # Без указания пользователь попадает к арендатору по умолчанию.
+    tenant = serializers.SlugRelatedField(
+        slug_field='slug',
+        queryset=Tenant.objects.all(),
+        required=False
+    )
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True, min_length=8)
 
@@ -17,6 +23,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             'username',
             'first_name',
             'last_name',
+            'tenant',
             'password',
             'password_confirm'
         )
@@ -56,10 +63,11 @@ class UserSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'is_active',
+            'tenant',
             'roles',
             'created_at'
         )
-        read_only_fields = ('id', 'created_at')
+        read_only_fields = ('id', 'tenant', 'created_at')
 
     def get_roles(self, obj):
         """Получить роли пользователя."""
@@ -1,10 +1,21 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from backend.cache import rbac_cache
+from permissions.authorization import (
+    _compute_effective_permissions,
+    get_effective_permissions,
+    get_permissions_version,
+)
+from permissions.models import AccessRoleRule, BusinessElement, Role, UserRole
 
-from permissions.models import BusinessElement, Role, UserRole
+from .models import Tenant
 
 User = get_user_model()
 
@@ -174,6 +185,56 @@ class UserLoginTest(TestCase):
         self.assertIn('email', response.data)
 
 
+class TenantTokenTest(TestCase):
+    """Тесты привязки JWT-токенов к арендатору."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        self.client = APIClient()
+        self.tenant = Tenant.objects.create(name='Acme', slug='acme')
+        self.user = User.objects.create_user(
+            email='tenant@example.com',
+            username='tenantuser',
+            first_name='Tenant',
+            last_name='User',
+            password='tenantpass123',
+            tenant=self.tenant
+        )
+
+    def _access_token(self):
+        response = self.client.post(reverse('accounts:login'), {
+            'email': 'tenant@example.com',
+            'password': 'tenantpass123'
+        })
+        return response.data['tokens']['access']
+
+    def test_token_contains_tenant(self):
+        """Access-токен содержит арендатора пользователя."""
+        token = AccessToken(self._access_token())
+        self.assertEqual(token['tenant_id'], self.tenant.id)
+
+    def test_token_of_other_tenant_rejected(self):
+        """После смены арендатора старый токен не принимается."""
+        access = self._access_token()
+        self.client.logout()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['tenant'], self.tenant.id)
+
+        self.user.tenant = Tenant.objects.create(name='Other', slug='other')
+        self.user.save()
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_without_tenant_rejected(self):
+        """Токен без claim арендатора не принимается."""
+        access = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
 class UserLogoutTest(TestCase):
     """Тесты для выхода пользователя."""
 
@@ -240,3 +301,118 @@ class UserProfileTest(TestCase):
         """Тест получения профиля неаутентифицированного пользователя."""
         response = self.client.get(self.profile_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UserPermissionsTest(TestCase):
+    """Тесты для эффективных прав текущего пользователя."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.client = APIClient()
+        self.url = reverse('accounts:profile-permissions')
+        self.user = User.objects.create_user(
+            email='perms@example.com',
+            username='permsuser',
+            first_name='Perms',
+            last_name='User',
+            password='permspass123'
+        )
+        self.reader = Role.objects.create(name='Reader')
+        self.editor = Role.objects.create(name='Editor')
+        self.element = BusinessElement.objects.create(name='orders')
+        AccessRoleRule.objects.create(
+            role=self.reader,
+            element=self.element,
+            read_all_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=self.editor,
+            element=self.element,
+            update_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=self.reader)
+        UserRole.objects.create(user=self.user, role=self.editor)
+
+    def test_permissions_merged_across_roles(self):
+        """Права объединяются по всем ролям пользователя."""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        orders = response.data['permissions']['orders']
+        self.assertTrue(orders['read_all_permission'])
+        self.assertTrue(orders['update_permission'])
+        self.assertFalse(orders['read_permission'])
+        self.assertFalse(orders['delete_all_permission'])
+        self.assertEqual(len(orders), 7)
+
+    def test_permissions_computed_in_one_query(self):
+        """Права вычисляются одним агрегирующим запросом."""
+        with self.assertNumQueries(1):
+            _compute_effective_permissions(self.user)
+
+    def test_not_modified_with_etag(self):
+        """Повторная проверка с ETag дает 304."""
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_version_changes_on_role_removal(self):
+        """Удаление роли меняет версию и права."""
+        self.client.force_authenticate(user=self.user)
+        first = self.client.get(self.url)
+        UserRole.objects.filter(user=self.user, role=self.editor).delete()
+        # QuerySet.delete() отправляет post_delete для каждой записи.
+        second = self.client.get(self.url)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertFalse(
+            second.data['permissions']['orders']['update_permission']
+        )
+
+    def test_permissions_reread_when_version_changes(self):
+        """Права, изменившиеся во время чтения, не уходят под новым ETag."""
+        calls = []
+
+        def load(user):
+            permissions = get_effective_permissions(user)
+            if not calls:
+                # Роль снимается после чтения прав, но до повторного
+                # чтения версии.
+                UserRole.objects.filter(
+                    user=self.user, role=self.editor
+                ).delete()
+            calls.append(permissions)
+            return permissions
+
+        self.client.force_authenticate(user=self.user)
+        with mock.patch(
+            'accounts.views.get_effective_permissions', side_effect=load
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            response['ETag'],
+            f'"{self.user.pk}-{get_permissions_version(self.user)}"'
+        )
+        self.assertFalse(
+            response.data['permissions']['orders']['update_permission']
+        )
+
+    def test_no_etag_while_version_keeps_changing(self):
+        """Если версия не устоялась, ответ уходит без ETag."""
+        self.client.force_authenticate(user=self.user)
+        versions = iter(range(10))
+        with mock.patch(
+            'accounts.views.get_permissions_version',
+            side_effect=lambda user: str(next(versions))
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+        self.assertIsNone(response.data['version'])
+
+    def test_permissions_unauthenticated(self):
+        """Неаутентифицированный пользователь получает 401."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
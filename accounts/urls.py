@@ -1,5 +1,11 @@
 from django.urls import path
-from .views import RegisterView, login_view, logout_view, user_profile
+from .views import (
+    RegisterView,
+    login_view,
+    logout_view,
+    user_permissions,
+    user_profile,
+)
 
 app_name = 'accounts'
 
@@ -8,5 +14,10 @@ urlpatterns = [
     path('login/', login_view, name='login'),
     path('logout/', logout_view, name='logout'),
     path('profile/', user_profile, name='profile'),
+    path(
+        'profile/permissions/',
+        user_permissions,
+        name='profile-permissions'
+    ),
 ]
 
@@ -1,10 +1,33 @@
+from django.conf import settings
 from django.contrib.auth import login, logout
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import (
+    TokenRefreshView as BaseTokenRefreshView,
+)
 
+from backend.cache import rbac_cache
+from backend.db_router import fresh_reads, replica_reads
+from backend.metrics import Counter, Histogram
+from permissions.authorization import (
+    get_effective_permissions,
+    get_permissions_version,
+)
+from permissions.flags import unpack
+from permissions.versions import (
+    CATALOG,
+    get_version,
+    tenant_scope,
+    user_scope,
+)
+
+from .authentication import tokens_for_user
 from .models import User
 from .serializers import (
     LoginSerializer,
@@ -12,6 +35,30 @@ from .serializers import (
     UserSerializer,
 )
 
+# Сколько раз перечитывать права, если их версия меняется во время чтения.
+PERMISSIONS_READ_ATTEMPTS = 3
+
+LOGINS = Counter(
+    'auth_login_total', 'Попытки входа по результату.', ('result',)
+)
+LOGIN_DURATION = Histogram(
+    'auth_login_duration_seconds',
+    'Длительность входа, включая проверку пароля.'
+)
+REGISTRATIONS = Counter(
+    'auth_register_total', 'Попытки регистрации по результату.', ('result',)
+)
+LOGOUTS = Counter('auth_logout_total', 'Выходы из системы.')
+TOKEN_REFRESHES = Counter(
+    'auth_token_refresh_total',
+    'Обновления access-токена по результату.',
+    ('result',)
+)
+
+
+def _result(response):
+    return 'success' if response.status_code < 400 else 'failure'
+
 
 class RegisterView(generics.CreateAPIView):
     """Регистрация нового пользователя."""
@@ -21,18 +68,17 @@ class RegisterView(generics.CreateAPIView):
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except ValidationError:
+            REGISTRATIONS.inc(result='failure')
+            raise
         user = serializer.save()
-
-        # Генерируем JWT токены
-        refresh = RefreshToken.for_user(user)
+        REGISTRATIONS.inc(result='success')
 
         return Response({
             'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            },
+            'tokens': tokens_for_user(user),
             'message': 'Пользователь успешно зарегистрирован'
         }, status=status.HTTP_201_CREATED)
 
@@ -41,23 +87,24 @@ class RegisterView(generics.CreateAPIView):
 @permission_classes([AllowAny])
 def login_view(request):
     """Вход в систему."""
+    with LOGIN_DURATION.time():
+        response = _login(request)
+    LOGINS.inc(result=_result(response))
+    return response
+
+
+def _login(request):
     serializer = LoginSerializer(data=request.data)
 
     if serializer.is_valid():
         user = serializer.validated_data['user']
 
-        # Генерируем JWT токены
-        refresh = RefreshToken.for_user(user)
-
         # Опционально: используем сессии Django
         login(request, user)
 
         response = Response({
             'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            },
+            'tokens': tokens_for_user(user),
             'message': 'Успешный вход в систему'
         }, status=status.HTTP_200_OK)
 
@@ -92,6 +139,7 @@ def logout_view(request):
 
     # Выход из сессии Django
     logout(request)
+    LOGOUTS.inc()
 
     response = Response({
         'message': 'Успешный выход из системы'
@@ -107,5 +155,70 @@ def logout_view(request):
 @permission_classes([IsAuthenticated])
 def user_profile(request):
     """Получить профиль текущего пользователя."""
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    user = request.user
+    # Профиль меняется вместе с пользователем, его ролями и их названиями.
+    key = (
+        f'rbac:profile:{user.pk}:{user.updated_at.timestamp()}:'
+        f'{get_version(user_scope(user.pk))}:'
+        f'{get_version(tenant_scope(CATALOG, user.tenant_id))}'
+    )
+
+    def load():
+        with replica_reads(user), fresh_reads(
+            user_scope(user.pk), tenant_scope(CATALOG, user.tenant_id)
+        ):
+            return dict(UserSerializer(user).data)
+
+    data = rbac_cache.get_or_load(
+        key, load, settings.AUTHORIZATION_CACHE_TIMEOUT
+    )
+    return Response(data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def user_permissions(request):
+    """Эффективные права текущего пользователя по бизнес-элементам."""
+    user = request.user
+    # Версия читается до и после загрузки прав. Если она изменилась (права
+    # поменялись параллельно или при пересчете истекших назначений ролей),
+    # права перечитываются: иначе старые права ушли бы под новым ETag.
+    version = get_permissions_version(user)
+    for _ in range(PERMISSIONS_READ_ATTEMPTS):
+        with replica_reads(user):
+            permissions = get_effective_permissions(user)
+        loaded, version = version, get_permissions_version(user)
+        if loaded == version:
+            break
+    else:
+        # Права все время менялись: ответ без версии не кэшируется.
+        version = None
+    etag = f'"{user.pk}-{version}"' if version is not None else None
+
+    if etag and etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response({
+            'version': version,
+            'permissions': {
+                element: unpack(mask)
+                for element, mask in sorted(permissions.items())
+            },
+        }, status=status.HTTP_200_OK)
+
+    if etag:
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+class TokenRefreshView(BaseTokenRefreshView):
+    """Обновление access-токена по refresh-токену."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        TOKEN_REFRESHES.inc(result=_result(response))
+        return response
@@ -0,0 +1,306 @@
+"""
+Двухуровневый кэш для данных авторизации.
+
+L1 - словарь в памяти процесса (LRU с ограничением размера и TTL),
+L2 - общий для всех процессов backend кэша Django (RBAC_CACHE_ALIAS).
+
+``get_or_load`` защищает от лавины запросов на холодный ключ: внутри
+процесса загрузку выполняет один поток, между процессами - тот, кто взял
+блокировку в L2, остальные ждут появления значения. Перед истечением
+срока значение с небольшой вероятностью пересчитывается заранее
+(probabilistic early expiration), чтобы записи не истекали одновременно.
+
+Ключи данных RBAC содержат версию (см. permissions.versions), поэтому
+записи L1 не нужно инвалидировать: после смены версии они просто не
+читаются и вытесняются по LRU.
+"""
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import Counter, Gauge, Histogram
+
+# value - данные, expires - время истечения (time.time()),
+# delta - сколько секунд заняла загрузка.
+Entry = namedtuple('Entry', ('value', 'expires', 'delta'))
+
+CACHE_LOADS = Counter(
+    'rbac_cache_loads_total', 'Загрузки данных RBAC из БД при промахе кэша.'
+)
+CACHE_LOAD_SECONDS = Histogram(
+    'rbac_cache_load_seconds', 'Длительность загрузки данных RBAC из БД.'
+)
+
+
+class LocalCache:
+    """Потокобезопасный LRU-кэш процесса с TTL записей."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Call:
+    """Загрузка ключа, которую ждут другие потоки процесса."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.ok = False
+
+
+class TieredCache:
+    """L1 в процессе перед общим L2 с однократной загрузкой значений."""
+
+    def __init__(self, alias=None, max_entries=None):
+        self._alias = alias
+        self.local = LocalCache(
+            max_entries or settings.RBAC_CACHE_L1_MAX_ENTRIES
+        )
+        self._calls = {}
+        self._calls_lock = threading.Lock()
+        # Загрузки асинхронного пути: (event loop, ключ) -> Task.
+        self._tasks = {}
+
+    @property
+    def shared(self):
+        """Общий кэш (L2)."""
+        return caches[self._alias or settings.RBAC_CACHE_ALIAS]
+
+    def _remember(self, key, entry):
+        l1_expires = time.time() + settings.RBAC_CACHE_L1_TIMEOUT
+        if entry.expires > l1_expires:
+            entry = entry._replace(expires=l1_expires)
+        self.local.set(key, entry)
+
+    def _get_entry(self, key):
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        entry = self.shared.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.time():
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def get(self, key, default=None):
+        entry = self._get_entry(key)
+        return default if entry is None else entry.value
+
+    def set(self, key, value, timeout, delta=0.0):
+        entry = Entry(value, time.time() + timeout, delta)
+        self.shared.set(key, entry, timeout)
+        self._remember(key, entry)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def clear(self):
+        """Очистить оба уровня (для тестов и ручного сброса)."""
+        self.local.clear()
+        self.shared.clear()
+
+    def _should_refresh(self, entry):
+        # XFetch: чем дольше загрузка и чем ближе истечение, тем выше
+        # вероятность пересчитать значение заранее.
+        beta = settings.RBAC_CACHE_EARLY_REFRESH_BETA
+        if not beta or not entry.delta:
+            return False
+        jitter = -entry.delta * beta * math.log(1.0 - random.random())
+        return time.time() + jitter >= entry.expires
+
+    def _load(self, key, loader, timeout):
+        started = time.perf_counter()
+        value = loader()
+        delta = time.perf_counter() - started
+        CACHE_LOADS.inc()
+        CACHE_LOAD_SECONDS.observe(delta)
+        if callable(timeout):
+            timeout = timeout(value)
+        self.set(key, value, timeout, delta)
+        return value
+
+    def _load_shared(self, key, loader, timeout, stale=None):
+        """Загрузка под блокировкой в L2; остальные процессы ждут."""
+        lock_key = f'{key}:lock'
+        if self.shared.add(lock_key, 1, settings.RBAC_CACHE_LOCK_TIMEOUT):
+            try:
+                return self._load(key, loader, timeout)
+            finally:
+                self.shared.delete(lock_key)
+
+        if stale is not None:
+            # Досрочное обновление уже выполняет другой процесс.
+            return stale.value
+
+        deadline = time.monotonic() + settings.RBAC_CACHE_WAIT_TIMEOUT
+        pause = 0.005
+        while time.monotonic() < deadline:
+            time.sleep(pause)
+            pause = min(pause * 2, 0.05)
+            entry = self.shared.get(key)
+            if entry is not None:
+                self._remember(key, entry)
+                return entry.value
+        # Владелец блокировки не успел: загружаем сами.
+        return self._load(key, loader, timeout)
+
+    def get_or_load(self, key, loader, timeout):
+        """
+        Значение ключа; при отсутствии вызывает ``loader()`` ровно один раз
+        на все конкурентные запросы и сохраняет результат на ``timeout``
+        секунд (или ``timeout(значение)``, если передана функция).
+        """
+        entry = self._get_entry(key)
+        stale = None
+        if entry is not None:
+            if not self._should_refresh(entry):
+                return entry.value
+            stale = entry
+
+        with self._calls_lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if stale is not None:
+                return stale.value
+            call.event.wait(settings.RBAC_CACHE_WAIT_TIMEOUT)
+            if call.ok:
+                return call.value
+            return self.get_or_load(key, loader, timeout)
+
+        try:
+            if stale is None:
+                # Пока ждали блокировку, значение мог загрузить другой поток.
+                entry = self._get_entry(key)
+                if entry is not None:
+                    call.value, call.ok = entry.value, True
+                    return entry.value
+            call.value = self._load_shared(key, loader, timeout, stale)
+            call.ok = True
+            return call.value
+        finally:
+            with self._calls_lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def _aget_entry(self, key):
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        entry = await self.shared.aget(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.time():
+            return None
+        self._remember(key, entry)
+        return entry
+
+    async def _aload(self, key, loader, timeout):
+        started = time.perf_counter()
+        value = await loader()
+        delta = time.perf_counter() - started
+        CACHE_LOADS.inc()
+        CACHE_LOAD_SECONDS.observe(delta)
+        if callable(timeout):
+            timeout = timeout(value)
+        entry = Entry(value, time.time() + timeout, delta)
+        await self.shared.aset(key, entry, timeout)
+        self._remember(key, entry)
+        return value
+
+    async def _aload_shared(self, key, loader, timeout):
+        lock_key = f'{key}:lock'
+        if await self.shared.aadd(
+            lock_key, 1, settings.RBAC_CACHE_LOCK_TIMEOUT
+        ):
+            try:
+                return await self._aload(key, loader, timeout)
+            finally:
+                await self.shared.adelete(lock_key)
+
+        deadline = time.monotonic() + settings.RBAC_CACHE_WAIT_TIMEOUT
+        pause = 0.005
+        while time.monotonic() < deadline:
+            await asyncio.sleep(pause)
+            pause = min(pause * 2, 0.05)
+            entry = await self.shared.aget(key)
+            if entry is not None:
+                self._remember(key, entry)
+                return entry.value
+        return await self._aload(key, loader, timeout)
+
+    async def aget_or_load(self, key, loader, timeout):
+        """
+        Асинхронный ``get_or_load``: ``loader`` - функция, возвращающая
+        корутину. Попадание в L1 не переключает поток; конкурентные
+        корутины процесса ждут одну загрузку, между процессами действует
+        та же блокировка в L2. Досрочное обновление не выполняется.
+        """
+        entry = await self._aget_entry(key)
+        if entry is not None:
+            return entry.value
+
+        task_key = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._aload_shared(key, loader, timeout)
+            )
+            self._tasks[task_key] = task
+            task.add_done_callback(
+                lambda _: self._tasks.pop(task_key, None)
+            )
+        # shield: отмена одного запроса не отменяет загрузку для остальных.
+        return await asyncio.shield(task)
+
+
+rbac_cache = TieredCache()
+
+L1_ENTRIES = Gauge(
+    'rbac_cache_l1_entries',
+    'Записей в L1-кэше RBAC процессов.',
+    function=lambda: len(rbac_cache.local)
+)
@@ -0,0 +1,176 @@
+"""
+Маршрутизация чтения на реплики БД.
+
+Чтение уходит на реплику только внутри ``replica_reads(user)``: его
+включают проверка прав (HasPermission) и безопасные запросы ViewSet'ов с
+ReplicaReadMixin. Все остальное, включая аутентификацию и записи, идет в
+default. После записи пользователь на REPLICA_STICKY_SECONDS закрепляется
+за основной БД, чтобы не увидеть устаревшие роли из-за задержки репликации.
+
+Значения для кэша под версиями данных (permissions.versions) загружаются
+внутри ``fresh_reads(*scopes)``: после недавней записи в эти области они
+читаются из основной БД, иначе реплика с устаревшими строками заполнила бы
+кэш под уже новой версией.
+"""
+import contextvars
+import random
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from rest_framework import permissions
+
+from .cache import rbac_cache
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def _sticky_key(user_id):
+    return f'rbac:sticky:{user_id}'
+
+
+def stick_to_primary(user_id):
+    """Читать данные пользователя только из основной БД какое-то время."""
+    if user_id is not None and settings.DATABASE_REPLICAS:
+        rbac_cache.shared.set(
+            _sticky_key(user_id),
+            True,
+            settings.REPLICA_STICKY_SECONDS
+        )
+
+
+def is_sticky(user_id):
+    return bool(rbac_cache.shared.get(_sticky_key(user_id)))
+
+
+def _written_key(scope):
+    return f'rbac:written:{scope}'
+
+
+def mark_written(*scopes):
+    """
+    Отметить запись в области версий: REPLICA_STICKY_SECONDS значения для
+    кэша под версиями этих областей читаются из основной БД.
+    """
+    if scopes and settings.DATABASE_REPLICAS:
+        rbac_cache.shared.set_many(
+            {_written_key(scope): True for scope in scopes},
+            settings.REPLICA_STICKY_SECONDS
+        )
+
+
+def _written_keys(scopes):
+    # Ключи отметок нужны, только если сейчас разрешено чтение с реплик.
+    if not (_replica_reads.get() and settings.DATABASE_REPLICAS):
+        return None
+    return [_written_key(scope) for scope in scopes]
+
+
+@contextmanager
+def fresh_reads(*scopes):
+    """
+    Загрузить значение для кэша под версиями областей scopes: после
+    недавней записи в них - из основной БД, иначе - как настроено блоком.
+    """
+    keys = _written_keys(scopes)
+    if keys and rbac_cache.shared.get_many(keys):
+        with primary_reads():
+            yield
+    else:
+        yield
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Разрешить чтение с реплик внутри блока.
+
+    Если пользователь недавно что-то записал, блок работает с основной БД.
+    """
+    user_id = getattr(user, 'pk', None)
+    enabled = bool(settings.DATABASE_REPLICAS) and not (
+        user_id is not None and is_sticky(user_id)
+    )
+    token = _replica_reads.set(enabled)
+    try:
+        yield enabled
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Читать из основной БД внутри блока, даже внутри replica_reads."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(user=None):
+    """Асинхронный replica_reads."""
+    user_id = getattr(user, 'pk', None)
+    enabled = bool(settings.DATABASE_REPLICAS)
+    if enabled and user_id is not None:
+        enabled = not await rbac_cache.shared.aget(_sticky_key(user_id))
+    token = _replica_reads.set(enabled)
+    try:
+        yield enabled
+    finally:
+        _replica_reads.reset(token)
+
+
+@asynccontextmanager
+async def afresh_reads(*scopes):
+    """Асинхронный fresh_reads."""
+    keys = _written_keys(scopes)
+    if keys and await rbac_cache.shared.aget_many(keys):
+        with primary_reads():
+            yield
+    else:
+        yield
+
+
+class PrimaryReplicaRouter:
+    """Роутер: запись - в default, чтение - на случайную реплику."""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Mixin для DRF view: безопасные запросы читают данные с реплик,
+    небезопасные закрепляют пользователя за основной БД.
+
+    Аутентификация и проверка прав выполняются до переключения.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in permissions.SAFE_METHODS:
+            self._replica_context = replica_reads(request.user)
+            self._replica_context.__enter__()
+        else:
+            stick_to_primary(getattr(request.user, 'pk', None))
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_context = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_context is not None:
+                self._replica_context.__exit__(None, None, None)
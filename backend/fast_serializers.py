@@ -0,0 +1,178 @@
+"""
+Быстрый путь чтения для ModelSerializer.
+
+Объявленные поля сериализатора один раз на класс компилируются в плоский
+план: список lookup'ов для ``values_list()`` и конвертер для каждого поля.
+Дальше каждая строка списка собирается из кортежа без создания экземпляров
+модели и без обхода полей DRF. Результат совпадает с ``serializer.data``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+from rest_framework.response import Response
+
+from .profiling import phase
+
+
+class UnsupportedField(Exception):
+    """Поле сериализатора нельзя выразить через values()."""
+
+
+# Поля, для которых to_representation не меняет значение, полученное
+# из values() для соответствующего поля модели.
+_IDENTITY_FIELDS = {
+    drf_fields.BooleanField: (models.BooleanField,),
+    drf_fields.IntegerField: (models.IntegerField,),
+    drf_fields.CharField: (models.CharField, models.TextField),
+    drf_fields.EmailField: (models.EmailField,),
+}
+
+
+class ReadPlan:
+    """Скомпилированный план чтения для одного класса сериализатора."""
+
+    def __init__(self, names, lookups, converters):
+        self.names = tuple(names)
+        self.lookups = tuple(lookups)
+        self.converters = tuple(converters)
+        self._plain = all(conv is None for conv in self.converters)
+
+    def values(self, queryset):
+        """QuerySet кортежей в порядке полей плана."""
+        return queryset.values_list(*self.lookups)
+
+    def render_row(self, row):
+        if self._plain:
+            return dict(zip(self.names, row))
+        return {
+            name: (
+                value if conv is None or value is None else conv(value)
+            )
+            for name, conv, value in zip(self.names, self.converters, row)
+        }
+
+    def render(self, rows):
+        """Список словарей, идентичный ``Serializer(many=True).data``."""
+        render_row = self.render_row
+        return [render_row(row) for row in rows]
+
+
+def _resolve_lookup(model, source_attrs):
+    """Перевести source поля в lookup для values() и конечное поле модели."""
+    parts = []
+    model_field = None
+    for index, attr in enumerate(source_attrs):
+        if model is None:
+            raise UnsupportedField(attr)
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise UnsupportedField(attr)
+        if model_field.many_to_many or model_field.one_to_many:
+            raise UnsupportedField(attr)
+        is_last = index == len(source_attrs) - 1
+        if model_field.is_relation and not is_last:
+            # При NULL в цепочке DRF пропускает поле, values() вернет None.
+            if model_field.null:
+                raise UnsupportedField(attr)
+            model = model_field.related_model
+        elif not is_last:
+            raise UnsupportedField(attr)
+        elif model_field.is_relation:
+            # Выбираем колонку role_id, а не role: иначе ORDER BY role
+            # сортирует по ключу вместо ordering связанной модели.
+            attr = model_field.attname
+        parts.append(attr)
+    return '__'.join(parts), model_field
+
+
+def _compile_field(model, field):
+    if field.source == '*' or not field.source_attrs:
+        raise UnsupportedField(field.field_name)
+    if isinstance(field, (
+        drf_fields.SerializerMethodField,
+        relations.ManyRelatedField,
+        relations.HyperlinkedRelatedField,
+    )):
+        raise UnsupportedField(field.field_name)
+    if hasattr(field, 'fields'):
+        # Вложенный сериализатор.
+        raise UnsupportedField(field.field_name)
+
+    lookup, model_field = _resolve_lookup(model, field.source_attrs)
+
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        if not model_field.is_relation or field.pk_field is not None:
+            raise UnsupportedField(field.field_name)
+        # values() по внешнему ключу уже возвращает pk.
+        return lookup, None
+    if model_field.is_relation:
+        raise UnsupportedField(field.field_name)
+
+    identity_for = _IDENTITY_FIELDS.get(type(field))
+    if identity_for and isinstance(model_field, identity_for):
+        return lookup, None
+    if type(field) is drf_fields.ReadOnlyField:
+        return lookup, None
+    return lookup, field.to_representation
+
+
+_plans = {}
+
+
+def get_read_plan(serializer_class):
+    """
+    План чтения для класса сериализатора (кэшируется на класс).
+
+    Возвращает None, если хотя бы одно читаемое поле не выражается через
+    values(); в этом случае нужно использовать обычный сериализатор.
+    """
+    try:
+        return _plans[serializer_class]
+    except KeyError:
+        pass
+
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    names, lookups, converters = [], [], []
+    try:
+        for field in serializer._readable_fields:
+            lookup, converter = _compile_field(model, field)
+            names.append(field.field_name)
+            lookups.append(lookup)
+            converters.append(converter)
+    except UnsupportedField:
+        plan = None
+    else:
+        plan = ReadPlan(names, lookups, converters)
+
+    _plans[serializer_class] = plan
+    return plan
+
+
+class FastListMixin:
+    """
+    Mixin для ModelViewSet: ``list`` собирает ответ по плану чтения.
+
+    Фильтрация, сортировка и пагинация остаются прежними, меняется только
+    способ получения строк. Если сериализатор не компилируется, используется
+    стандартная реализация.
+    """
+
+    def list(self, request, *args, **kwargs):
+        plan = get_read_plan(self.get_serializer_class())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = plan.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        paginated = page is not None
+        if not paginated:
+            # Строки читаются из БД до фазы serialize.
+            page = list(queryset)
+        with phase('serialize'):
+            data = plan.render(page)
+        if paginated:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,440 @@
+"""
+Метрики в формате Prometheus без сторонних зависимостей.
+
+Счетчики (Counter), гистограммы с фиксированными границами (Histogram) и
+измерители (Gauge) регистрируются в глобальном REGISTRY при импорте
+модуля, который их использует, и отдаются view ``metrics_view`` по
+``/metrics``.
+
+Несколько процессов gunicorn. Если задан METRICS_MULTIPROC_DIR, фоновый
+поток каждого процесса раз в METRICS_FLUSH_INTERVAL секунд (если значения
+менялись) и при завершении атомарно переписывает файл ``<pid>.json`` в этом
+каталоге; запросы в файлы не пишут. ``/metrics``
+складывает значения текущего процесса с файлами остальных: счетчики и
+гистограммы - по всем файлам, включая завершившиеся воркеры, измерители -
+только по живым процессам. Каталог очищается при старте gunicorn
+(``on_starting`` в gunicorn.conf.py). Без каталога метрики видны только в
+процессе, который обслужил запрос.
+"""
+import atexit
+import bisect
+import hmac
+import ipaddress
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы гистограмм длительности в секундах.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0,
+)
+
+
+class Registry:
+    """Набор метрик процесса и их общий файл в METRICS_MULTIPROC_DIR."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher_pid = None
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Метрика {metric.name} уже зарегистрирована')
+        self._metrics[metric.name] = metric
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_MULTIPROC_DIR', '')
+
+    def snapshot(self):
+        """{имя: [[значения меток, значение], ...]} для JSON."""
+        for metric in self._metrics.values():
+            metric.refresh()
+        with self._lock:
+            return {
+                name: [
+                    [list(labels), value]
+                    for labels, value in metric.samples()
+                ]
+                for name, metric in self._metrics.items()
+            }
+
+    def changed(self):
+        """Вызывается после каждого изменения значения."""
+        if self._dirty:
+            return
+        self._dirty = True
+        # После fork'а воркера поток мастера не существует.
+        if self._flusher_pid != os.getpid() and self.directory:
+            with self._lock:
+                if self._flusher_pid != os.getpid():
+                    self._flusher_pid = os.getpid()
+                    threading.Thread(
+                        target=self._flush_periodically,
+                        name='metrics-flush',
+                        daemon=True
+                    ).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    def flush(self):
+        """Записать значения процесса в ``<pid>.json``."""
+        directory = self.directory
+        if not directory:
+            return
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        data = json.dumps({'pid': os.getpid(), 'metrics': self.snapshot()})
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(data)
+        os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+
+    def _other_processes(self):
+        directory = self.directory
+        if not directory or not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            if filename == f'{os.getpid()}.json':
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            yield data['pid'], data['metrics']
+
+    def collect(self):
+        """[(метрика, {метки: значение})] по всем процессам."""
+        merged = {
+            name: {tuple(labels): value for labels, value in samples}
+            for name, samples in self.snapshot().items()
+        }
+        for pid, metrics in self._other_processes():
+            alive = _is_alive(pid)
+            for name, samples in metrics.items():
+                metric = self._metrics.get(name)
+                if metric is None or not (alive or metric.keeps_dead):
+                    continue
+                values = merged[name]
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    if labels in values:
+                        value = metric.merge(values[labels], value)
+                    values[labels] = value
+        return [
+            (metric, merged[name])
+            for name, metric in sorted(self._metrics.items())
+        ]
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        for metric, values in self.collect():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for labels, value in sorted(values.items()):
+                lines.extend(metric.render(labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+
+class Metric:
+    """Метрика с метками; значения хранятся по кортежу значений меток."""
+
+    type = None
+    # Учитывать ли значения завершившихся процессов.
+    keeps_dead = True
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f'{self.name}: ожидаются метки {self.labelnames}'
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        return list(self._values.items())
+
+    def refresh(self):
+        """Обновить вычисляемые значения перед снимком."""
+
+    def merge(self, left, right):
+        return left + right
+
+    def render(self, labels, value):
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} '
+            f'{_format_value(value)}'
+        ]
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._registry._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.changed()
+
+
+class Gauge(Metric):
+    """
+    Текущее значение. ``function`` вычисляет значение без меток при каждом
+    снимке. Значения процессов складываются (mode='sum') или берется
+    максимум (mode='max'); завершившиеся процессы не учитываются.
+    """
+
+    type = 'gauge'
+    keeps_dead = False
+
+    def __init__(self, *args, function=None, mode='sum', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = function
+        self.mode = mode
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._registry._lock:
+            self._values[key] = value
+        self._registry.changed()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._registry._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.changed()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def refresh(self):
+        if self.function is not None:
+            value = self.function()
+            with self._registry._lock:
+                self._values[()] = value
+
+    def merge(self, left, right):
+        if self.mode == 'max':
+            return max(left, right)
+        return left + right
+
+
+class Histogram(Metric):
+    """
+    Распределение наблюдений по фиксированным границам. Значение по
+    меткам - [счетчики корзин..., счетчик +Inf, сумма].
+    """
+
+    type = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Первая граница >= value; len(buckets) - корзина +Inf.
+        index = bisect.bisect_left(self.buckets, value)
+        with self._registry._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+        self._registry.changed()
+
+    def time(self, **labels):
+        """Контекстный менеджер, наблюдающий длительность блока."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        return [(key, list(counts)) for key, counts in self._values.items()]
+
+    def merge(self, left, right):
+        return [a + b for a, b in zip(left, right)]
+
+    def render(self, labels, value):
+        lines = []
+        cumulative = 0
+        bounds = [*self.buckets, float('inf')]
+        for bound, count in zip(bounds, value):
+            cumulative += count
+            label_text = _format_labels(
+                self.labelnames, labels, [('le', _format_value(bound))]
+            )
+            lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_text} {_format_value(value[-1])}')
+        lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(
+            time.perf_counter() - self.started, **self.labels
+        )
+
+
+class QueryCounter:
+    """Считает SQL-запросы блока по всем соединениям потока."""
+
+    def __init__(self):
+        self.count = 0
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+
+class ViewMetricsMixin:
+    """Число и длительность запросов ViewSet'а по действию и статусу."""
+
+    def initial(self, request, *args, **kwargs):
+        self._metrics_started = time.perf_counter()
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        view = getattr(self, 'basename', None) or type(self).__name__
+        action = getattr(self, 'action', None) or request.method.lower()
+        VIEW_REQUESTS.inc(
+            view=view, action=action, status=response.status_code
+        )
+        started = getattr(self, '_metrics_started', None)
+        if started is not None:
+            VIEW_DURATION.observe(
+                time.perf_counter() - started, view=view, action=action
+            )
+        return response
+
+
+VIEW_REQUESTS = Counter(
+    'http_viewset_requests_total',
+    'Запросы к ViewSet\'ам API.',
+    ('view', 'action', 'status')
+)
+VIEW_DURATION = Histogram(
+    'http_viewset_request_duration_seconds',
+    'Длительность обработки запросов ViewSet\'ами API.',
+    ('view', 'action')
+)
+
+
+def _allowed_address(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in network for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus. Если задан METRICS_TOKEN,
+    требуется заголовок ``Authorization: Bearer <METRICS_TOKEN>``, иначе
+    метрики отдаются только адресам из METRICS_ALLOWED_NETWORKS.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        # Сравнение за постоянное время: по времени ответа нельзя
+        # подобрать токен посимвольно.
+        header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(
+            header.encode(), f'Bearer {token}'.encode()
+        ):
+            return HttpResponse(status=401)
+    elif not _allowed_address(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponse(status=403)
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
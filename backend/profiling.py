@@ -0,0 +1,206 @@
+"""
+Профилирование запросов: заголовок Server-Timing и строка лога.
+
+``ServerTimingMiddleware`` для доли запросов SERVER_TIMING_SAMPLE_RATE
+замеряет фазы обработки и отдает их в заголовке Server-Timing и в логгере
+``backend.profiling`` одной JSON-строкой:
+
+- auth - аутентификация (разбор JWT и загрузка пользователя);
+- perm - проверки HasPermission;
+- password - хеширование и проверка паролей (bcrypt или хешер Django);
+- view - вызов view целиком, включая auth, perm и serialize;
+- serialize - сериализация данных ответа в dict (``serializer.data`` и
+  планы чтения FastListMixin);
+- render - отрисовка ответа (JSON);
+- db - число и суммарное время SQL-запросов;
+- total - обработка запроса middleware'ами ниже этого.
+
+Фазы отмечаются через ``with phase('name')``. Вне профилируемого запроса
+это одно чтение ContextVar. Фазу serialize свойство ``data``
+сериализаторов DRF замеряет только на время профилируемых запросов
+(``profile_serializers``). При SERVER_TIMING_SAMPLE_RATE=0 middleware
+отключается при загрузке (MiddlewareNotUsed) и не добавляет накладных
+расходов.
+"""
+import json
+import logging
+import random
+import threading
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger('backend.profiling')
+
+_current = ContextVar('request_profile', default=None)
+
+
+class Profile:
+    """Замеры одного запроса; длительности в секундах."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.sql_time = 0.0
+
+    def add(self, name, duration):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка выполнения SQL (connection.execute_wrapper)."""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += perf_counter() - started
+
+
+class phase:
+    """Контекстный менеджер, добавляющий время блока к фазе name."""
+
+    __slots__ = ('name', 'profile', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.profile = _current.get()
+        if self.profile is not None:
+            self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.add(self.name, perf_counter() - self.started)
+
+
+def server_timing(metrics):
+    """[(имя, секунды, описание)] -> значение заголовка Server-Timing."""
+    parts = []
+    for name, duration, description in metrics:
+        part = f'{name};dur={duration * 1000:.2f}'
+        if description:
+            part += f';desc="{description}"'
+        parts.append(part)
+    return ', '.join(parts)
+
+
+# Исходное свойство BaseSerializer.data и обертка, замеряющая его как фазу
+# serialize. Через BaseSerializer проходят и Serializer, и ListSerializer;
+# вложенные сериализаторы вызываются через to_representation и не
+# считаются дважды.
+_serializer_data = BaseSerializer.__dict__['data']
+
+
+def _profiled_data(self):
+    with phase('serialize'):
+        return _serializer_data.fget(self)
+
+
+_profiled_serializer_data = property(_profiled_data)
+_serializers_lock = threading.Lock()
+_serializers_profiled = 0
+
+
+@contextmanager
+def profile_serializers():
+    """
+    Замерять ``serializer.data`` внутри блока. Обертка ставится в
+    BaseSerializer при входе в первый из одновременных блоков и снимается
+    при выходе из последнего; запросы других потоков в это время проходят
+    через обертку без замеров (phase без профиля ничего не делает).
+    """
+    global _serializers_profiled
+    with _serializers_lock:
+        if not _serializers_profiled:
+            BaseSerializer.data = _profiled_serializer_data
+        _serializers_profiled += 1
+    try:
+        yield
+    finally:
+        with _serializers_lock:
+            _serializers_profiled -= 1
+            if not _serializers_profiled:
+                BaseSerializer.data = _serializer_data
+
+
+class ServerTimingMiddleware:
+    """Профилирует долю запросов SERVER_TIMING_SAMPLE_RATE."""
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                # Обертки хранятся в объектах соединений потока, а не в
+                # соединениях с БД, поэтому подключение к БД не требуется.
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                stack.enter_context(profile_serializers())
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = perf_counter() - profile.started
+
+        metrics = [
+            (name, duration, None)
+            for name, duration in profile.phases.items()
+        ]
+        metrics.append(
+            ('db', profile.sql_time, f'{profile.queries} queries')
+        )
+        metrics.append(('total', total, None))
+        response['Server-Timing'] = server_timing(metrics)
+
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'phases_ms': {
+                name: round(duration * 1000, 2)
+                for name, duration in profile.phases.items()
+            },
+            'queries': profile.queries,
+            'sql_ms': round(profile.sql_time * 1000, 2),
+        }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            request._profile_view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF Response отрисовывается после возврата из view, поэтому
+        # время отрисовки замеряется отдельно от view.
+        profile = _current.get()
+        if profile is None:
+            return response
+        started = getattr(request, '_profile_view_started', None)
+        now = perf_counter()
+        if started is not None:
+            profile.add('view', now - started)
+
+        def rendered(response):
+            profile.add('render', perf_counter() - now)
+
+        response.add_post_render_callback(rendered)
+        return response
+
@@ -0,0 +1,52 @@
+"""
+Бюджеты SQL-запросов для эндпоинтов API.
+
+Ключ - имя URL (с namespace), значение - максимальное число запросов для
+каждого HTTP-метода. Бюджет не зависит от числа строк в таблицах и размера
+страницы: backend/tests.py проверяет каждый эндпоинт на наборах данных из
+1 и 100 строк с холодным кэшем RBAC, поэтому N+1 и другие запросы,
+растущие вместе с данными, ломают тесты.
+
+Новому эндпоинту нужно добавить бюджет, иначе тест не пройдет. Админка
+Django не проверяется.
+"""
+
+QUERY_BUDGETS = {
+    # Аутентификация
+    'accounts:register': {'POST': 5},
+    'accounts:login': {'POST': 10},
+    'accounts:logout': {'POST': 1},
+    'accounts:profile': {'GET': 2},
+    'accounts:profile-permissions': {'GET': 2},
+    'token_refresh': {'POST': 1},
+    'metrics': {'GET': 0},
+
+    # Роли и права. Каждая запись пишет событие инвалидации кэша прав
+    # для других процессов (permissions/invalidation.py) и запись журнала
+    # ленты изменений (permissions/feed.py).
+    'permissions:api-root': {'GET': 1},
+    'permissions:matrix': {'GET': 3},
+    # Журнал и по запросу на каждый тип объектов на странице.
+    'permissions:changes': {'GET': 7},
+    # Пользователь токена и права; при теплом кэше - ни одного.
+    'permissions:forward-auth': {'GET': 2},
+    'permissions:role-list': {'GET': 4, 'POST': 7},
+    'permissions:role-detail': {
+        'GET': 3, 'PUT': 9, 'PATCH': 8, 'DELETE': 8,
+    },
+    'permissions:business-element-list': {'GET': 4, 'POST': 7},
+    # Переименование пересчитывает права владельцев правил на элемент.
+    'permissions:business-element-detail': {
+        'GET': 3, 'PUT': 10, 'PATCH': 9, 'DELETE': 8,
+    },
+    'permissions:access-rule-list': {'GET': 4, 'POST': 10},
+    'permissions:access-rule-detail': {
+        'GET': 3, 'PUT': 10, 'PATCH': 10, 'DELETE': 7,
+    },
+    'permissions:user-role-list': {'GET': 4, 'POST': 11},
+    'permissions:user-role-detail': {
+        'GET': 3, 'PUT': 12, 'PATCH': 12, 'DELETE': 8,
+    },
+    'permissions:user-role-assign-role': {'POST': 12},
+    'permissions:user-role-remove-role': {'DELETE': 8},
+}
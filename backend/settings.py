@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import ipaddress
 import os
 from pathlib import Path
 
@@ -53,6 +54,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.profiling.ServerTimingMiddleware',
+    # Отвечает на /api/permissions/forward-auth/ до остальных middleware.
+    'permissions.forward_auth.ForwardAuthMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -106,10 +110,61 @@ else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
         }
     }
 
+# Соединения с БД.
+# DB_POOL=True включает пул соединений psycopg 3 (только PostgreSQL),
+# иначе соединения переиспользуются в течение DB_CONN_MAX_AGE секунд
+# с проверкой работоспособности перед каждым запросом.
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+
+if DB_POOL and DATABASES['default']['ENGINE'].endswith('postgresql'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            # По умолчанию - по соединению на поток воркера gunicorn.
+            'max_size': int(
+                os.environ.get(
+                    'DB_POOL_MAX_SIZE',
+                    os.environ.get('GUNICORN_THREADS', 4)
+                )
+            ),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.environ.get('DB_CONN_MAX_AGE', 0)
+    )
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+
+# Реплики для чтения: DB_REPLICAS - хосты PostgreSQL или пути к файлам
+# SQLite через запятую. Реплики получают алиасы replica_0, replica_1, ...
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(
+    filter(None, os.environ.get('DB_REPLICAS', '').split(','))
+):
+    _alias = f'replica_{_index}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        # В тестах реплика указывает на тестовую копию default.
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        DATABASES[_alias]['NAME'] = _replica.strip()
+    else:
+        DATABASES[_alias]['HOST'] = _replica.strip()
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['backend.db_router.PrimaryReplicaRouter']
+
+# Сколько секунд после записи пользователь читает только из основной БД.
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -167,10 +222,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Арендатор по умолчанию: в него попадают существующие данные и объекты,
+# созданные без явного указания арендатора.
+DEFAULT_TENANT_SLUG = os.environ.get('DEFAULT_TENANT_SLUG', 'default')
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.TenantJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -198,6 +257,163 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# Cache
+# REDIS_URL включает общий для всех процессов кэш в Redis, иначе каждый
+# процесс использует свой кэш в памяти.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'backend',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'backend',
+            # По умолчанию LocMemCache хранит 300 записей: при большем числе
+            # пользователей вытеснялись счетчики версий и права каждый раз
+            # перечитывались из БД.
+            'OPTIONS': {
+                'MAX_ENTRIES': int(
+                    os.environ.get('LOCMEM_CACHE_MAX_ENTRIES', 10000)
+                ),
+            },
+        }
+    }
+
+# Двухуровневый кэш данных авторизации (backend/cache.py):
+# L2 - кэш Django с алиасом RBAC_CACHE_ALIAS, L1 - LRU в памяти процесса.
+RBAC_CACHE_ALIAS = os.environ.get('RBAC_CACHE_ALIAS', 'default')
+RBAC_CACHE_L1_MAX_ENTRIES = int(
+    os.environ.get('RBAC_CACHE_L1_MAX_ENTRIES', 10000)
+)
+RBAC_CACHE_L1_TIMEOUT = int(os.environ.get('RBAC_CACHE_L1_TIMEOUT', 60))
+# Сколько секунд держится блокировка загрузки и сколько ее ждут другие.
+RBAC_CACHE_LOCK_TIMEOUT = int(os.environ.get('RBAC_CACHE_LOCK_TIMEOUT', 10))
+RBAC_CACHE_WAIT_TIMEOUT = float(
+    os.environ.get('RBAC_CACHE_WAIT_TIMEOUT', 5)
+)
+# Коэффициент досрочного обновления (0 - отключить).
+RBAC_CACHE_EARLY_REFRESH_BETA = float(
+    os.environ.get('RBAC_CACHE_EARLY_REFRESH_BETA', 1.0)
+)
+
+# Рассылка инвалидаций между процессами и узлами (permissions/
+# invalidation.py). auto - включена, если L2 - LocMemCache: версии прав
+# тогда хранятся в памяти каждого процесса. С Redis версии общие, и
+# рассылка не нужна.
+RBAC_INVALIDATION_BUS = os.environ.get('RBAC_INVALIDATION_BUS', 'auto')
+# Период опроса таблицы событий, если нет LISTEN/NOTIFY PostgreSQL.
+RBAC_INVALIDATION_POLL_INTERVAL = float(
+    os.environ.get('RBAC_INVALIDATION_POLL_INTERVAL', 0.5)
+)
+# Окно повторного чтения событий: транзакция, закоммиченная позже
+# соседних, все равно будет прочитана, если длилась меньше окна. На
+# PostgreSQL окно дополнительно расширяется до начала незакоммиченных
+# транзакций.
+RBAC_INVALIDATION_LOOKBACK = float(
+    os.environ.get('RBAC_INVALIDATION_LOOKBACK', 10)
+)
+# Сколько секунд хранить события в таблице.
+RBAC_INVALIDATION_RETENTION = int(
+    os.environ.get('RBAC_INVALIDATION_RETENTION', 3600)
+)
+
+# Кэширование справочников ролей и бизнес-элементов:
+# время жизни отрисованных страниц в кэше сервера и max-age для клиентов.
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+CATALOG_CACHE_MAX_AGE = int(os.environ.get('CATALOG_CACHE_MAX_AGE', 0))
+
+# Время жизни закэшированных эффективных прав пользователей в секундах.
+AUTHORIZATION_CACHE_TIMEOUT = int(
+    os.environ.get('AUTHORIZATION_CACHE_TIMEOUT', 300)
+)
+
+# Сколько секунд хранить снимки матрицы прав для ответов с since_version.
+PERMISSION_MATRIX_HISTORY_TIMEOUT = int(
+    os.environ.get('PERMISSION_MATRIX_HISTORY_TIMEOUT', 86400)
+)
+
+# Сколько секунд forward-auth (permissions/forward_auth.py) помнит
+# пользователя проверенного токена в L1; 0 - загружать при каждом запросе.
+FORWARD_AUTH_TOKEN_CACHE_TIMEOUT = float(
+    os.environ.get('FORWARD_AUTH_TOKEN_CACHE_TIMEOUT', 5)
+)
+
+# Лента изменений политики (permissions/feed.py): размер страницы по
+# умолчанию и максимальный, и сколько секунд запись журнала выдерживается
+# перед выдачей, чтобы транзакции успели закоммитить меньшие номера (кроме
+# PostgreSQL, где номера выдаются в порядке коммитов).
+POLICY_FEED_PAGE_SIZE = int(os.environ.get('POLICY_FEED_PAGE_SIZE', 500))
+POLICY_FEED_MAX_PAGE_SIZE = int(
+    os.environ.get('POLICY_FEED_MAX_PAGE_SIZE', 5000)
+)
+POLICY_FEED_SETTLE_SECONDS = float(
+    os.environ.get('POLICY_FEED_SETTLE_SECONDS', 1)
+)
+
+# Профилирование запросов (backend/profiling.py): доля запросов от 0 до 1,
+# для которых отдается заголовок Server-Timing и пишется строка в лог
+# backend.profiling. 0 отключает middleware.
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.environ.get('SERVER_TIMING_SAMPLE_RATE', 0)
+)
+
+# Прогрев кэшей при запуске воркера gunicorn (permissions/warmup.py):
+# политика всех арендаторов и права WARMUP_USERS недавно входивших
+# пользователей.
+WARMUP_ON_STARTUP = os.environ.get('WARMUP_ON_STARTUP', 'True') == 'True'
+WARMUP_USERS = int(os.environ.get('WARMUP_USERS', 0))
+
+# Метрики Prometheus (backend/metrics.py) на /metrics.
+# METRICS_MULTIPROC_DIR - каталог, через который процессы gunicorn
+# объединяют метрики; без него /metrics показывает только свой процесс.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+# Если задан, /metrics требует заголовок Authorization: Bearer <токен>.
+# Без токена /metrics отдается только адресам из METRICS_ALLOWED_NETWORKS
+# (сети через запятую, по умолчанию только локальный хост).
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(network.strip())
+    for network in os.environ.get(
+        'METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128'
+    ).split(',')
+    if network.strip()
+]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'backend.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'permissions.warmup': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'permissions.invalidation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -0,0 +1,532 @@
+import ipaddress
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+
+from accounts.authentication import tokens_for_user
+from backend.cache import rbac_cache
+from permissions.models import AccessRoleRule, BusinessElement, Role, UserRole
+from permissions.seeding import API_ELEMENTS
+
+from .metrics import Counter, Gauge, Histogram, Registry
+from .query_budgets import QUERY_BUDGETS
+
+User = get_user_model()
+
+
+def _url_names(patterns, namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            if pattern.name:
+                yield f'{namespace}:{pattern.name}' if namespace else (
+                    pattern.name
+                )
+            continue
+        if pattern.namespace == 'admin':
+            continue
+        inner = pattern.namespace or namespace
+        if namespace and pattern.namespace:
+            inner = f'{namespace}:{pattern.namespace}'
+        yield from _url_names(pattern.url_patterns, inner)
+
+
+# Лента изменений отдает и только что созданные записи журнала.
+@override_settings(POLICY_FEED_SETTLE_SECONDS=0)
+class QueryBudgetTest(TestCase):
+    """
+    Бюджеты SQL-запросов эндпоинтов (backend/query_budgets.py).
+
+    Каждый эндпоинт вызывается на наборах из 1 и 100 строк в таблицах RBAC
+    с холодным кэшем; число запросов не должно превышать бюджет и не должно
+    расти вместе с данными.
+    """
+    sizes = (1, 100)
+    password = 'budgetpass123'
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.client = APIClient()
+        self.names = count()
+        self.admin = User.objects.create_user(
+            email='budget@example.com',
+            username='budget',
+            first_name='Budget',
+            last_name='Admin',
+            password=self.password
+        )
+        role = Role.objects.create(name='Budget Admin')
+        self.elements = []
+        for name in API_ELEMENTS:
+            element = BusinessElement.objects.create(name=name)
+            AccessRoleRule.objects.create(
+                role=role,
+                element=element,
+                read_all_permission=True,
+                create_permission=True,
+                update_all_permission=True,
+                delete_all_permission=True
+            )
+            self.elements.append(element)
+        UserRole.objects.create(user=self.admin, role=role)
+        self.tokens = tokens_for_user(self.admin)
+        self.rows = 0
+
+    def _name(self, prefix):
+        return f'{prefix}-{next(self.names)}'
+
+    def _user(self):
+        name = self._name('user')
+        return User.objects.create(
+            email=f'{name}@example.com',
+            username=name,
+            first_name='Budget',
+            last_name='User',
+            password='!'
+        )
+
+    def _role(self):
+        return Role.objects.create(name=self._name('role'))
+
+    def _element(self):
+        return BusinessElement.objects.create(name=self._name('element'))
+
+    def _rule(self):
+        return AccessRoleRule.objects.create(
+            role=self._role(),
+            element=self.elements[0],
+            read_permission=True
+        )
+
+    def _user_role(self):
+        return UserRole.objects.create(user=self._user(), role=self._role())
+
+    def _grow(self, size):
+        """Добавить строки, чтобы в каждой таблице RBAC их было не меньше
+        size."""
+        for _ in range(self.rows, size):
+            user_role = self._user_role()
+            AccessRoleRule.objects.create(
+                role=user_role.role,
+                element=self._element(),
+                read_permission=True
+            )
+        self.rows = max(self.rows, size)
+
+    def _detail_cases(self, basename, create, payload):
+        def detail(method):
+            def build():
+                obj = create()
+                url = reverse(f'permissions:{basename}-detail', args=[obj.pk])
+                return url, payload(obj) if method in ('PUT', 'PATCH') else {}
+            return (f'permissions:{basename}-detail', method, build)
+        return [detail(method) for method in ('GET', 'PUT', 'PATCH', 'DELETE')]
+
+    def _cases(self):
+        """(имя URL, метод, функция -> (путь, данные), с токеном или нет)."""
+        def url(name, data=None):
+            return lambda: (reverse(name), data() if data else {})
+
+        anonymous = [
+            ('accounts:register', 'POST', url('accounts:register', lambda: {
+                'email': f'{self._name("new")}@example.com',
+                'username': self._name('new'),
+                'first_name': 'New',
+                'last_name': 'User',
+                'password': 'newpass12345',
+                'password_confirm': 'newpass12345',
+            })),
+            ('accounts:login', 'POST', url('accounts:login', lambda: {
+                'email': self.admin.email,
+                'password': self.password,
+            })),
+            ('token_refresh', 'POST', url('token_refresh', lambda: {
+                'refresh': self.tokens['refresh'],
+            })),
+            ('metrics', 'GET', url('metrics')),
+        ]
+        authenticated = [
+            ('accounts:profile', 'GET', url('accounts:profile')),
+            (
+                'accounts:profile-permissions', 'GET',
+                url('accounts:profile-permissions')
+            ),
+            ('accounts:logout', 'POST', url('accounts:logout', lambda: {
+                'refresh_token': self.tokens['refresh'],
+            })),
+            ('permissions:api-root', 'GET', url('permissions:api-root')),
+            ('permissions:matrix', 'GET', url('permissions:matrix')),
+            ('permissions:changes', 'GET', url('permissions:changes')),
+            ('permissions:forward-auth', 'GET', url(
+                'permissions:forward-auth',
+                lambda: {'element': 'roles', 'action': 'read'}
+            )),
+            ('permissions:role-list', 'GET', url('permissions:role-list')),
+            ('permissions:role-list', 'POST', url(
+                'permissions:role-list',
+                lambda: {'name': self._name('role')}
+            )),
+            (
+                'permissions:business-element-list', 'GET',
+                url('permissions:business-element-list')
+            ),
+            ('permissions:business-element-list', 'POST', url(
+                'permissions:business-element-list',
+                lambda: {'name': self._name('element')}
+            )),
+            (
+                'permissions:access-rule-list', 'GET',
+                url('permissions:access-rule-list')
+            ),
+            ('permissions:access-rule-list', 'POST', url(
+                'permissions:access-rule-list',
+                lambda: {
+                    'role': self._role().pk,
+                    'element': self.elements[0].pk,
+                    'read_permission': True,
+                }
+            )),
+            (
+                'permissions:user-role-list', 'GET',
+                url('permissions:user-role-list')
+            ),
+            ('permissions:user-role-list', 'POST', url(
+                'permissions:user-role-list',
+                lambda: {'user': self._user().pk, 'role': self._role().pk}
+            )),
+            ('permissions:user-role-assign-role', 'POST', url(
+                'permissions:user-role-assign-role',
+                lambda: {'user_id': self._user().pk, 'role_id': self._role().pk}
+            )),
+            ('permissions:user-role-remove-role', 'DELETE', url(
+                'permissions:user-role-remove-role',
+                lambda: {
+                    'user_id': (user_role := self._user_role()).user_id,
+                    'role_id': user_role.role_id,
+                }
+            )),
+            *self._detail_cases(
+                'role', self._role,
+                lambda role: {'name': self._name('role')}
+            ),
+            *self._detail_cases(
+                'business-element', self._element,
+                lambda element: {'name': self._name('element')}
+            ),
+            *self._detail_cases(
+                'access-rule', self._rule,
+                lambda rule: {
+                    'role': rule.role_id,
+                    'element': rule.element_id,
+                    'read_all_permission': True,
+                }
+            ),
+            *self._detail_cases(
+                'user-role', self._user_role,
+                lambda user_role: {
+                    'user': user_role.user_id,
+                    'role': self._role().pk,
+                }
+            ),
+        ]
+        return (
+            [(*case, False) for case in anonymous]
+            + [(*case, True) for case in authenticated]
+        )
+
+    def _measure(self, method, build, authenticated):
+        path, data = build()
+        self.client.logout()
+        self.client.credentials()
+        if authenticated:
+            self.client.credentials(
+                HTTP_AUTHORIZATION=f'Bearer {self.tokens["access"]}'
+            )
+        rbac_cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method.lower())(
+                path, data, format='json'
+            )
+        return response, captured
+
+    def test_every_url_has_budget(self):
+        """Бюджет задан для каждого именованного URL кроме админки."""
+        names = set(_url_names(get_resolver().url_patterns))
+        self.assertEqual(names, set(QUERY_BUDGETS))
+
+    def test_query_budgets(self):
+        """Число запросов в бюджете и не растет с числом строк."""
+        counts = {}
+        for size in self.sizes:
+            self._grow(size)
+            for name, method, build, authenticated in self._cases():
+                with self.subTest(url=name, method=method, rows=size):
+                    response, captured = self._measure(
+                        method, build, authenticated
+                    )
+                    self.assertLess(
+                        response.status_code, 300, response.content
+                    )
+                    queries = '\n'.join(
+                        query['sql'] for query in captured.captured_queries
+                    )
+                    self.assertLessEqual(
+                        len(captured), QUERY_BUDGETS[name][method], queries
+                    )
+                    counts.setdefault((name, method), {})[size] = (
+                        len(captured)
+                    )
+
+        for (name, method), by_size in counts.items():
+            with self.subTest(url=name, method=method):
+                self.assertEqual(
+                    by_size[self.sizes[-1]],
+                    by_size[self.sizes[0]],
+                    'Число запросов растет вместе с данными'
+                )
+
+
+class ServerTimingTest(TestCase):
+    """Тесты заголовка Server-Timing и лога профилирования."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='timing@example.com',
+            username='timing',
+            first_name='Timing',
+            last_name='User',
+            password='timingpass123'
+        )
+        role = Role.objects.create(name='Timing Role')
+        element = BusinessElement.objects.create(name='roles')
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=role)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=(
+                f'Bearer {tokens_for_user(self.user)["access"]}'
+            )
+        )
+
+    def _timings(self, response):
+        return {
+            part.split(';')[0]: part
+            for part in response['Server-Timing'].split(', ')
+        }
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_phases_in_header_and_log(self):
+        """Фазы запроса попадают в заголовок и в JSON-строку лога."""
+        with self.assertLogs('backend.profiling', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse('permissions:role-list'))
+
+        self.assertEqual(response.status_code, 200)
+        timings = self._timings(response)
+        for name in (
+            'auth', 'perm', 'view', 'serialize', 'render', 'db', 'total'
+        ):
+            self.assertIn(name, timings)
+        self.assertIn(f'desc="{len(captured)} queries"', timings['db'])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('permissions:role-list'))
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], len(captured))
+        self.assertIn('perm', record['phases_ms'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_password_phase_on_login(self):
+        """Время bcrypt выделено в отдельную фазу."""
+        self.client.credentials()
+        with self.assertLogs('backend.profiling', 'INFO'):
+            response = self.client.post(reverse('accounts:login'), {
+                'email': self.user.email,
+                'password': 'timingpass123',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('password', self._timings(response))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_serialize_phase_for_serializer_data(self):
+        """serializer.data вне быстрого пути тоже замеряется."""
+        with self.assertLogs('backend.profiling', 'INFO'):
+            response = self.client.get(reverse('accounts:profile'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('serialize', self._timings(response))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_serializer_data_restored_after_request(self):
+        """Обертка serializer.data снимается после запроса."""
+        data = BaseSerializer.__dict__['data']
+        with self.assertLogs('backend.profiling', 'INFO'):
+            self.client.get(reverse('accounts:profile'))
+
+        self.assertIs(BaseSerializer.__dict__['data'], data)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        """При нулевой доле заголовок не добавляется."""
+        response = self.client.get(reverse('permissions:role-list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTest(TestCase):
+    """Тесты метрик Prometheus."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='metrics@example.com',
+            username='metrics',
+            first_name='Metrics',
+            last_name='User',
+            password='metricspass123'
+        )
+        role = Role.objects.create(name='Metrics Role')
+        element = BusinessElement.objects.create(name='roles')
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=role)
+
+    def _value(self, text, sample):
+        match = re.search(rf'^{re.escape(sample)} (\S+)$', text, re.MULTILINE)
+        return float(match.group(1)) if match else 0.0
+
+    def _metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_auth_and_permission_metrics(self):
+        """Вход, проверки прав и запросы ViewSet'ов попадают в метрики."""
+        samples = (
+            'auth_login_total{result="success"}',
+            'auth_login_duration_seconds_count',
+            'auth_password_seconds_count{operation="check"}',
+            'rbac_permission_checks_total'
+            '{element="roles",action="read",result="allow"}',
+            'rbac_permission_check_queries_count',
+            'http_viewset_requests_total'
+            '{view="role",action="list",status="200"}',
+        )
+        before = self._metrics()
+
+        response = self.client.post(reverse('accounts:login'), {
+            'email': self.user.email,
+            'password': 'metricspass123',
+        }, format='json')
+        self.client.credentials(
+            HTTP_AUTHORIZATION=(
+                f'Bearer {response.data["tokens"]["access"]}'
+            )
+        )
+        self.client.get(reverse('permissions:role-list'))
+
+        after = self._metrics()
+        for sample in samples:
+            with self.subTest(sample=sample):
+                self.assertEqual(
+                    self._value(after, sample),
+                    self._value(before, sample) + 1
+                )
+        self.assertIn('# TYPE auth_login_duration_seconds histogram', after)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        """С METRICS_TOKEN метрики отдаются только с токеном."""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secre'
+        )
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_external_address_denied_without_token(self):
+        """Без токена метрики закрыты для адресов вне разрешенных сетей."""
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 403)
+
+        with self.settings(METRICS_ALLOWED_NETWORKS=[
+            ipaddress.ip_network('10.0.0.0/8')
+        ]):
+            response = self.client.get(
+                reverse('metrics'), REMOTE_ADDR='10.0.0.5'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_histogram_format(self):
+        """Корзины гистограммы накопительные, есть _sum и _count."""
+        registry = Registry()
+        histogram = Histogram(
+            'test_seconds', 'Тест.', ('view',),
+            buckets=(0.1, 1), registry=registry
+        )
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='a')
+
+        text = registry.render()
+        self.assertIn('test_seconds_bucket{view="a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{view="a",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{view="a",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum{view="a"} 5.55', text)
+        self.assertIn('test_seconds_count{view="a"} 3', text)
+
+    def test_multiprocess_merge(self):
+        """Значения других процессов складываются через файлы."""
+        registry = Registry()
+        counter = Counter('test_total', 'Тест.', ('kind',), registry=registry)
+        gauge = Gauge('test_gauge', 'Тест.', registry=registry)
+        counter.inc(2, kind='a')
+        gauge.set(3)
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+
+        with tempfile.TemporaryDirectory() as directory:
+            for pid in (os.getppid(), finished.pid):
+                with open(os.path.join(directory, f'{pid}.json'), 'w') as f:
+                    json.dump({'pid': pid, 'metrics': {
+                        'test_total': [[['a'], 5]],
+                        'test_gauge': [[[], 10]],
+                    }}, f)
+
+            with override_settings(METRICS_MULTIPROC_DIR=directory):
+                text = registry.render()
+                registry.flush()
+                self.assertTrue(
+                    os.path.exists(
+                        os.path.join(directory, f'{os.getpid()}.json')
+                    )
+                )
+
+        # Счетчики завершившегося процесса учитываются, измерители - нет.
+        self.assertIn('test_total{kind="a"} 12.0', text)
+        self.assertIn('test_gauge 13.0', text)
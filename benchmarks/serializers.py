@@ -0,0 +1,152 @@
+"""
+Сравнение быстрого пути чтения с обычными сериализаторами DRF.
+
+Запуск:
+    python -m benchmarks.serializers --rows 5000 --repeat 5
+
+Создает временную тестовую базу, заполняет ее и печатает лучшее время
+сериализации списка для каждого варианта.
+"""
+import argparse
+import os
+import time
+
+
+def _setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+def _seed(rows):
+    from django.contrib.auth import get_user_model
+    from accounts.models import get_default_tenant_id
+    from permissions.models import (
+        AccessRoleRule,
+        BusinessElement,
+        Role,
+        UserRole,
+    )
+
+    User = get_user_model()
+    elements_count = 50
+    roles_count = max(1, rows // elements_count)
+    # bulk_create не вызывает save(), арендатор указывается явно.
+    tenant_id = get_default_tenant_id()
+
+    roles = Role.objects.bulk_create(
+        Role(name=f'role_{i}', tenant_id=tenant_id)
+        for i in range(roles_count)
+    )
+    elements = BusinessElement.objects.bulk_create(
+        BusinessElement(name=f'element_{i}', tenant_id=tenant_id)
+        for i in range(elements_count)
+    )
+    AccessRoleRule.objects.bulk_create(
+        AccessRoleRule(
+            tenant_id=tenant_id,
+            role=role,
+            element=element,
+            read_permission=True,
+            update_permission=bool(role.pk % 2),
+        )
+        for role in roles
+        for element in elements
+    )
+    users = User.objects.bulk_create(
+        User(
+            email=f'bench{i}@example.com',
+            username=f'bench{i}',
+            first_name='Bench',
+            last_name='User',
+            password='!',
+            tenant_id=tenant_id,
+        )
+        for i in range(rows)
+    )
+    UserRole.objects.bulk_create(
+        UserRole(
+            tenant_id=tenant_id,
+            user=user,
+            role=roles[i % roles_count]
+        )
+        for i, user in enumerate(users)
+    )
+
+
+def _best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(rows, repeat):
+    from backend.fast_serializers import get_read_plan
+    from permissions.models import AccessRoleRule, UserRole
+    from permissions.serializers import (
+        AccessRoleRuleSerializer,
+        UserRoleSerializer,
+    )
+
+    cases = [
+        (
+            'access-rules',
+            AccessRoleRuleSerializer,
+            AccessRoleRule.objects.select_related('role', 'element'),
+        ),
+        (
+            'user-roles',
+            UserRoleSerializer,
+            UserRole.objects.select_related('user', 'role'),
+        ),
+    ]
+    results = []
+    for name, serializer_class, queryset in cases:
+        plan = get_read_plan(serializer_class)
+        drf = _best_of(
+            repeat,
+            lambda: serializer_class(queryset.all(), many=True).data
+        )
+        fast = _best_of(
+            repeat,
+            lambda: plan.render(plan.values(queryset.all()))
+        )
+        results.append((name, queryset.count(), drf, fast))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    _setup_django()
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        _seed(args.rows)
+        results = run(args.rows, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    print(f'{"endpoint":<14}{"rows":>8}{"drf, ms":>12}'
+          f'{"fast, ms":>12}{"speedup":>10}')
+    for name, count, drf, fast in results:
+        print(f'{name:<14}{count:>8}{drf * 1000:>12.1f}'
+              f'{fast * 1000:>12.1f}{drf / fast:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Сравнение пропускной способности runserver и gunicorn.
+
+Запуск:
+    python -m benchmarks.server --duration 10 --concurrency 16
+
+Создает временную SQLite-базу с тестовым пользователем, по очереди
+поднимает оба сервера на локальном порту и нагружает их запросами с
+JWT-токеном. Для PostgreSQL задайте DATABASE_URL и POSTGRES_* - тогда
+используется указанная база, а DB_POOL/DB_CONN_MAX_AGE влияют на результат.
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PATHS = (
+    '/api/auth/profile/',
+    '/api/permissions/roles/',
+)
+
+
+def free_port():
+    """Свободный TCP-порт на 127.0.0.1."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _prepare_database():
+    """Миграции и пользователь с правами; возвращает access-токен."""
+    import django
+    from django.core.management import call_command
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+
+    from accounts.authentication import tokens_for_user
+    from permissions.models import (
+        AccessRoleRule,
+        BusinessElement,
+        Role,
+        UserRole,
+    )
+
+    call_command('migrate', verbosity=0)
+    User = get_user_model()
+    user, created = User.objects.get_or_create(
+        email='bench@example.com',
+        defaults={
+            'username': 'bench',
+            'first_name': 'Bench',
+            'last_name': 'User',
+        }
+    )
+    if created:
+        user.set_password('benchpass123')
+        user.save()
+    role, _ = Role.objects.get_or_create(name='Bench Role')
+    element, _ = BusinessElement.objects.get_or_create(name='roles')
+    AccessRoleRule.objects.update_or_create(
+        role=role,
+        element=element,
+        defaults={'read_all_permission': True}
+    )
+    UserRole.objects.get_or_create(user=user, role=role)
+    return tokens_for_user(user)['access']
+
+
+def _wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Сервер завершился при запуске')
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError('Сервер не запустился')
+
+
+def load(port, token, duration, concurrency, paths=PATHS):
+    """Нагрузка keep-alive соединениями; (запросов/с, p50, p99, ошибки)."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def worker(index):
+        local = []
+        local_errors = 0
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        request_number = index
+        while time.monotonic() < deadline:
+            path = paths[request_number % len(paths)]
+            request_number += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+                if response.getheader('Connection', '') == 'close':
+                    connection.close()
+                    connection = http.client.HTTPConnection(
+                        '127.0.0.1', port
+                    )
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port)
+                continue
+            local.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [
+        threading.Thread(target=worker, args=(index,))
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if not latencies:
+        return 0.0, 0.0, 0.0, errors[0]
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return (
+        len(latencies) / duration,
+        statistics.median(latencies) * 1000,
+        p99 * 1000,
+        errors[0],
+    )
+
+
+def _server_command(name, port):
+    python = sys.executable
+    if name == 'runserver':
+        return [
+            python, 'manage.py', 'runserver', f'127.0.0.1:{port}',
+            '--noreload',
+        ]
+    return [
+        python, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+        '--bind', f'127.0.0.1:{port}',
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        env.setdefault('SQLITE_PATH', str(Path(tmp) / 'bench.sqlite3'))
+        env.setdefault('ALLOWED_HOSTS', '127.0.0.1')
+        env['DEBUG'] = 'False'
+        env['GUNICORN_ACCESS_LOG'] = ''
+        os.environ.update(env)
+
+        token = _prepare_database()
+
+        results = []
+        for name in ('runserver', 'gunicorn'):
+            port = free_port()
+            command = _server_command(name, port)
+            process = subprocess.Popen(
+                command,
+                cwd=BASE_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                _wait_for_port(port, process)
+                # Прогрев: первые запросы загружают код и открывают соединения.
+                load(port, token, 1, args.concurrency)
+                results.append(
+                    (name, *load(
+                        port, token, args.duration, args.concurrency
+                    ))
+                )
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    print(f'{"server":<12}{"req/s":>10}{"p50, ms":>10}'
+          f'{"p99, ms":>10}{"errors":>8}')
+    for name, rps, p50, p99, errors in results:
+        print(f'{name:<12}{rps:>10.1f}{p50:>10.1f}{p99:>10.1f}{errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""
+Набор бенчмарков авторизации с проверкой регрессий.
+
+Запуск:
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+
+Эталон benchmarks/baseline.json хранится в репозитории (параметры по
+умолчанию, SQLite).
+
+Создает временную тестовую базу, заполняет ее через permissions.seeding и
+измеряет:
+
+- micro: решения HasPermission._check_permission в секунду для сценариев
+  "ролей у пользователя x правил у роли", с холодным и прогретым кэшем;
+- client: вход, обновление токена и списки API через тестовый клиент
+  Django, включая число SQL-запросов на запрос;
+- wsgi: запросы в секунду через многопоточный WSGI-сервер в процессе.
+
+С ``--baseline`` результаты сравниваются с сохраненными: регрессией
+считается рост p50 больше чем на ``--tolerance``, любой рост числа
+SQL-запросов или ошибок; при регрессии команда завершается с кодом 1.
+``--queries-only`` сравнивает только запросы и ошибки - время зависит от
+железа, и baseline с другой машины для него не годится.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+
+from .server import free_port, load
+
+# Пароль сгенерированных пользователей (см. permissions.seeding).
+PASSWORD = 'seedpass123'
+
+CLIENT_PATHS = (
+    '/api/auth/profile/',
+    '/api/auth/profile/permissions/',
+    '/api/permissions/roles/',
+    '/api/permissions/business-elements/',
+    '/api/permissions/access-rules/',
+    '/api/permissions/user-roles/',
+    '/api/permissions/matrix/',
+)
+
+# Сравниваются только метрики, устойчивые к шуму: медиана и число
+# запросов к БД. Остальные сохраняются для справки.
+LATENCY_METRIC = 'p50_ms'
+QUERIES_METRIC = 'queries'
+
+
+def _setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+def parse_scenario(value):
+    """'3x20' -> (3, 20): ролей у пользователя x правил у роли."""
+    roles, _, rules = value.partition('x')
+    return int(roles), int(rules)
+
+
+def _summary(latencies, queries=None):
+    """Метрики по списку длительностей в секундах."""
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    result = {
+        'per_sec': len(latencies) / total if total else 0.0,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[
+            min(len(latencies) - 1, int(len(latencies) * 0.99))
+        ] * 1000,
+    }
+    if queries is not None:
+        result[QUERIES_METRIC] = queries / len(latencies)
+    return result
+
+
+def _timed(iterations, func):
+    """Выполнить func(i) iterations раз; (длительности, число запросов)."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies = []
+    with CaptureQueriesContext(connection) as captured:
+        for i in range(iterations):
+            started = time.perf_counter()
+            func(i)
+            latencies.append(time.perf_counter() - started)
+    return latencies, len(captured)
+
+
+def _seed_scenario(index, roles_per_user, rules_per_role, args):
+    from permissions import seeding
+    tenant = seeding.get_tenant(f'bench-{index}')
+    seeding.seed(tenant, seeding.SeedConfig(
+        users=args.users,
+        roles=args.roles,
+        elements=max(args.elements, rules_per_role),
+        roles_per_user=(roles_per_user, roles_per_user),
+        rules_per_role=(rules_per_role, rules_per_role),
+        seed=args.seed,
+        password=PASSWORD,
+    ))
+    seeding.refresh_derived_data(tenant)
+    return tenant
+
+
+def run_micro(tenant, iterations):
+    """Решения о доступе для разных пользователей и элементов."""
+    from django.contrib.auth import get_user_model
+
+    from backend.cache import rbac_cache
+    from permissions.models import BusinessElement
+    from permissions.permissions import HasPermission
+
+    User = get_user_model()
+    users = list(User.objects.filter(tenant=tenant).order_by('pk')[:200])
+    elements = list(BusinessElement.objects.filter(
+        tenant=tenant
+    ).order_by('pk').values_list('name', flat=True))
+    checker = HasPermission()
+    actions = ('read', 'create', 'update', 'delete')
+
+    def check(i):
+        checker._check_permission(
+            users[i % len(users)],
+            elements[i % len(elements)],
+            actions[i % len(actions)],
+            None
+        )
+
+    def check_cold(i):
+        rbac_cache.clear()
+        check(i)
+
+    results = {}
+    rbac_cache.clear()
+    results['cold'] = _summary(*_timed(iterations, check_cold))
+    rbac_cache.clear()
+    # Прогрев: по одному обращению на пользователя.
+    for i in range(len(users)):
+        check(i)
+    results['warm'] = _summary(*_timed(iterations, check))
+    return results
+
+
+def _bench_user(tenant):
+    """Пользователь со всеми правами на элементы API."""
+    from django.contrib.auth import get_user_model
+
+    from permissions.models import (
+        AccessRoleRule,
+        BusinessElement,
+        Role,
+        UserRole,
+    )
+    from permissions.seeding import API_ELEMENTS
+
+    User = get_user_model()
+    user = User.objects.create_user(
+        email=f'bench-admin@{tenant.slug}.example.com',
+        username=f'bench-admin-{tenant.slug}',
+        first_name='Bench',
+        last_name='Admin',
+        password=PASSWORD,
+        tenant=tenant
+    )
+    role = Role.objects.create(name='bench-admin', tenant=tenant)
+    for name in API_ELEMENTS:
+        element, _ = BusinessElement.objects.get_or_create(
+            tenant=tenant, name=name
+        )
+        AccessRoleRule.objects.create(
+            role=role,
+            element=element,
+            read_all_permission=True,
+            create_permission=True,
+            update_all_permission=True,
+            delete_all_permission=True
+        )
+    UserRole.objects.create(user=user, role=role)
+    return user
+
+
+def run_client(user, iterations, login_iterations):
+    """Вход, обновление токена и списки API через тестовый клиент."""
+    from rest_framework.test import APIClient
+
+    from accounts.authentication import tokens_for_user
+    from backend.cache import rbac_cache
+
+    client = APIClient()
+    tokens = tokens_for_user(user)
+    results = {}
+
+    def post(path, data):
+        def request(i):
+            response = client.post(path, data, format='json')
+            assert response.status_code == 200, response.content
+        # Первый запрос создает сессию и прогревает код - не измеряем.
+        request(0)
+        return request
+
+    # Вход упирается в bcrypt, поэтому итераций меньше.
+    results['POST /api/auth/login/'] = _summary(*_timed(
+        login_iterations,
+        post('/api/auth/login/', {'email': user.email, 'password': PASSWORD})
+    ))
+    client.logout()
+    results['POST /api/token/refresh/'] = _summary(*_timed(
+        iterations,
+        post('/api/token/refresh/', {'refresh': tokens['refresh']})
+    ))
+
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+    rbac_cache.clear()
+    for path in CLIENT_PATHS:
+        def get(i, path=path):
+            response = client.get(path)
+            assert response.status_code == 200, response.content
+        get(0)
+        results[f'GET {path}'] = _summary(*_timed(iterations, get))
+    return results, tokens['access']
+
+
+def run_wsgi(token, duration, concurrency):
+    """Нагрузка многопоточного WSGI-сервера внутри процесса."""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+    from django.core.wsgi import get_wsgi_application
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    port = free_port()
+    server = ThreadingWSGIServer(('127.0.0.1', port), QuietHandler)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        load(port, token, 1, concurrency, CLIENT_PATHS)
+        rps, p50, p99, errors = load(
+            port, token, duration, concurrency, CLIENT_PATHS
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {'per_sec': rps, 'p50_ms': p50, 'p99_ms': p99, 'errors': errors}
+
+
+def run(args):
+    from django.db import connection
+
+    results = {}
+    for index, scenario in enumerate(args.scenarios):
+        roles_per_user, rules_per_role = scenario
+        tenant = _seed_scenario(index, roles_per_user, rules_per_role, args)
+        name = f'{roles_per_user}x{rules_per_role}'
+        for mode, metrics in run_micro(tenant, args.iterations).items():
+            results[f'micro.check.{name}.{mode}'] = metrics
+
+    user = _bench_user(tenant)
+    client_results, token = run_client(
+        user, args.iterations, args.login_iterations
+    )
+    for name, metrics in client_results.items():
+        results[f'client.{name}'] = metrics
+    if args.duration:
+        results['wsgi.mixed'] = run_wsgi(
+            token, args.duration, args.concurrency
+        )
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'users': args.users,
+            'roles': args.roles,
+            'elements': args.elements,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance, queries_only=False):
+    """Список регрессий относительно baseline."""
+    regressions = []
+    for name, base in baseline['results'].items():
+        metrics = current['results'].get(name)
+        if metrics is None:
+            continue
+        if metrics.get('errors', 0) > base.get('errors', 0):
+            regressions.append(f'{name}: ошибок {metrics["errors"]}')
+        if QUERIES_METRIC in base and (
+            metrics.get(QUERIES_METRIC, 0) > base[QUERIES_METRIC] + 1e-9
+        ):
+            regressions.append(
+                f'{name}: запросов {metrics[QUERIES_METRIC]:.2f} '
+                f'> {base[QUERIES_METRIC]:.2f}'
+            )
+        if queries_only:
+            continue
+        limit = base[LATENCY_METRIC] * (1 + tolerance)
+        if metrics[LATENCY_METRIC] > limit:
+            regressions.append(
+                f'{name}: p50 {metrics[LATENCY_METRIC]:.3f} мс '
+                f'> {limit:.3f} мс ({base[LATENCY_METRIC]:.3f} + '
+                f'{tolerance:.0%})'
+            )
+    return regressions
+
+
+def _print(report):
+    print(f'{"benchmark":<52}{"ops/s":>10}{"p50, ms":>10}'
+          f'{"p99, ms":>10}{"queries":>9}')
+    for name, metrics in report['results'].items():
+        queries = metrics.get(QUERIES_METRIC)
+        print(
+            f'{name:<52}{metrics["per_sec"]:>10.1f}'
+            f'{metrics["p50_ms"]:>10.3f}{metrics["p99_ms"]:>10.3f}'
+            + (f'{queries:>9.2f}' if queries is not None else f'{"-":>9}')
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--roles', type=int, default=100)
+    parser.add_argument('--elements', type=int, default=50)
+    parser.add_argument(
+        '--scenarios',
+        type=parse_scenario,
+        nargs='+',
+        default=[(1, 5), (3, 20), (10, 50)],
+        help='Ролей у пользователя x правил у роли, например 3x20'
+    )
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--login-iterations', type=int, default=5)
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=5,
+        help='Длительность нагрузки WSGI-сервера, 0 - пропустить'
+    )
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--baseline', help='JSON для сравнения')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.25,
+        help='Допустимый рост p50 относительно baseline (0.25 = 25%%)'
+    )
+    parser.add_argument(
+        '--queries-only',
+        action='store_true',
+        help='Сравнивать только число SQL-запросов (для CI на другом железе)'
+    )
+    parser.add_argument('--save-baseline', help='Куда сохранить результаты')
+    args = parser.parse_args()
+
+    _setup_django()
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    from django.conf import settings
+    setup_test_environment()
+    # Хост, под которым к серверу обращается нагрузка wsgi.
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, '127.0.0.1']
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        report = run(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    _print(report)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write('\n')
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(
+            report, baseline, args.tolerance, args.queries_only
+        )
+        if regressions:
+            print('\nРегрессии:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print('\nРегрессий нет')
+
+
+if __name__ == '__main__':
+    main()
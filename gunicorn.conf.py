@@ -0,0 +1,79 @@
+"""
+Конфигурация gunicorn для production.
+
+Все параметры задаются переменными окружения. По умолчанию число
+процессов считается от числа CPU, внутри процесса работают потоки
+(gthread), приложение загружается до fork'а воркеров.
+
+Для ASGI: GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker и
+GUNICORN_APP=backend.asgi:application (нужен пакет uvicorn).
+"""
+import multiprocessing
+import os
+
+wsgi_app = os.environ.get('GUNICORN_APP', 'backend.wsgi:application')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Воркеры ждут БД, поэтому потоков больше, чем ядер:
+# процессов - по числу CPU * 2 + 1, в каждом GUNICORN_THREADS потоков.
+workers = int(
+    os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get(
+    'GUNICORN_WORKER_CLASS',
+    'gthread' if threads > 1 else 'sync'
+)
+
+# Загружаем Django один раз в мастере: воркеры стартуют быстрее и делят
+# память через copy-on-write. Соединения с БД создаются уже в воркерах.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Периодический перезапуск воркеров ограничивает рост памяти.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Пустое значение GUNICORN_ACCESS_LOG отключает access-лог.
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Файлы метрик прошлого запуска: счетчики начинаются с нуля.
+    directory = os.environ.get('METRICS_MULTIPROC_DIR')
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(('.json', '.tmp')):
+                os.remove(os.path.join(directory, name))
+
+
+def worker_exit(server, worker):
+    from backend.metrics import REGISTRY
+    REGISTRY.flush()
+
+
+def when_ready(server):
+    # Мастер не обслуживает запросы, и воркеры не должны унаследовать его
+    # соединения и пулы psycopg через fork. Обычно при preload_app мастер
+    # к БД не подключается; если это случилось, все закрывается до запуска
+    # воркеров, пока сессии ни с кем не разделены.
+    from django.db import connections
+
+    from permissions.warmup import close_pools
+    connections.close_all()
+    close_pools()
+
+
+def post_worker_init(worker):
+    # Прогрев кэшей до приема запросов (WARMUP_ON_STARTUP) и слушатель
+    # инвалидаций кэша прав: в каждом воркере, с его соединениями.
+    from permissions.invalidation import start_listener
+    from permissions.warmup import warm_on_startup
+    warm_on_startup()
+    start_listener()
@@ -5,17 +5,17 @@ from .models import Role, BusinessElement, AccessRoleRule, UserRole
 @admin.register(Role)
 class RoleAdmin(admin.ModelAdmin):
     """Админка для ролей"""
-    list_display = ('name', 'description', 'created_at')
+    list_display = ('name', 'tenant', 'description', 'created_at')
     search_fields = ('name', 'description')
-    list_filter = ('created_at',)
+    list_filter = ('tenant', 'created_at')
 
 
 @admin.register(BusinessElement)
 class BusinessElementAdmin(admin.ModelAdmin):
     """Админка для бизнес-элементов"""
-    list_display = ('name', 'description', 'created_at')
+    list_display = ('name', 'tenant', 'description', 'created_at')
     search_fields = ('name', 'description')
-    list_filter = ('created_at',)
+    list_filter = ('tenant', 'created_at')
 
 
 @admin.register(AccessRoleRule)
@@ -27,17 +27,21 @@ class AccessRoleRuleAdmin(admin.ModelAdmin):
         'create_permission',
         'update_permission', 'update_all_permission',
         'delete_permission', 'delete_all_permission',
+        'effect', 'priority',
         'created_at'
     )
-    list_filter = ('role', 'element', 'created_at')
+    list_filter = ('tenant', 'effect', 'role', 'element', 'created_at')
     search_fields = ('role__name', 'element__name')
     raw_id_fields = ('role', 'element')
+    # Арендатор копируется из роли при сохранении.
+    exclude = ('tenant',)
 
 
 @admin.register(UserRole)
 class UserRoleAdmin(admin.ModelAdmin):
     """Админка для ролей пользователей"""
-    list_display = ('user', 'role', 'created_at')
-    list_filter = ('role', 'created_at')
+    list_display = ('user', 'role', 'valid_from', 'expires_at', 'created_at')
+    list_filter = ('tenant', 'role', 'expires_at', 'created_at')
     search_fields = ('user__email', 'user__username', 'role__name')
     raw_id_fields = ('user', 'role')
+    exclude = ('tenant',)
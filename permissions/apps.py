@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class PermissionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'permissions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .warmup import warm_settings
+
+        # Настройки DRF и JWT иначе загружаются первым запросом.
+        warm_settings()
@@ -0,0 +1,166 @@
+"""
+Асинхронные view DRF для ASGI.
+
+DRF выполняет аутентификацию и проверку прав синхронно, поэтому в
+асинхронном view каждая проверка уходила бы в поток через sync_to_async.
+``AsyncAPIViewMixin`` заменяет ``dispatch`` корутиной: аутентификаторы с
+``aauthenticate`` (TenantJWTAuthentication) и permission-классы с
+``ahas_permission``/``ahas_object_permission`` (HasPermission) вызываются
+как корутины на async ORM и асинхронном API кэша, остальные - через
+sync_to_async. Обработчики (get, list, retrieve, ...) могут быть
+корутинами; синхронные обработчики вызываются через sync_to_async.
+
+Синхронные view и ViewSet'ы продолжают работать через обычный путь DRF.
+ReplicaReadMixin с асинхронными view не используется: HasPermission сам
+читает права с реплик.
+"""
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import exceptions, permissions
+
+# Встроенные permission-классы без обращений к БД вызываются без
+# переключения потока.
+SYNC_SAFE_PERMISSIONS = (
+    permissions.AllowAny,
+    permissions.IsAuthenticated,
+    permissions.IsAdminUser,
+    permissions.IsAuthenticatedOrReadOnly,
+)
+
+
+async def _call_permission(permission, name, *args):
+    method = getattr(permission, f'a{name}', None)
+    if method is not None:
+        return await method(*args)
+    method = getattr(permission, name)
+    if isinstance(permission, SYNC_SAFE_PERMISSIONS):
+        return method(*args)
+    return await sync_to_async(method)(*args)
+
+
+class AsyncAPIViewMixin:
+    """Mixin для APIView и ViewSet'ов DRF с асинхронной обработкой."""
+
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        view = super().as_view(*args, **initkwargs)
+        # ViewSetMixin.as_view возвращает обычную функцию.
+        if not iscoroutinefunction(view):
+            markcoroutinefunction(view)
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self,
+                    request.method.lower(),
+                    self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            if not iscoroutinefunction(handler):
+                # Синхронные обработчики (в том числе унаследованные
+                # list/retrieve DRF) обращаются к ORM и выполняются в
+                # потоке.
+                handler = sync_to_async(handler)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        """Асинхронный APIView.initial."""
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        await self.acheck_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """Аутентификация запроса до обращения к request.user."""
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(
+                        request
+                    )
+                else:
+                    user_auth_tuple = await sync_to_async(
+                        authenticator.authenticate
+                    )(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def acheck_permissions(self, request):
+        for permission in self.get_permissions():
+            if not await _call_permission(
+                permission, 'has_permission', request, self
+            ):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, 'message', None),
+                    code=getattr(permission, 'code', None)
+                )
+
+    async def acheck_object_permissions(self, request, obj):
+        for permission in self.get_permissions():
+            if not await _call_permission(
+                permission, 'has_object_permission', request, self, obj
+            ):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, 'message', None),
+                    code=getattr(permission, 'code', None)
+                )
+
+    async def aget_object(self):
+        """Асинхронный GenericAPIView.get_object."""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except (
+            queryset.model.DoesNotExist,
+            TypeError,
+            ValueError,
+            ValidationError,
+        ):
+            raise Http404
+        await self.acheck_object_permissions(self.request, obj)
+        return obj
@@ -0,0 +1,292 @@
+"""
+Эффективные права пользователя по бизнес-элементам.
+
+Кроме загрузки прав модуль дает API авторизации без DRF для фоновых задач
+и внутренних сервисов: ``authorize`` (решение по элементу или объекту),
+``filter_allowed`` и ``allowed_ids`` (доступные объекты queryset'а).
+Маска прав читается один раз, владение проверяется условием в SQL, поэтому
+решение по любому числу объектов стоит не больше одного запроса.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.cache import rbac_cache
+from backend.db_router import (
+    afresh_reads,
+    fresh_reads,
+    primary_reads,
+    replica_reads,
+)
+
+from . import effective
+from .flags import ACTION_FLAGS
+from .models import UserEffectivePermission
+from .namespaces import ElementMasks
+from .versions import (
+    POLICY,
+    aget_versions,
+    bump_version,
+    get_version,
+    tenant_scope,
+    user_scope,
+)
+
+
+def _scopes(user):
+    # Области версий, из которых складывается get_permissions_version.
+    return tenant_scope(POLICY, user.tenant_id), user_scope(user.pk)
+
+
+def get_permissions_version(user):
+    """
+    Версия эффективных прав пользователя.
+
+    Складывается из версии политики арендатора и версии ролей
+    пользователя, поэтому меняется при любом изменении, влияющем на его
+    права, и не зависит от изменений у других арендаторов.
+    """
+    policy, roles = (get_version(scope) for scope in _scopes(user))
+    return f'{policy}.{roles}'
+
+
+def _cache_key(user_id, version):
+    # v2: значения - ElementMasks.
+    return f'rbac:effective:v2:{user_id}:{version}'
+
+
+def _rows(user):
+    # Строки пользователя - префикс первичного ключа
+    # user_effective_permissions (см. permissions.effective).
+    return UserEffectivePermission.objects.filter(
+        user_id=user.pk
+    ).order_by().values_list('element__name', 'flags', 'valid_until')
+
+
+def _masks(rows):
+    """ElementMasks из строк (имя, маска, срок) со сроком самой ранней."""
+    masks = ElementMasks()
+    for element_name, flags, valid_until in rows:
+        masks[element_name] = flags
+        if valid_until is not None and (
+            masks.valid_until is None or valid_until < masks.valid_until
+        ):
+            masks.valid_until = valid_until
+    return masks
+
+
+def _expired(masks):
+    return masks.valid_until is not None and (
+        masks.valid_until <= timezone.now()
+    )
+
+
+def _cache_timeout(masks):
+    """Срок кэширования масок: не дольше ближайшего срока строк."""
+    timeout = settings.AUTHORIZATION_CACHE_TIMEOUT
+    if masks.valid_until is not None:
+        left = (masks.valid_until - timezone.now()).total_seconds()
+        timeout = max(min(timeout, left), 0)
+    return timeout
+
+
+def _refresh_expired(user):
+    # Истек срок назначения роли: пересчитать права по основной БД и
+    # сменить версию, чтобы другие процессы не читали старые маски.
+    with primary_reads():
+        effective.refresh_user(user.pk)
+        bump_version(user_scope(user.pk))
+
+
+def _compute_effective_permissions(user):
+    with fresh_reads(*_scopes(user)):
+        masks = _masks(_rows(user))
+    if _expired(masks):
+        _refresh_expired(user)
+        # Пересчитанные строки есть пока только в основной БД.
+        with primary_reads():
+            masks = _masks(_rows(user))
+    return masks
+
+
+def get_effective_permissions(user, version=None):
+    """
+    Маски прав пользователя {имя элемента или шаблона: маска}, объединенные
+    по всем его ролям (ElementMasks, поиск с учетом шаблонов - resolve).
+    Читаются из user_effective_permissions одним запросом и кэшируются до
+    изменения версии прав пользователя, но не дольше ближайшего срока
+    действия его назначений ролей; строки с истекшим сроком пересчитываются
+    при чтении.
+    """
+    if version is None:
+        version = get_permissions_version(user)
+    return rbac_cache.get_or_load(
+        _cache_key(user.pk, version),
+        lambda: _compute_effective_permissions(user),
+        _cache_timeout
+    )
+
+
+async def aget_permissions_version(user):
+    """Асинхронный get_permissions_version."""
+    policy, roles = await aget_versions(*_scopes(user))
+    return f'{policy}.{roles}'
+
+
+async def _acompute_effective_permissions(user):
+    async with afresh_reads(*_scopes(user)):
+        masks = _masks([row async for row in _rows(user)])
+    if _expired(masks):
+        await sync_to_async(_refresh_expired)(user)
+        with primary_reads():
+            masks = _masks([row async for row in _rows(user)])
+    return masks
+
+
+async def aget_effective_permissions(user, version=None):
+    """
+    Асинхронный get_effective_permissions: async ORM и асинхронный API
+    кэша, тот же ключ и та же запись кэша.
+    """
+    if version is None:
+        version = await aget_permissions_version(user)
+    return await rbac_cache.aget_or_load(
+        _cache_key(user.pk, version),
+        lambda: _acompute_effective_permissions(user),
+        _cache_timeout
+    )
+
+
+def warm_effective_permissions(users, batch_size=effective.BATCH_SIZE):
+    """
+    Загрузить в кэш права пользователей users пачками по batch_size одним
+    запросом на пачку. Возвращает число пользователей; пользователи с
+    истекшими строками загрузятся при первой проверке.
+    """
+    users = list(users)
+    for start in range(0, len(users), batch_size):
+        batch = users[start:start + batch_size]
+        # Версии читаются до данных: изменение, случившееся между ними,
+        # сменит версию, и устаревшая запись не будет прочитана.
+        versions = {user.pk: get_permissions_version(user) for user in batch}
+        rows = {user_id: [] for user_id in versions}
+        for user_id, *row in UserEffectivePermission.objects.filter(
+            user_id__in=versions
+        ).order_by().values_list(
+            'user_id', 'element__name', 'flags', 'valid_until'
+        ):
+            rows[user_id].append(row)
+        for user_id, version in versions.items():
+            masks = _masks(rows[user_id])
+            if _expired(masks):
+                continue
+            rbac_cache.set(
+                _cache_key(user_id, version),
+                masks,
+                _cache_timeout(masks)
+            )
+    return len(users)
+
+
+def get_element_mask(user, element_name):
+    """
+    Маска прав пользователя на элемент с учетом шаблонов (0, если прав
+    нет).
+    """
+    with replica_reads(user):
+        return get_effective_permissions(user).resolve(element_name)
+
+
+def is_owner(user, obj):
+    """Проверка, является ли пользователь владельцем объекта."""
+    # Проверяем наличие поля owner или user
+    if hasattr(obj, 'owner'):
+        return obj.owner == user
+    if hasattr(obj, 'user'):
+        return obj.user == user
+    if hasattr(obj, 'user_id'):
+        return obj.user_id == user.id
+    # Если объект - это сам пользователь
+    if isinstance(obj, type(user)) and obj.id == user.id:
+        return True
+    return False
+
+
+def _has_field(model, name):
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def owner_filter(model, user):
+    """
+    Условие "объект принадлежит пользователю" для queryset'а model - SQL-
+    аналог is_owner. None, если у модели нет владельца.
+    """
+    for field in ('owner', 'user'):
+        if _has_field(model, field):
+            return Q(**{field: user.pk})
+    if isinstance(user, model):
+        return Q(pk=user.pk)
+    return None
+
+
+def same_tenant(user, obj):
+    tenant_id = getattr(obj, 'tenant_id', None)
+    return tenant_id is None or tenant_id == user.tenant_id
+
+
+def authorize(user, element_name, action, obj=None):
+    """
+    Разрешено ли пользователю действие action над элементом element_name
+    (над объектом obj, если он передан). Права "только свои" без объекта
+    не дают доступа. Объекты другого арендатора недоступны.
+    """
+    if obj is not None and not same_tenant(user, obj):
+        return False
+    mask = get_element_mask(user, element_name)
+    own_flag, all_flag = ACTION_FLAGS.get(action, (0, 0))
+    if mask & all_flag:
+        return True
+    if mask & own_flag and obj:
+        return is_owner(user, obj)
+    return False
+
+
+def filter_allowed(user, element_name, action, queryset):
+    """
+    Объекты queryset'а, над которыми пользователю разрешено действие.
+
+    Возвращает ленивый queryset: права пользователя уже прочитаны (из
+    кэша), владение и арендатор добавлены условиями WHERE. Если прав нет,
+    возвращается queryset.none() без обращения к БД.
+    """
+    mask = get_element_mask(user, element_name)
+    own_flag, all_flag = ACTION_FLAGS.get(action, (0, 0))
+    model = queryset.model
+    if mask & all_flag:
+        condition = Q()
+    elif mask & own_flag:
+        condition = owner_filter(model, user)
+        if condition is None:
+            return queryset.none()
+    else:
+        return queryset.none()
+    if _has_field(model, 'tenant'):
+        condition &= Q(tenant_id=user.tenant_id)
+    return queryset.filter(condition)
+
+
+def allowed_ids(user, element_name, action, queryset, ids=None):
+    """
+    Множество первичных ключей объектов queryset'а (только из ids, если
+    заданы), над которыми пользователю разрешено действие. Один запрос.
+    """
+    queryset = filter_allowed(user, element_name, action, queryset)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return set(queryset.order_by().values_list('pk', flat=True))
@@ -0,0 +1,101 @@
+"""HTTP-кэширование справочников по версии данных."""
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+from backend.cache import rbac_cache
+from backend.db_router import fresh_reads
+
+from .versions import get_version, tenant_scope
+
+
+class VersionedCacheMixin:
+    """
+    Кэширование list/retrieve для редко меняющихся ViewSet'ов.
+
+    Отрисованный ответ хранится в кэше по ключу из арендатора и версии его
+    данных, пути, параметров запроса и формата ответа. ETag строится из
+    того же ключа, поэтому повторная проверка с If-None-Match не обращается
+    ни к БД, ни к кэшу страниц. Проверка прав выполняется до обращения к кэшу.
+
+    В APIView метод get оборачивается в ``_cached_read`` вручную.
+    """
+
+    # Область версий (см. permissions.versions); версия берется для
+    # арендатора пользователя.
+    cache_scope = None
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_read(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_read(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def _page_cache_key(self, request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        return (
+            f'rbac:page:{self.data_scope}:{self.data_version}:'
+            f'{request.accepted_media_type}:{request.path}?{query}'
+        )
+
+    def _cached_read(self, request, handler, *args, **kwargs):
+        # Версия читается один раз, обработчик может вернуть ее клиенту.
+        self.tenant_id = request.user.tenant_id
+        self.data_scope = tenant_scope(self.cache_scope, self.tenant_id)
+        self.data_version = get_version(self.data_scope)
+        key = self._page_cache_key(request)
+        self._page_etag = (
+            f'"{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+        )
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if '*' in etags or self._page_etag in etags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        cached = rbac_cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        self._page_cache_pending = key
+        with fresh_reads(self.data_scope):
+            return handler(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        etag = getattr(self, '_page_etag', None)
+        if etag is None or response.status_code not in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            return response
+
+        key = getattr(self, '_page_cache_pending', None)
+        if key and response.status_code == status.HTTP_200_OK:
+            response.render()
+            rbac_cache.set(
+                key,
+                (response.content, response['Content-Type']),
+                settings.CATALOG_CACHE_TIMEOUT
+            )
+
+        response['ETag'] = etag
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=settings.CATALOG_CACHE_MAX_AGE,
+            must_revalidate=True
+        )
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
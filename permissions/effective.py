@@ -0,0 +1,330 @@
+"""
+Поддержка денормализованной таблицы user_effective_permissions.
+
+Маска пользователя на элемент - разрешенные права, сведенные по правилам
+всех его ролей с учетом запретов, приоритетов (permissions.flags.decide) и
+правил-шаблонов (permissions.namespaces); строки есть и для шаблонов.
+Маски пересчитываются из исходных таблиц только для затронутых пар
+(пользователь, элемент): при изменении ролей пользователя - для всех его
+элементов, при изменении правила - для владельцев роли по одному элементу,
+а правила-шаблона или имени элемента - для всех элементов владельцев.
+
+Назначения ролей могут действовать ограниченное время (UserRole.valid_from,
+expires_at). Строка хранит срок valid_until - ближайший момент, когда ее
+права могут измениться; проверка прав пересчитывает пользователя, у
+которого есть строка с истекшим сроком (ленивое истечение).
+"""
+from collections import defaultdict
+
+from django.db import connections, router
+from django.db.models import Q
+from django.utils import timezone
+
+from . import namespaces
+from .flags import PERMISSION_FIELDS, Rule, pack
+from .models import (
+    AccessRoleRule,
+    BusinessElement,
+    UserEffectivePermission,
+    UserRole,
+)
+
+BATCH_SIZE = 1000
+
+
+def _boundary(valid_from, expires_at, now):
+    """Ближайший момент смены активности назначения; None - не сменится."""
+    if valid_from is not None and valid_from > now:
+        return valid_from
+    return expires_at
+
+
+def expected_permissions(element_ids=None, now=None, **filters):
+    """
+    Строки {(user_id, element_id): (маска, действует до)} по исходным
+    таблицам на момент now.
+
+    filters применяются к AccessRoleRule, пользователь доступен как
+    ``role__user_roles__user_id``. Правила ролей разрешаются по иерархии
+    имен (см. permissions.namespaces), поэтому filters должны включать
+    шаблоны над нужными элементами. element_ids ограничивает результат.
+
+    Истекшие назначения не учитываются. Права дают только действующие
+    назначения; будущие и истекающие задают срок строк - ближайший момент,
+    когда права могут измениться (None - бессрочно). Строки без прав и без
+    срока не возвращаются.
+    """
+    if now is None:
+        now = timezone.now()
+    rows = AccessRoleRule.objects.order_by().filter(
+        Q(role__user_roles__expires_at__isnull=True)
+        | Q(role__user_roles__expires_at__gt=now),
+        role__user_roles__isnull=False,
+        **filters
+    ).values_list(
+        'role__user_roles__user_id', 'role__user_roles__valid_from',
+        'role__user_roles__expires_at', 'role_id', 'element_id',
+        'element__name', 'effect', 'priority', *PERMISSION_FIELDS
+    )
+    rules = defaultdict(lambda: defaultdict(dict))
+    boundaries = defaultdict(dict)
+    pending = defaultdict(set)
+    element_by_name = defaultdict(dict)
+    for (user_id, valid_from, expires_at, role_id, element_id, name,
+         effect, priority, *values) in rows:
+        rules[user_id][role_id][name] = Rule(
+            priority, effect == AccessRoleRule.DENY, pack(values)
+        )
+        boundary = _boundary(valid_from, expires_at, now)
+        if boundary is not None:
+            boundaries[user_id][role_id] = boundary
+        if valid_from is not None and valid_from > now:
+            pending[user_id].add(role_id)
+        element_by_name[user_id][name] = element_id
+
+    expected = {}
+    for user_id, rules_by_role in rules.items():
+        valid_until = _valid_until(rules_by_role, boundaries[user_id])
+        masks = namespaces.combine_roles(
+            [
+                role_rules for role_id, role_rules in rules_by_role.items()
+                if role_id not in pending[user_id]
+            ],
+            names=element_by_name[user_id],
+            keep=valid_until
+        )
+        for name, mask in masks.items():
+            element_id = element_by_name[user_id][name]
+            if element_ids is None or element_id in element_ids:
+                expected[(user_id, element_id)] = (
+                    mask, valid_until.get(name)
+                )
+    return expected
+
+
+def _valid_until(rules_by_role, boundaries):
+    """
+    Срок строк {имя: момент}: ближайшая смена активности назначений ролей,
+    у которых есть правило на имя или шаблон над ним.
+    """
+    names = {name for rules in rules_by_role.values() for name in rules}
+    valid_until = {}
+    for role_id, boundary in boundaries.items():
+        role_rules = rules_by_role[role_id]
+        for name in names:
+            if not any(
+                candidate in role_rules
+                for candidate in namespaces.candidates(name)
+            ):
+                continue
+            current = valid_until.get(name)
+            if current is None or boundary < current:
+                valid_until[name] = boundary
+    return valid_until
+
+
+def diff(expected, current_queryset):
+    """
+    Расхождения таблицы с ожидаемыми строками в пределах current_queryset.
+
+    Возвращает (записать, удалить): словарь {(user_id, element_id):
+    (маска, действует до)} и список пар, которых быть не должно.
+    """
+    current = {
+        (user_id, element_id): (flags, valid_until)
+        for user_id, element_id, flags, valid_until in (
+            current_queryset.values_list(
+                'user_id', 'element_id', 'flags', 'valid_until'
+            )
+        )
+    }
+    to_write = {
+        key: row for key, row in expected.items()
+        if current.get(key) != row
+    }
+    to_delete = [key for key in current if key not in expected]
+    return to_write, to_delete
+
+
+def apply(to_write, to_delete):
+    if to_write:
+        UserEffectivePermission.objects.bulk_create(
+            [
+                UserEffectivePermission(
+                    user_id=user_id,
+                    element_id=element_id,
+                    flags=mask,
+                    valid_until=valid_until
+                )
+                for (user_id, element_id), (mask, valid_until) in (
+                    to_write.items()
+                )
+            ],
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['user', 'element'],
+            update_fields=['flags', 'valid_until']
+        )
+    for start in range(0, len(to_delete), BATCH_SIZE):
+        UserEffectivePermission.objects.filter(
+            pk__in=to_delete[start:start + BATCH_SIZE]
+        ).delete()
+
+
+def delete_rows(queryset):
+    """
+    Удалить строки queryset'а одним запросом DELETE без загрузки объектов,
+    каскадов и сигналов. Возвращает число удаленных строк.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    # Первичный ключ может быть составным (user_effective_permissions).
+    fields = model._meta.pk_fields
+    subquery, params = queryset.order_by().values_list(
+        *(field.attname for field in fields)
+    ).query.get_compiler(using).as_sql()
+    columns = ', '.join(
+        connection.ops.quote_name(field.column) for field in fields
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE ({columns}) IN ({subquery})',
+            params
+        )
+        return cursor.rowcount
+
+
+def refresh_user(user_id):
+    """Пересчитать все права пользователя (изменились его роли)."""
+    apply(*diff(
+        expected_permissions(role__user_roles__user_id=user_id),
+        UserEffectivePermission.objects.filter(user_id=user_id)
+    ))
+
+
+def refresh_users(user_ids):
+    """Пересчитать все права пользователей user_ids."""
+    apply(*diff(
+        expected_permissions(role__user_roles__user_id__in=user_ids),
+        UserEffectivePermission.objects.filter(user_id__in=user_ids)
+    ))
+
+
+def _refresh_in_batches(user_ids, refresh):
+    batch = []
+    for user_id in user_ids.iterator(chunk_size=BATCH_SIZE):
+        batch.append(user_id)
+        if len(batch) == BATCH_SIZE:
+            refresh(batch)
+            batch = []
+    if batch:
+        refresh(batch)
+
+
+def refresh_role_element(role_id, element_id, element_name=None):
+    """
+    Пересчитать права владельцев роли на элемент (изменилось правило).
+    element_name - имя элемента, если уже известно.
+    """
+    user_ids = UserRole.objects.filter(
+        role_id=role_id
+    ).order_by('user_id').values_list('user_id', flat=True)
+    name = element_name
+    if name is None:
+        name = BusinessElement.objects.filter(
+            pk=element_id
+        ).values_list('name', flat=True).first()
+
+    if name is not None and namespaces.is_wildcard(name):
+        # Шаблон влияет на все элементы под ним.
+        _refresh_in_batches(user_ids, refresh_users)
+    else:
+        _refresh_in_batches(
+            user_ids,
+            lambda batch: _refresh_element_for_users(element_id, name, batch)
+        )
+
+
+def refresh_element(element_id):
+    """
+    Пересчитать права пользователей, чьи роли имеют правила на элемент
+    (изменилось имя элемента, а с ним и место в иерархии).
+    """
+    user_ids = UserRole.objects.filter(
+        role__access_rules__element_id=element_id
+    ).distinct().order_by('user_id').values_list('user_id', flat=True)
+    _refresh_in_batches(user_ids, refresh_users)
+
+
+def _refresh_element_for_users(element_id, name, user_ids):
+    if name is None:
+        names = {'element_id': element_id}
+    else:
+        names = {'element__name__in': list(namespaces.candidates(name))}
+    apply(*diff(
+        expected_permissions(
+            element_ids={element_id},
+            role__user_roles__user_id__in=user_ids,
+            **names
+        ),
+        UserEffectivePermission.objects.filter(
+            element_id=element_id,
+            user_id__in=user_ids
+        )
+    ))
+
+
+def user_id_ranges(batch_size=BATCH_SIZE, tenant_id=None):
+    """Диапазоны [start, stop) id пользователей (арендатора tenant_id), у
+    которых есть роли или строки в таблице."""
+    user_roles = UserRole.objects.all()
+    rows = UserEffectivePermission.objects.all()
+    if tenant_id is not None:
+        user_roles = user_roles.filter(tenant_id=tenant_id)
+        rows = rows.filter(user__tenant_id=tenant_id)
+    bounds = [
+        value for value in (
+            user_roles.order_by('user_id').values_list(
+                'user_id', flat=True
+            ).first(),
+            user_roles.order_by('-user_id').values_list(
+                'user_id', flat=True
+            ).first(),
+            rows.order_by('user_id').values_list(
+                'user_id', flat=True
+            ).first(),
+            rows.order_by('-user_id').values_list(
+                'user_id', flat=True
+            ).first(),
+        )
+        if value is not None
+    ]
+    if not bounds:
+        return
+    for start in range(min(bounds), max(bounds) + 1, batch_size):
+        yield start, start + batch_size
+
+
+def range_diff(start, stop, tenant_id=None):
+    """
+    Расхождения для пользователей с id в [start, stop) (только арендатора
+    tenant_id, если задан).
+    """
+    rules = {}
+    rows = UserEffectivePermission.objects.filter(
+        user_id__gte=start,
+        user_id__lt=stop
+    )
+    if tenant_id is not None:
+        rules['tenant_id'] = tenant_id
+        rows = rows.filter(user__tenant_id=tenant_id)
+    return diff(
+        expected_permissions(
+            role__user_roles__user_id__gte=start,
+            role__user_roles__user_id__lt=stop,
+            **rules
+        ),
+        rows
+    )
@@ -0,0 +1,64 @@
+"""
+Сборка снимка политики арендатора (permissions.snapshot) из БД.
+"""
+import os
+import tempfile
+import time
+
+from django.db import transaction
+
+from . import feed, snapshot
+from .flags import PERMISSION_FIELDS, Rule, pack
+from .models import AccessRoleRule, BusinessElement, Role
+
+
+def build(tenant_id):
+    """Снимок политики арендатора в виде bytes."""
+    with transaction.atomic():
+        # Версия читается до данных: снимок не старше нее, и лента
+        # изменений с этой версии доводит его до текущего состояния. Она
+        # считается по тому же правилу, что и в ленте: записи, перед
+        # которыми еще могут появиться меньшие номера, в нее не входят.
+        version = feed.version(tenant_id)
+        elements = BusinessElement.objects.filter(
+            tenant_id=tenant_id
+        ).values_list('name', flat=True)
+        roles = {
+            role_id: {} for role_id in Role.objects.filter(
+                tenant_id=tenant_id
+            ).values_list('pk', flat=True)
+        }
+        rows = AccessRoleRule.objects.filter(
+            tenant_id=tenant_id
+        ).values_list(
+            'role_id', 'element__name', 'effect', 'priority',
+            *PERMISSION_FIELDS
+        )
+        for role_id, name, effect, priority, *values in rows:
+            roles.setdefault(role_id, {})[name] = Rule(
+                priority, effect == AccessRoleRule.DENY, pack(values)
+            )
+        return snapshot.pack(
+            tenant_id, version, int(time.time()), list(elements), roles
+        )
+
+
+def write(path, data):
+    """
+    Записать снимок атомарно: через временный файл в том же каталоге и
+    os.replace. Процессы, отобразившие старый файл, дочитывают его.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp создает файл только для владельца; снимок читают другие
+        # сервисы.
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
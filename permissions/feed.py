@@ -0,0 +1,268 @@
+"""
+Лента изменений политики доступа для сервисов-потребителей.
+
+Каждое создание, изменение и удаление роли, бизнес-элемента, правила
+доступа и назначения роли пишет запись в журнал policy_changes в той же
+транзакции (сигналы permissions.signals; массовые операции - record_many).
+Номер записи - версия ленты: потребитель запрашивает ``?since=<версия>``,
+применяет изменения и запоминает версию из ответа. Журнал заполнен
+объектами, существовавшими до его появления, поэтому ``since=0`` дает
+полную копию политики.
+
+Внутри страницы несколько изменений одного объекта сводятся к последнему,
+а данные объекта читаются на момент запроса: применять их можно повторно
+и в любом порядке внутри страницы. Удаленные объекты приходят как
+tombstone (``deleted: true`` без данных).
+
+Номера записей выдаются при вставке, а видны после коммита, поэтому
+транзакция с меньшим номером могла бы стать видимой позже большего. На
+PostgreSQL запись журнала берет рекомендательную блокировку арендатора до
+конца транзакции: номера записей арендатора выдаются в порядке коммитов, и
+лента отдает все видимые записи. Транзакции, меняющие политику одного
+арендатора, при этом коммитятся по очереди. На других СУБД лента отдает
+записи только старше POLICY_FEED_SETTLE_SECONDS по часам БД и
+останавливается на первой более новой: транзакция, закоммиченная позже
+своей первой записи журнала больше чем на это окно, может быть пропущена.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import (
+    BooleanField,
+    Exists,
+    ExpressionWrapper,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Value,
+)
+from django.db.models.functions import Now
+
+from .authorization import authorize
+from .effective import BATCH_SIZE
+from .flags import PERMISSION_FIELDS
+from .models import (
+    AccessRoleRule,
+    BusinessElement,
+    PolicyChange,
+    Role,
+    UserRole,
+)
+
+# Тип объекта -> (модель, бизнес-элемент с правом чтения, поля в ленте).
+KINDS = {
+    PolicyChange.ROLE: (
+        Role, 'roles',
+        ('name', 'description', 'created_at', 'updated_at'),
+    ),
+    PolicyChange.BUSINESS_ELEMENT: (
+        BusinessElement, 'business_elements',
+        ('name', 'description', 'created_at', 'updated_at'),
+    ),
+    PolicyChange.ACCESS_RULE: (
+        AccessRoleRule, 'access_rules',
+        (
+            'role_id', 'element_id', 'effect', 'priority',
+            *PERMISSION_FIELDS, 'created_at', 'updated_at',
+        ),
+    ),
+    PolicyChange.USER_ROLE: (
+        UserRole, 'user_roles',
+        ('user_id', 'role_id', 'valid_from', 'expires_at', 'created_at'),
+    ),
+}
+MODEL_KINDS = {model: kind for kind, (model, _, _) in KINDS.items()}
+
+# Первый ключ рекомендательных блокировок журнала; второй - арендатор.
+JOURNAL_LOCK = 0x52424143
+
+
+def _commit_ordered(using):
+    """Выдаются ли номера записей журнала в порядке коммитов."""
+    return connections[using].vendor == 'postgresql'
+
+
+def _lock_journal(tenant_ids):
+    """
+    Заблокировать журнал арендаторов до конца текущей транзакции
+    (PostgreSQL): следующая транзакция получит номера записей только после
+    коммита этой.
+    """
+    using = router.db_for_write(PolicyChange)
+    if not _commit_ordered(using):
+        return
+    with connections[using].cursor() as cursor:
+        for tenant_id in sorted(set(tenant_ids)):
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s::integer, %s::integer)',
+                [JOURNAL_LOCK, tenant_id]
+            )
+
+
+def record(instance, deleted=False):
+    """Записать изменение объекта instance в журнал."""
+    # Вне транзакции блокировка и запись выполняются в одной.
+    with transaction.atomic(savepoint=False):
+        _lock_journal([instance.tenant_id])
+        PolicyChange.objects.create(
+            tenant_id=instance.tenant_id,
+            kind=MODEL_KINDS[type(instance)],
+            object_id=instance.pk,
+            deleted=deleted
+        )
+
+
+def record_many(kind, rows, deleted=False, batch_size=BATCH_SIZE):
+    """
+    Записать изменения объектов типа kind пачками; rows - пары
+    (tenant_id, id). Для массовых операций без сигналов.
+    """
+    def flush(batch):
+        _lock_journal(change.tenant_id for change in batch)
+        PolicyChange.objects.bulk_create(batch)
+
+    batch = []
+    with transaction.atomic(savepoint=False):
+        for tenant_id, object_id in rows:
+            batch.append(PolicyChange(
+                tenant_id=tenant_id,
+                kind=kind,
+                object_id=object_id,
+                deleted=deleted
+            ))
+            if len(batch) == batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+
+def record_queryset(queryset, deleted=False, batch_size=BATCH_SIZE):
+    """Записать изменения всех объектов queryset'а."""
+    record_many(
+        MODEL_KINDS[queryset.model],
+        queryset.order_by('pk').values_list('tenant_id', 'pk').iterator(
+            chunk_size=batch_size
+        ),
+        deleted,
+        batch_size
+    )
+
+
+def compact():
+    """
+    Удалить записи журнала, у объекта которых есть более поздняя запись.
+    Потребитель с любой версией все равно получит последнее состояние
+    объекта; tombstone'ы остаются. Возвращает число удаленных записей.
+    """
+    newer = PolicyChange.objects.filter(
+        kind=OuterRef('kind'),
+        object_id=OuterRef('object_id'),
+        id__gt=OuterRef('id')
+    )
+    return PolicyChange.objects.filter(Exists(newer)).delete()[0]
+
+
+def readable_kinds(user):
+    """Типы объектов, которые пользователь может читать целиком."""
+    return [
+        kind for kind, (_, element_name, _) in KINDS.items()
+        if authorize(user, element_name, 'read')
+    ]
+
+
+def _load(tenant_id, kind, ids):
+    model, _, fields = KINDS[kind]
+    return {
+        row['id']: row
+        for row in model.objects.filter(
+            tenant_id=tenant_id, pk__in=ids
+        ).order_by().values('id', *fields)
+    }
+
+
+def settled(using):
+    """
+    Выражение "запись журнала можно выдавать": все записи с меньшими
+    номерами уже видны.
+    """
+    if _commit_ordered(using):
+        return Value(True)
+    settle = timedelta(seconds=settings.POLICY_FEED_SETTLE_SECONDS)
+    return ExpressionWrapper(
+        Q(created_at__lte=Now() - settle),
+        output_field=BooleanField()
+    )
+
+
+def version(tenant_id):
+    """
+    Последняя версия ленты арендатора, до которой все записи можно
+    выдавать (правило settled, как в changes).
+    """
+    journal = PolicyChange.objects.filter(tenant_id=tenant_id)
+    unsettled = journal.annotate(settled=settled(journal.db)).filter(
+        settled=False
+    ).aggregate(first=Min('id'))['first']
+    if unsettled is not None:
+        journal = journal.filter(id__lt=unsettled)
+    return journal.aggregate(version=Max('id'))['version'] or 0
+
+
+def changes(tenant_id, since, limit, kinds):
+    """
+    Страница ленты арендатора после версии since: не больше limit записей
+    журнала типов kinds.
+
+    Возвращает словарь ``version`` (версия для следующего запроса),
+    ``has_more`` (следующая страница уже доступна) и ``changes``.
+    """
+    journal = PolicyChange.objects.filter(
+        tenant_id=tenant_id, id__gt=since, kind__in=kinds
+    )
+    entries = list(journal.annotate(
+        settled=settled(journal.db)
+    ).order_by('id').values_list(
+        'id', 'kind', 'object_id', 'deleted', 'settled'
+    )[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    for index, entry in enumerate(entries):
+        if not entry[4]:
+            entries = entries[:index]
+            has_more = False
+            break
+
+    # Последнее изменение каждого объекта страницы.
+    latest = {}
+    for version, kind, object_id, deleted, _ in entries:
+        latest.pop((kind, object_id), None)
+        latest[kind, object_id] = (version, deleted)
+
+    ids = {}
+    for (kind, object_id), (_, deleted) in latest.items():
+        if not deleted:
+            ids.setdefault(kind, []).append(object_id)
+    objects = {
+        kind: _load(tenant_id, kind, kind_ids)
+        for kind, kind_ids in ids.items()
+    }
+
+    result = []
+    for (kind, object_id), (version, deleted) in latest.items():
+        data = None if deleted else objects[kind].get(object_id)
+        result.append({
+            'version': version,
+            'type': kind,
+            'id': object_id,
+            # Объект удален после этой записи: tombstone отдается сразу.
+            'deleted': data is None,
+            'data': data,
+        })
+    return {
+        'version': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'changes': result,
+    }
@@ -0,0 +1,80 @@
+"""
+Упаковка прав доступа AccessRoleRule в битовую маску.
+
+Порядок битов совпадает с порядком полей в PERMISSION_FIELDS и является
+частью публичного формата (матрица прав, эффективные права).
+"""
+from collections import namedtuple
+
+PERMISSION_FIELDS = (
+    'read_permission',
+    'read_all_permission',
+    'create_permission',
+    'update_permission',
+    'update_all_permission',
+    'delete_permission',
+    'delete_all_permission',
+)
+
+(
+    READ,
+    READ_ALL,
+    CREATE,
+    UPDATE,
+    UPDATE_ALL,
+    DELETE,
+    DELETE_ALL,
+) = (1 << index for index in range(len(PERMISSION_FIELDS)))
+
+ALL_FLAGS = (1 << len(PERMISSION_FIELDS)) - 1
+
+# Действие RBAC -> (бит "свои объекты", бит "все объекты").
+ACTION_FLAGS = {
+    'read': (READ, READ_ALL),
+    'create': (0, CREATE),
+    'update': (UPDATE, UPDATE_ALL),
+    'delete': (DELETE, DELETE_ALL),
+}
+
+
+def pack(values):
+    """Маска из значений прав в порядке PERMISSION_FIELDS."""
+    mask = 0
+    for index, value in enumerate(values):
+        if value:
+            mask |= 1 << index
+    return mask
+
+
+def pack_rule(rule):
+    """Маска прав правила доступа."""
+    return pack(getattr(rule, field) for field in PERMISSION_FIELDS)
+
+
+def unpack(mask):
+    """Словарь {поле: bool} из маски."""
+    return {
+        field: bool(mask & (1 << index))
+        for index, field in enumerate(PERMISSION_FIELDS)
+    }
+
+
+# Правило, действующее на элемент: приоритет, запрет ли это и маска.
+Rule = namedtuple('Rule', ('priority', 'deny', 'mask'))
+
+
+def decide(rules):
+    """
+    Итоговая маска разрешенных прав по правилам Rule.
+
+    Каждый бит решает правило с наибольшим приоритетом среди задающих
+    этот бит; при равном приоритете запрет сильнее разрешения. Порядок
+    ролей на результат не влияет.
+    """
+    allowed = decided = 0
+    # По убыванию приоритета, при равном - запреты первыми.
+    for rule in sorted(rules, reverse=True):
+        if not rule.deny:
+            allowed |= rule.mask & ~decided
+        decided |= rule.mask
+    return allowed
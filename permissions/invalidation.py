@@ -0,0 +1,245 @@
+"""
+Рассылка инвалидаций кэша прав между процессами и узлами.
+
+Если версии прав (permissions.versions) хранятся в памяти процесса
+(L2 - LocMemCache), изменение на одном узле не видно остальным, и они
+читают старые права до истечения таймаутов кэша. Поэтому bump_version
+дополнительно пишет события об измененных областях в таблицу
+rbac_invalidations в той же транзакции, что и сами изменения (transactional
+outbox), а слушатель в каждом процессе применяет чужие события к своим
+версиям. Сбрасываются только записи затронутых областей: прав
+пользователя (user_scope) или политики арендатора (tenant_scope) - правила
+ролей и бизнес-элементы меняют политику арендатора.
+
+На PostgreSQL триггер таблицы вызывает pg_notify после коммита, и
+слушатель просыпается по LISTEN; на остальных СУБД таблица опрашивается
+раз в RBAC_INVALIDATION_POLL_INTERVAL секунд по индексу created_at.
+
+Событие получает created_at при INSERT, а видно становится после коммита.
+Слушатель перечитывает окно RBAC_INVALIDATION_LOOKBACK секунд до
+последнего прочитанного события, а на PostgreSQL - еще и от начала самой
+старой незакоммиченной пишущей транзакции (pg_stat_activity), так что
+события долгих транзакций не теряются. На других СУБД транзакция,
+закоммиченная позже соседних больше чем на окно, может быть пропущена
+(на SQLite записи выполняются по очереди, и такого не бывает).
+
+Старые события удаляют слушатели, процессы, пишущие события (не чаще раза
+в PRUNE_INTERVAL секунд, после коммита), и команда
+``manage.py prune_invalidations``.
+
+Слушатель запускается в каждом воркере функцией ``start_listener``
+(gunicorn.conf.py, хук post_worker_init).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Value
+from django.db.models.functions import Least, Now
+
+from .models import CacheInvalidation
+from .versions import bump_local
+
+logger = logging.getLogger('permissions.invalidation')
+
+# Канал NOTIFY; триггер создается миграцией 0009_cache_invalidation.
+CHANNEL = 'rbac_invalidation'
+# Даже с LISTEN таблица перечитывается не реже раза в NOTIFY_TIMEOUT
+# секунд: уведомления, потерянные при переподключении, не теряют событий.
+NOTIFY_TIMEOUT = 30
+# Период удаления старых событий.
+PRUNE_INTERVAL = 60
+
+# Начало самой старой транзакции других сессий, которая уже что-то
+# записала: ее события, видимые только после коммита, не старше него.
+IN_FLIGHT_SQL = """
+    SELECT min(xact_start) FROM pg_stat_activity
+    WHERE datname = current_database()
+        AND backend_xid IS NOT NULL
+        AND pid <> pg_backend_pid()
+"""
+
+_HOST = socket.gethostname()
+_listener_pid = None
+_listener_lock = threading.Lock()
+# Когда процесс последний раз запланировал удаление старых событий.
+_pruned_at = 0.0
+
+
+def origin():
+    """Идентификатор текущего процесса в событиях."""
+    return f'{_HOST}:{os.getpid()}'
+
+
+def enabled():
+    """Включена ли рассылка (RBAC_INVALIDATION_BUS)."""
+    value = settings.RBAC_INVALIDATION_BUS
+    if value == 'auto':
+        backend = settings.CACHES[settings.RBAC_CACHE_ALIAS]['BACKEND']
+        return backend.endswith('.LocMemCache')
+    return value == 'True'
+
+
+def publish(scopes):
+    """
+    Записать события об изменении областей scopes одним INSERT в текущей
+    транзакции: при откате события пропадут вместе с изменениями.
+    """
+    global _pruned_at
+    source = origin()
+    CacheInvalidation.objects.bulk_create(
+        CacheInvalidation(scope=scope, origin=source) for scope in scopes
+    )
+    # Слушатели запущены не везде (runserver, команды), поэтому старые
+    # события удаляют и пишущие процессы - после коммита, вне транзакции
+    # изменения.
+    if time.monotonic() - _pruned_at > PRUNE_INTERVAL:
+        _pruned_at = time.monotonic()
+        transaction.on_commit(prune_events, robust=True)
+
+
+def prune_events(using='default'):
+    """Удалить события старше RBAC_INVALIDATION_RETENTION секунд."""
+    return CacheInvalidation.objects.using(using).filter(
+        created_at__lt=Now() - timedelta(
+            seconds=settings.RBAC_INVALIDATION_RETENTION
+        )
+    ).delete()[0]
+
+
+class Listener:
+    """Применяет события других процессов к версиям текущего процесса."""
+
+    def __init__(self, using='default'):
+        self.using = using
+        self.origin = origin()
+        # Прочитанные события {id: created_at} в пределах окна: события
+        # перечитываются, пока не выйдут из окна RBAC_INVALIDATION_LOOKBACK.
+        self._seen = {}
+        self._since = None
+        self._pruned_at = time.monotonic()
+
+    def _in_flight(self):
+        """
+        Начало самой старой незакоммиченной пишущей транзакции (только
+        PostgreSQL) или None.
+        """
+        connection = connections[self.using]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(IN_FLIGHT_SQL)
+            return cursor.fetchone()[0]
+
+    def poll(self):
+        """Применить новые события; возвращает число сброшенных областей."""
+        lookback = timedelta(seconds=settings.RBAC_INVALIDATION_LOOKBACK)
+        in_flight = self._in_flight()
+        # Окно отсчитывается от последнего события по часам БД; при первом
+        # чтении - от текущего времени БД. Незакоммиченные транзакции
+        # расширяют окно до своего начала.
+        if self._since is None:
+            start = Now() - lookback
+            if in_flight is not None:
+                start = Least(start, Value(in_flight))
+        else:
+            start = self._since - lookback
+            if in_flight is not None:
+                start = min(start, in_flight)
+        events = CacheInvalidation.objects.using(self.using).filter(
+            created_at__gte=start
+        ).order_by('id').values_list('id', 'scope', 'origin', 'created_at')
+        scopes = set()
+        for pk, scope, source, created_at in events:
+            if pk in self._seen:
+                continue
+            self._seen[pk] = created_at
+            if source != self.origin:
+                scopes.add(scope)
+            if self._since is None or created_at > self._since:
+                self._since = created_at
+        for scope in scopes:
+            bump_local(scope)
+        if self._since is not None:
+            start = self._since - lookback
+            if in_flight is not None:
+                start = min(start, in_flight)
+            self._seen = {
+                pk: created_at for pk, created_at in self._seen.items()
+                if created_at >= start
+            }
+        return len(scopes)
+
+    def prune(self):
+        """Удалить старые события (prune_events)."""
+        self._pruned_at = time.monotonic()
+        return prune_events(self.using)
+
+    def _notifications(self):
+        # Отдельное соединение psycopg 3 в autocommit для LISTEN; None, если
+        # СУБД или драйвер не поддерживают уведомления.
+        connection = connections[self.using]
+        if connection.vendor != 'postgresql':
+            return None
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        if not is_psycopg3:
+            return None
+        import psycopg
+        listen = psycopg.connect(
+            **connection.get_connection_params(), autocommit=True
+        )
+        listen.execute(f'LISTEN {CHANNEL}')
+        return listen
+
+    def run(self):
+        """Цикл слушателя; выполняется в отдельном потоке."""
+        listen = None
+        while True:
+            try:
+                if listen is None or listen.closed:
+                    listen = self._notifications()
+                if listen is None:
+                    time.sleep(settings.RBAC_INVALIDATION_POLL_INTERVAL)
+                else:
+                    for _ in listen.notifies(
+                        timeout=NOTIFY_TIMEOUT, stop_after=1
+                    ):
+                        pass
+                self.poll()
+                if time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+                    self.prune()
+            except Exception:
+                # Поток не должен завершаться: после любой ошибки (в том
+                # числе psycopg при LISTEN) соединения открываются заново.
+                logger.exception('Ошибка чтения событий инвалидации')
+                connections[self.using].close()
+                if listen is not None:
+                    listen.close()
+                    listen = None
+                time.sleep(settings.RBAC_INVALIDATION_POLL_INTERVAL)
+
+
+def start_listener():
+    """
+    Запустить слушатель в текущем процессе, если рассылка включена.
+    Повторные вызовы в том же процессе ничего не делают; после fork'а
+    слушатель нужно запустить заново (потоки не наследуются).
+    """
+    global _listener_pid
+    if not enabled():
+        return False
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return False
+        _listener_pid = os.getpid()
+        threading.Thread(
+            target=Listener().run,
+            name='rbac-invalidation',
+            daemon=True
+        ).start()
+    return True
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from permissions import effective
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверить user_effective_permissions с правилами и ролями; '
+        'завершается с ошибкой при расхождениях'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=effective.BATCH_SIZE,
+            help='Сколько id пользователей обрабатывать за один проход'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Исправить найденные расхождения'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        for start, stop in effective.user_id_ranges(options['batch_size']):
+            to_write, to_delete = effective.range_diff(start, stop)
+            for (user_id, element_id), (mask, valid_until) in sorted(
+                to_write.items()
+            ):
+                expected = f'{mask}'
+                if valid_until is not None:
+                    expected += f' до {valid_until.isoformat()}'
+                self.stdout.write(
+                    f'user={user_id} element={element_id}: '
+                    f'ожидается {expected}'
+                )
+            for user_id, element_id in sorted(to_delete):
+                self.stdout.write(
+                    f'user={user_id} element={element_id}: лишняя строка'
+                )
+            mismatches += len(to_write) + len(to_delete)
+            if options['fix']:
+                effective.apply(to_write, to_delete)
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f'Исправлено расхождений: {mismatches}'
+            ))
+        else:
+            raise CommandError(f'Найдено расхождений: {mismatches}')
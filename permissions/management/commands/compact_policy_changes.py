@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from permissions.feed import compact
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжать журнал ленты изменений политики: удалить записи, замененные '
+        'более поздними изменениями тех же объектов'
+    )
+
+    def handle(self, *args, **options):
+        deleted = compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено устаревших записей журнала: {deleted}'
+        ))
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Tenant
+from permissions.export import build, write
+from permissions.snapshot import HEADER
+
+
+class Command(BaseCommand):
+    help = (
+        'Скомпилировать роли, бизнес-элементы и правила доступа арендатора '
+        'в бинарный снимок для проверки прав в других сервисах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            default=settings.DEFAULT_TENANT_SLUG,
+            help='Идентификатор арендатора'
+        )
+        parser.add_argument(
+            '--output',
+            help='Путь к файлу снимка; по умолчанию policy-<арендатор>.rbac'
+        )
+
+    def handle(self, *args, **options):
+        slug = options['tenant']
+        tenant_id = Tenant.objects.filter(slug=slug).values_list(
+            'pk', flat=True
+        ).first()
+        if tenant_id is None:
+            raise CommandError(f'Арендатор {slug} не найден')
+
+        data = build(tenant_id)
+        path = options['output'] or f'policy-{slug}.rbac'
+        write(path, data)
+        _, _, _, _, version, _, elements, roles = HEADER.unpack_from(data)
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок {path}: версия {version}, элементов {elements}, '
+            f'ролей {roles}, {len(data)} байт'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from permissions.invalidation import prune_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Удалить события инвалидации кэша старше '
+        'RBAC_INVALIDATION_RETENTION секунд'
+    )
+
+    def handle(self, *args, **options):
+        deleted = prune_events()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено событий инвалидации: {deleted}'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from permissions import effective
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать таблицу user_effective_permissions из правил и ролей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=effective.BATCH_SIZE,
+            help='Сколько id пользователей обрабатывать за один проход'
+        )
+
+    def handle(self, *args, **options):
+        written = deleted = 0
+        for start, stop in effective.user_id_ranges(options['batch_size']):
+            with transaction.atomic():
+                to_write, to_delete = effective.range_diff(start, stop)
+                effective.apply(to_write, to_delete)
+            written += len(to_write)
+            deleted += len(to_delete)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано строк: {written}, удалено: {deleted}'
+        ))
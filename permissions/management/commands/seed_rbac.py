@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from permissions import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Сгенерировать синтетических пользователей, роли, правила и '
+        'назначения ролей для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        defaults = seeding.SeedConfig()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--roles', type=int, default=defaults.roles)
+        parser.add_argument(
+            '--elements',
+            type=int,
+            default=defaults.elements,
+            help='Число бизнес-элементов, включая элементы API'
+        )
+        parser.add_argument(
+            '--roles-per-user',
+            default='{}-{}'.format(*defaults.roles_per_user),
+            help='Ролей у пользователя: число или диапазон min-max'
+        )
+        parser.add_argument(
+            '--rules-per-role',
+            default='{}-{}'.format(*defaults.rules_per_role),
+            help='Правил у роли: число или диапазон min-max'
+        )
+        parser.add_argument(
+            '--role-distribution',
+            choices=seeding.DISTRIBUTIONS,
+            default=defaults.role_distribution,
+            help='Популярность ролей при назначении'
+        )
+        parser.add_argument(
+            '--zipf-exponent',
+            type=float,
+            default=defaults.zipf_exponent
+        )
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=defaults.batch_size
+        )
+        parser.add_argument(
+            '--tenant',
+            default=settings.DEFAULT_TENANT_SLUG,
+            help='Идентификатор арендатора; создается при отсутствии'
+        )
+        parser.add_argument(
+            '--password',
+            default=defaults.password,
+            help='Пароль всех сгенерированных пользователей'
+        )
+        parser.add_argument(
+            '--prefix',
+            default=defaults.prefix,
+            help='Префикс имен сгенерированных объектов'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Использовать bulk_create и на PostgreSQL'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее сгенерированные данные с тем же префиксом'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            config = seeding.SeedConfig(
+                users=options['users'],
+                roles=options['roles'],
+                elements=options['elements'],
+                roles_per_user=seeding.parse_range(
+                    options['roles_per_user']
+                ),
+                rules_per_role=seeding.parse_range(
+                    options['rules_per_role']
+                ),
+                role_distribution=options['role_distribution'],
+                zipf_exponent=options['zipf_exponent'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                password=options['password'],
+                prefix=options['prefix'],
+                use_copy=not options['no_copy'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        tenant = seeding.get_tenant(options['tenant'])
+        if options['clear']:
+            seeding.clear(tenant, config.prefix)
+        elif seeding.has_seeded_data(tenant, config.prefix):
+            raise CommandError(
+                f'У арендатора {tenant.slug} уже есть данные с префиксом '
+                f'{config.prefix}; используйте --clear или --prefix'
+            )
+
+        counts = seeding.seed(tenant, config)
+        self.stdout.write('Пересчет эффективных прав...')
+        seeding.refresh_derived_data(tenant)
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{name}: {count}' for name, count in counts.items())
+        ))
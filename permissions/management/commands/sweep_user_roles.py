@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from permissions import effective, feed
+from permissions.models import PolicyChange, UserRole
+from permissions.versions import bump_version, user_scope
+
+
+class Command(BaseCommand):
+    help = (
+        'Удалить истекшие назначения ролей пачками и пересчитать права '
+        'их пользователей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=effective.BATCH_SIZE,
+            help='Сколько назначений удалять в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Короткая транзакция на пачку: блокировки держатся только на
+            # удаляемых строках. Пачка читается из индекса
+            # user_roles_expires_idx.
+            with transaction.atomic():
+                rows = list(UserRole.objects.filter(
+                    expires_at__lte=now
+                ).order_by('expires_at').values_list(
+                    'pk', 'user_id', 'tenant_id'
+                )[:options['batch_size']])
+                if not rows:
+                    break
+                # Без сигналов: права пересчитываются один раз на
+                # пользователя, а не на каждое назначение.
+                effective.delete_rows(UserRole.objects.filter(
+                    pk__in=[pk for pk, _, _ in rows]
+                ))
+                user_ids = sorted({user_id for _, user_id, _ in rows})
+                effective.refresh_users(user_ids)
+                bump_version(*(user_scope(user_id) for user_id in user_ids))
+                # Журнал - последним: блокировка журнала арендатора
+                # держится до коммита (permissions.feed).
+                feed.record_many(
+                    PolicyChange.USER_ROLE,
+                    ((tenant_id, pk) for pk, _, tenant_id in rows),
+                    deleted=True
+                )
+            deleted += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено истекших назначений: {deleted}'
+        ))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from permissions.warmup import format_report, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогреть кэши авторизации: настройки, политику арендаторов и права '
+        'недавно входивших пользователей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=settings.WARMUP_USERS,
+            help='Сколько недавно входивших пользователей загрузить'
+        )
+
+    def handle(self, *args, **options):
+        report = warm_up(options['users'])
+        self.stdout.write(self.style.SUCCESS(format_report(report)))
@@ -0,0 +1,179 @@
+"""
+Компактная матрица прав роль x бизнес-элемент.
+
+Каждая ячейка - правило роли на элемент: flags.Rule с маской прав из
+permissions.flags, запретом и приоритетом. Права пользователя получаются из
+ячеек его ролей так же, как в эффективных правах: шаблоны имен разрешаются
+по permissions.namespaces, затем flags.decide. Снимок матрицы арендатора
+строится одним запросом и хранится в кэше под версией его политики; старые
+снимки остаются в кэше и используются для ответов в режиме delta.
+"""
+from django.conf import settings
+
+from backend.cache import rbac_cache
+from backend.db_router import fresh_reads
+
+from .flags import PERMISSION_FIELDS, Rule, pack
+from .models import AccessRoleRule
+from .versions import POLICY, tenant_scope
+
+DENSE = 'dense'
+SPARSE = 'sparse'
+AUTO = 'auto'
+DELTA = 'delta'
+ENCODINGS = (AUTO, DENSE, SPARSE)
+
+
+def _snapshot_key(tenant_id, version):
+    # v2: значения ячеек - flags.Rule.
+    return f'rbac:matrix:v2:{tenant_id}:{version}'
+
+
+def _compute_cells(tenant_id):
+    with fresh_reads(tenant_scope(POLICY, tenant_id)):
+        return _load_cells([tenant_id])[tenant_id]
+
+
+def _load_cells(tenant_ids):
+    """Ячейки нескольких арендаторов одним запросом."""
+    cells = {tenant_id: {} for tenant_id in tenant_ids}
+    rows = AccessRoleRule.objects.filter(
+        tenant_id__in=cells
+    ).order_by().values_list(
+        'tenant_id', 'role_id', 'element_id', 'effect', 'priority',
+        *PERMISSION_FIELDS
+    )
+    for tenant_id, role_id, element_id, effect, priority, *values in rows:
+        mask = pack(values)
+        # Правило без прав ничего не разрешает и не запрещает.
+        if mask:
+            cells[tenant_id][(role_id, element_id)] = Rule(
+                priority, effect == AccessRoleRule.DENY, mask
+            )
+    return cells
+
+
+def get_cells(tenant_id, version):
+    """Ячейки {(role_id, element_id): Rule} для версии политики."""
+    return rbac_cache.get_or_load(
+        _snapshot_key(tenant_id, version),
+        lambda: _compute_cells(tenant_id),
+        settings.PERMISSION_MATRIX_HISTORY_TIMEOUT
+    )
+
+
+def warm(tenant_versions):
+    """
+    Загрузить в кэш снимки {арендатор: версия политики}. Возвращает
+    число ячеек.
+    """
+    loaded = _load_cells(list(tenant_versions))
+    for tenant_id, version in tenant_versions.items():
+        rbac_cache.set(
+            _snapshot_key(tenant_id, version),
+            loaded[tenant_id],
+            settings.PERMISSION_MATRIX_HISTORY_TIMEOUT
+        )
+    return sum(len(cells) for cells in loaded.values())
+
+
+def _axes(cells):
+    roles = sorted({role_id for role_id, _ in cells})
+    elements = sorted({element_id for _, element_id in cells})
+    return roles, elements
+
+
+def _indexed(cells, roles, elements):
+    role_index = {role_id: i for i, role_id in enumerate(roles)}
+    element_index = {element_id: i for i, element_id in enumerate(elements)}
+    for (role_id, element_id), rule in sorted(cells.items()):
+        yield role_index[role_id], element_index[element_id], rule
+
+
+def _sparse_cells(cells, roles, elements):
+    # None - правила больше нет (delta).
+    return [
+        [role, element, rule.mask if rule else 0]
+        for role, element, rule in _indexed(cells, roles, elements)
+    ]
+
+
+def _effects(cells, roles, elements):
+    # Только ячейки, отличные от разрешения с приоритетом 0.
+    return [
+        [
+            role, element,
+            AccessRoleRule.DENY if rule.deny else AccessRoleRule.ALLOW,
+            rule.priority,
+        ]
+        for role, element, rule in _indexed(cells, roles, elements)
+        if rule and (rule.deny or rule.priority)
+    ]
+
+
+def encode(cells, version, encoding=AUTO):
+    """
+    Полная матрица.
+
+    dense: ``flags`` - маски построчно (роль за ролью), 0 - нет правила.
+    sparse: ``cells`` - тройки [индекс роли, индекс элемента, маска]
+    только для ненулевых ячеек. auto выбирает более короткий вариант.
+    ``effects`` в обоих вариантах - четверки [индекс роли, индекс
+    элемента, effect, priority] для запретов и правил с ненулевым
+    приоритетом; остальные ячейки - разрешения с приоритетом 0.
+    """
+    roles, elements = _axes(cells)
+    if encoding == AUTO:
+        # Ячейка sparse занимает три числа, dense - одно.
+        size = len(roles) * len(elements)
+        encoding = SPARSE if len(cells) * 3 < size else DENSE
+
+    data = {
+        'version': version,
+        'encoding': encoding,
+        'fields': PERMISSION_FIELDS,
+        'roles': roles,
+        'elements': elements,
+    }
+    if encoding == DENSE:
+        data['flags'] = [
+            rule.mask if (rule := cells.get((role_id, element_id))) else 0
+            for role_id in roles
+            for element_id in elements
+        ]
+    else:
+        data['cells'] = _sparse_cells(cells, roles, elements)
+    data['effects'] = _effects(cells, roles, elements)
+    return data
+
+
+def encode_delta(cells, tenant_id, version, since_version):
+    """
+    Изменения с версии since_version или None, если ее снимка уже нет.
+
+    Ячейки возвращаются в формате sparse; маска 0 означает, что правило
+    удалено. ``effects`` - как в encode, для изменившихся ячеек.
+    """
+    if since_version == version:
+        old_cells = cells
+    else:
+        old_cells = rbac_cache.get(_snapshot_key(tenant_id, since_version))
+        if old_cells is None:
+            return None
+
+    changed = {
+        key: cells.get(key)
+        for key in cells.keys() | old_cells.keys()
+        if cells.get(key) != old_cells.get(key)
+    }
+    roles, elements = _axes(changed)
+    return {
+        'version': version,
+        'since_version': since_version,
+        'encoding': DELTA,
+        'fields': PERMISSION_FIELDS,
+        'roles': roles,
+        'elements': elements,
+        'cells': _sparse_cells(changed, roles, elements),
+        'effects': _effects(changed, roles, elements),
+    }
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permissions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='accessrolerule',
+            options={'ordering': ['role_id', 'element_id'], 'verbose_name': 'Правило доступа', 'verbose_name_plural': 'Правила доступа'},
+        ),
+        migrations.AlterModelOptions(
+            name='userrole',
+            options={'ordering': ['user_id', 'role_id'], 'verbose_name': 'Роль пользователя', 'verbose_name_plural': 'Роли пользователей'},
+        ),
+        # Сначала создаем составной индекс, затем удаляем индексы по
+        # внешним ключам, которые он и уникальные индексы заменяют.
+        migrations.AddIndex(
+            model_name='accessrolerule',
+            index=models.Index(fields=['element', 'role', 'read_permission', 'read_all_permission', 'create_permission', 'update_permission', 'update_all_permission', 'delete_permission', 'delete_all_permission'], name='access_rules_element_role_idx'),
+        ),
+        migrations.AlterField(
+            model_name='accessrolerule',
+            name='element',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='access_rules', to='permissions.businesselement', verbose_name='Бизнес-элемент'),
+        ),
+        migrations.AlterField(
+            model_name='accessrolerule',
+            name='role',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='access_rules', to='permissions.role', verbose_name='Роль'),
+        ),
+        migrations.AlterField(
+            model_name='userrole',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_roles', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast
+
+PERMISSION_FIELDS = (
+    'read_permission',
+    'read_all_permission',
+    'create_permission',
+    'update_permission',
+    'update_all_permission',
+    'delete_permission',
+    'delete_all_permission',
+)
+
+
+def populate(apps, schema_editor):
+    AccessRoleRule = apps.get_model('permissions', 'AccessRoleRule')
+    UserEffectivePermission = apps.get_model(
+        'permissions', 'UserEffectivePermission'
+    )
+    aggregates = {
+        f'{field}_any': Max(Cast(field, IntegerField()))
+        for field in PERMISSION_FIELDS
+    }
+    rows = AccessRoleRule.objects.order_by().filter(
+        role__user_roles__isnull=False
+    ).values('role__user_roles__user_id', 'element_id').annotate(
+        **aggregates
+    )
+    objects = []
+    for row in rows:
+        mask = 0
+        for bit, field in enumerate(PERMISSION_FIELDS):
+            if row[f'{field}_any']:
+                mask |= 1 << bit
+        if mask:
+            objects.append(UserEffectivePermission(
+                user_id=row['role__user_roles__user_id'],
+                element_id=row['element_id'],
+                flags=mask
+            ))
+    UserEffectivePermission.objects.bulk_create(objects, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permissions', '0002_index_audit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserEffectivePermission',
+            fields=[
+                ('pk', models.CompositePrimaryKey('user', 'element', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('flags', models.PositiveSmallIntegerField(default=0, verbose_name='Права')),
+                ('element', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_permissions', to='permissions.businesselement', verbose_name='Бизнес-элемент')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='effective_permissions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Эффективные права пользователя',
+                'verbose_name_plural': 'Эффективные права пользователей',
+                'db_table': 'user_effective_permissions',
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
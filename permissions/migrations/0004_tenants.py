@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def tenant_field(related_name, null=False):
+    return models.ForeignKey(
+        db_index=False,
+        null=null,
+        on_delete=django.db.models.deletion.CASCADE,
+        related_name=related_name,
+        to='accounts.tenant',
+        verbose_name='Арендатор'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_tenants'),
+        ('permissions', '0003_user_effective_permissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='tenant',
+            field=tenant_field('roles', null=True),
+        ),
+        migrations.AddField(
+            model_name='businesselement',
+            name='tenant',
+            field=tenant_field('business_elements', null=True),
+        ),
+        migrations.AddField(
+            model_name='accessrolerule',
+            name='tenant',
+            field=tenant_field('access_rules', null=True),
+        ),
+        migrations.AddField(
+            model_name='userrole',
+            name='tenant',
+            field=tenant_field('user_roles', null=True),
+        ),
+    ]
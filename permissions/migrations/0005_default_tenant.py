@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def assign_default_tenant(apps, schema_editor):
+    Tenant = apps.get_model('accounts', 'Tenant')
+    Role = apps.get_model('permissions', 'Role')
+    BusinessElement = apps.get_model('permissions', 'BusinessElement')
+    AccessRoleRule = apps.get_model('permissions', 'AccessRoleRule')
+    UserRole = apps.get_model('permissions', 'UserRole')
+
+    tenant = Tenant.objects.get(slug=settings.DEFAULT_TENANT_SLUG)
+    Role.objects.filter(tenant__isnull=True).update(tenant=tenant)
+    BusinessElement.objects.filter(tenant__isnull=True).update(tenant=tenant)
+    role_tenant = Subquery(
+        Role.objects.filter(pk=OuterRef('role_id')).values('tenant_id')[:1]
+    )
+    AccessRoleRule.objects.filter(tenant__isnull=True).update(
+        tenant_id=role_tenant
+    )
+    UserRole.objects.filter(tenant__isnull=True).update(tenant_id=role_tenant)
+
+
+class Migration(migrations.Migration):
+    # Данные отдельно от схемы (см. accounts.0003_default_tenant).
+
+    dependencies = [
+        ('accounts', '0003_default_tenant'),
+        ('permissions', '0004_tenants'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_default_tenant, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def tenant_field(related_name, null=False):
+    return models.ForeignKey(
+        db_index=False,
+        null=null,
+        on_delete=django.db.models.deletion.CASCADE,
+        related_name=related_name,
+        to='accounts.tenant',
+        verbose_name='Арендатор'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_tenant_required'),
+        ('permissions', '0005_default_tenant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='role',
+            name='tenant',
+            field=tenant_field('roles'),
+        ),
+        migrations.AlterField(
+            model_name='businesselement',
+            name='tenant',
+            field=tenant_field('business_elements'),
+        ),
+        migrations.AlterField(
+            model_name='accessrolerule',
+            name='tenant',
+            field=tenant_field('access_rules'),
+        ),
+        migrations.AlterField(
+            model_name='userrole',
+            name='tenant',
+            field=tenant_field('user_roles'),
+        ),
+        migrations.AlterField(
+            model_name='role',
+            name='name',
+            field=models.CharField(max_length=100, verbose_name='Название роли'),
+        ),
+        migrations.AlterField(
+            model_name='businesselement',
+            name='name',
+            field=models.CharField(max_length=100, verbose_name='Название элемента'),
+        ),
+        migrations.AddConstraint(
+            model_name='role',
+            constraint=models.UniqueConstraint(fields=('tenant', 'name'), name='roles_tenant_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='businesselement',
+            constraint=models.UniqueConstraint(fields=('tenant', 'name'), name='business_elements_tenant_name_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='accessrolerule',
+            index=models.Index(fields=['tenant', 'role', 'element'], name='access_rules_tenant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userrole',
+            index=models.Index(fields=['tenant', 'user', 'role'], name='user_roles_tenant_idx'),
+        ),
+    ]
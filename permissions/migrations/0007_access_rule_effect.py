@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permissions', '0006_tenants_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessrolerule',
+            name='effect',
+            field=models.CharField(choices=[('allow', 'Разрешить'), ('deny', 'Запретить')], db_default='allow', default='allow', max_length=5, verbose_name='Действие'),
+        ),
+        migrations.AddField(
+            model_name='accessrolerule',
+            name='priority',
+            field=models.SmallIntegerField(db_default=0, default=0, verbose_name='Приоритет'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_tenants'),
+        ('permissions', '0007_access_rule_effect'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usereffectivepermission',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Действует до'),
+        ),
+        migrations.AddField(
+            model_name='userrole',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Действует до'),
+        ),
+        migrations.AddField(
+            model_name='userrole',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Действует с'),
+        ),
+        migrations.AddIndex(
+            model_name='userrole',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False)), fields=['expires_at'], name='user_roles_expires_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='userrole',
+            constraint=models.CheckConstraint(condition=models.Q(('valid_from__isnull', True), ('expires_at__isnull', True), ('valid_from__lt', models.F('expires_at')), _connector='OR'), name='user_roles_valid_period'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:31
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# Уведомление слушателей permissions.invalidation (LISTEN rbac_invalidation).
+# Триггер на оператор: INSERT пачки событий дает одно уведомление, а NOTIFY
+# внутри транзакции доставляется только после коммита.
+CREATE_NOTIFY_TRIGGER = """
+CREATE OR REPLACE FUNCTION rbac_invalidations_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('rbac_invalidation', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER rbac_invalidations_notify
+    AFTER INSERT ON rbac_invalidations
+    FOR EACH STATEMENT EXECUTE FUNCTION rbac_invalidations_notify();
+"""
+
+DROP_NOTIFY_TRIGGER = """
+DROP TRIGGER IF EXISTS rbac_invalidations_notify ON rbac_invalidations;
+DROP FUNCTION IF EXISTS rbac_invalidations_notify();
+"""
+
+
+def create_notify_trigger(apps, schema_editor):
+    # На остальных СУБД слушатели опрашивают таблицу.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_NOTIFY_TRIGGER, params=None)
+
+
+def drop_notify_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_NOTIFY_TRIGGER, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permissions', '0008_user_role_validity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheInvalidation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('scope', models.CharField(max_length=100, verbose_name='Область')),
+                ('origin', models.CharField(max_length=100, verbose_name='Источник')),
+                ('created_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), db_index=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Инвалидация кэша прав',
+                'verbose_name_plural': 'Инвалидации кэша прав',
+                'db_table': 'rbac_invalidations',
+            },
+        ),
+        migrations.RunPython(create_notify_trigger, drop_notify_trigger),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:41
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Порядок записей: объекты, на которые ссылаются, идут раньше ссылающихся.
+KINDS = (
+    ('business_element', 'BusinessElement'),
+    ('role', 'Role'),
+    ('access_rule', 'AccessRoleRule'),
+    ('user_role', 'UserRole'),
+)
+
+
+def populate(apps, schema_editor):
+    # Существующие объекты попадают в журнал, чтобы since=0 давал полную
+    # копию политики.
+    PolicyChange = apps.get_model('permissions', 'PolicyChange')
+    for kind, model_name in KINDS:
+        model = apps.get_model('permissions', model_name)
+        rows = model.objects.order_by('pk').values_list(
+            'tenant_id', 'pk'
+        ).iterator(chunk_size=BATCH_SIZE)
+        batch = []
+        for tenant_id, object_id in rows:
+            batch.append(PolicyChange(
+                tenant_id=tenant_id, kind=kind, object_id=object_id
+            ))
+            if len(batch) == BATCH_SIZE:
+                PolicyChange.objects.bulk_create(batch)
+                batch = []
+        PolicyChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_tenants'),
+        ('permissions', '0009_cache_invalidation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('role', 'Роль'), ('business_element', 'Бизнес-элемент'), ('access_rule', 'Правило доступа'), ('user_role', 'Роль пользователя')], max_length=20, verbose_name='Тип объекта')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удален')),
+                ('created_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), verbose_name='Создано')),
+                ('tenant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='policy_changes', to='accounts.tenant', verbose_name='Арендатор')),
+            ],
+            options={
+                'verbose_name': 'Изменение политики',
+                'verbose_name_plural': 'Изменения политики',
+                'db_table': 'policy_changes',
+                'indexes': [models.Index(fields=['tenant', 'id'], name='policy_changes_tenant_idx'), models.Index(fields=['kind', 'object_id'], name='policy_changes_object_idx')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
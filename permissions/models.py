@@ -1,13 +1,23 @@
 from django.db import models
+from django.db.models.functions import Now
 
-from accounts.models import User
+from accounts.models import Tenant, User, get_default_tenant_id
+
+from .flags import PERMISSION_FIELDS
 
 
 class Role(models.Model):
     """Роли пользователей (админ, менеджер, пользователь, гость)."""
+    # tenant_id - первая колонка уникального индекса (tenant, name).
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='roles',
+        db_index=False,
+        verbose_name='Арендатор'
+    )
     name = models.CharField(
         max_length=100,
-        unique=True,
         verbose_name='Название роли'
     )
     description = models.TextField(
@@ -29,16 +39,36 @@ class Role(models.Model):
         verbose_name_plural = 'Роли'
         db_table = 'roles'
         ordering = ['name']
+        constraints = [
+            # Имена уникальны в пределах арендатора; индекс обслуживает и
+            # поиск по имени, и список арендатора в порядке ordering.
+            models.UniqueConstraint(
+                fields=['tenant', 'name'],
+                name='roles_tenant_name_uniq'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.tenant_id is None:
+            self.tenant_id = get_default_tenant_id()
+        super().save(*args, **kwargs)
+
 
 class BusinessElement(models.Model):
     """Бизнес-элементы системы."""
+    # tenant_id - первая колонка уникального индекса (tenant, name).
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='business_elements',
+        db_index=False,
+        verbose_name='Арендатор'
+    )
     name = models.CharField(
         max_length=100,
-        unique=True,
         verbose_name='Название элемента'
     )
     description = models.TextField(
@@ -60,23 +90,68 @@ class BusinessElement(models.Model):
         verbose_name_plural = 'Бизнес-элементы'
         db_table = 'business_elements'
         ordering = ['name']
+        constraints = [
+            # См. Role.
+            models.UniqueConstraint(
+                fields=['tenant', 'name'],
+                name='business_elements_tenant_name_uniq'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Имя из БД: его смена пересчитывает права (permissions.signals).
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.tenant_id is None:
+            self.tenant_id = get_default_tenant_id()
+        super().save(*args, **kwargs)
+
 
 class AccessRoleRule(models.Model):
-    """Правила доступа ролей к бизнес-элементам."""
+    """
+    Правила доступа ролей к бизнес-элементам.
+
+    Правило разрешает или запрещает (effect) отмеченные права. Между
+    правилами разных ролей пользователя побеждает правило с большим
+    priority, при равном - запрет (см. permissions.flags.decide).
+    """
+    ALLOW = 'allow'
+    DENY = 'deny'
+    EFFECT_CHOICES = [
+        (ALLOW, 'Разрешить'),
+        (DENY, 'Запретить'),
+    ]
+    # Арендатор роли; копируется при сохранении, чтобы список правил
+    # арендатора читался из индекса access_rules_tenant_idx.
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='access_rules',
+        db_index=False,
+        verbose_name='Арендатор'
+    )
+    # Отдельные индексы по внешним ключам не нужны: role_id - первая
+    # колонка уникального индекса (role, element), element_id - первая
+    # колонка индекса access_rules_element_role_idx.
     role = models.ForeignKey(
         Role,
         on_delete=models.CASCADE,
         related_name='access_rules',
+        db_index=False,
         verbose_name='Роль'
     )
     element = models.ForeignKey(
         BusinessElement,
         on_delete=models.CASCADE,
         related_name='access_rules',
+        db_index=False,
         verbose_name='Бизнес-элемент'
     )
 
@@ -109,6 +184,18 @@ class AccessRoleRule(models.Model):
         default=False,
         verbose_name='Удаление (все)'
     )
+    effect = models.CharField(
+        max_length=5,
+        choices=EFFECT_CHOICES,
+        default=ALLOW,
+        db_default=ALLOW,
+        verbose_name='Действие'
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        db_default=0,
+        verbose_name='Приоритет'
+    )
 
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -124,18 +211,48 @@ class AccessRoleRule(models.Model):
         verbose_name_plural = 'Правила доступа'
         db_table = 'access_roles_rules'
         unique_together = [['role', 'element']]
-        ordering = ['role', 'element']
+        # Сортировка по колонкам ключей читается из уникального индекса;
+        # ordering по role/element сортировал бы по именам через JOIN.
+        ordering = ['role_id', 'element_id']
+        indexes = [
+            # Покрывающий индекс для проверки прав: поиск по
+            # (element_id, role_id) без чтения строк таблицы.
+            models.Index(
+                fields=['element', 'role', *PERMISSION_FIELDS],
+                name='access_rules_element_role_idx'
+            ),
+            # Список правил арендатора в порядке ordering.
+            models.Index(
+                fields=['tenant', 'role', 'element'],
+                name='access_rules_tenant_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.role.name} -> {self.element.name}"
 
+    def save(self, *args, **kwargs):
+        if self.tenant_id is None:
+            self.tenant_id = self.role.tenant_id
+        super().save(*args, **kwargs)
+
 
 class UserRole(models.Model):
     """Связь пользователей с ролями."""
+    # Арендатор роли, копируется при сохранении (см. AccessRoleRule).
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='user_roles',
+        db_index=False,
+        verbose_name='Арендатор'
+    )
+    # user_id - первая колонка уникального индекса (user, role).
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='user_roles',
+        db_index=False,
         verbose_name='Пользователь'
     )
     role = models.ForeignKey(
@@ -144,6 +261,17 @@ class UserRole(models.Model):
         related_name='user_roles',
         verbose_name='Роль'
     )
+    # Срок действия назначения; null - без ограничения.
+    valid_from = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Действует с'
+    )
+    expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Действует до'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата создания'
@@ -154,7 +282,170 @@ class UserRole(models.Model):
         verbose_name_plural = 'Роли пользователей'
         db_table = 'user_roles'
         unique_together = [['user', 'role']]
-        ordering = ['user', 'role']
+        ordering = ['user_id', 'role_id']
+        indexes = [
+            # Список назначений арендатора в порядке ordering.
+            models.Index(
+                fields=['tenant', 'user', 'role'],
+                name='user_roles_tenant_idx'
+            ),
+            # Поиск истекших назначений (sweep_user_roles); бессрочные
+            # назначения в индекс не попадают.
+            models.Index(
+                fields=['expires_at'],
+                name='user_roles_expires_idx',
+                condition=models.Q(expires_at__isnull=False)
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(valid_from__isnull=True)
+                    | models.Q(expires_at__isnull=True)
+                    | models.Q(valid_from__lt=models.F('expires_at'))
+                ),
+                name='user_roles_valid_period'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.role.name}"
+
+    def save(self, *args, **kwargs):
+        if self.tenant_id is None:
+            self.tenant_id = self.role.tenant_id
+        super().save(*args, **kwargs)
+
+
+class UserEffectivePermission(models.Model):
+    """
+    Права пользователя на бизнес-элемент, объединенные по всем его ролям.
+
+    Денормализованная таблица: поддерживается сигналами при изменении
+    UserRole и AccessRoleRule (см. permissions.effective), перестраивается
+    командой rebuild_effective_permissions.
+    """
+    pk = models.CompositePrimaryKey('user', 'element')
+    # user_id - первая колонка первичного ключа.
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='effective_permissions',
+        db_index=False,
+        verbose_name='Пользователь'
+    )
+    element = models.ForeignKey(
+        BusinessElement,
+        on_delete=models.CASCADE,
+        related_name='effective_permissions',
+        verbose_name='Бизнес-элемент'
+    )
+    # Маска прав из permissions.flags.
+    flags = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Права'
+    )
+    # Ближайший момент, когда права могут измениться из-за срока действия
+    # назначений ролей; null - бессрочно (см. permissions.effective).
+    valid_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Действует до'
+    )
+
+    class Meta:
+        verbose_name = 'Эффективные права пользователя'
+        verbose_name_plural = 'Эффективные права пользователей'
+        db_table = 'user_effective_permissions'
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.element_id}: {self.flags}"
+
+
+class CacheInvalidation(models.Model):
+    """
+    Событие об изменении области версий RBAC (transactional outbox).
+
+    Пишется в той же транзакции, что и изменение данных, и читается
+    слушателями других процессов (см. permissions.invalidation).
+    """
+    id = models.BigAutoField(primary_key=True)
+    # Область версий из permissions.versions: tenant_scope или user_scope.
+    scope = models.CharField(max_length=100, verbose_name='Область')
+    # Процесс-источник: свои события слушатель не применяет повторно.
+    origin = models.CharField(max_length=100, verbose_name='Источник')
+    # Время БД, а не узла: окно чтения слушателей не зависит от
+    # расхождения часов между узлами.
+    created_at = models.DateTimeField(
+        db_default=Now(),
+        db_index=True,
+        verbose_name='Создано'
+    )
+
+    class Meta:
+        verbose_name = 'Инвалидация кэша прав'
+        verbose_name_plural = 'Инвалидации кэша прав'
+        db_table = 'rbac_invalidations'
+
+    def __str__(self):
+        return f"{self.scope} ({self.origin})"
+
+
+class PolicyChange(models.Model):
+    """
+    Запись журнала изменений политики для ленты /changes/ (см.
+    permissions.feed). Номер записи - версия ленты.
+    """
+    ROLE = 'role'
+    BUSINESS_ELEMENT = 'business_element'
+    ACCESS_RULE = 'access_rule'
+    USER_ROLE = 'user_role'
+    KIND_CHOICES = [
+        (ROLE, 'Роль'),
+        (BUSINESS_ELEMENT, 'Бизнес-элемент'),
+        (ACCESS_RULE, 'Правило доступа'),
+        (USER_ROLE, 'Роль пользователя'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # tenant_id - первая колонка индекса policy_changes_tenant_idx.
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='policy_changes',
+        db_index=False,
+        verbose_name='Арендатор'
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        verbose_name='Тип объекта'
+    )
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    # Удаление (tombstone): объекта больше нет.
+    deleted = models.BooleanField(default=False, verbose_name='Удален')
+    created_at = models.DateTimeField(
+        db_default=Now(),
+        verbose_name='Создано'
+    )
+
+    class Meta:
+        verbose_name = 'Изменение политики'
+        verbose_name_plural = 'Изменения политики'
+        db_table = 'policy_changes'
+        indexes = [
+            # Чтение ленты арендатора с версии since.
+            models.Index(
+                fields=['tenant', 'id'],
+                name='policy_changes_tenant_idx'
+            ),
+            # Поиск записей объекта при сжатии журнала.
+            models.Index(
+                fields=['kind', 'object_id'],
+                name='policy_changes_object_idx'
+            ),
+        ]
+
+    def __str__(self):
+        action = 'удален' if self.deleted else 'изменен'
+        return f"{self.id}: {self.kind} {self.object_id} {action}"
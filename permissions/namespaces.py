@@ -0,0 +1,156 @@
+"""
+Иерархические имена бизнес-элементов и правила-шаблоны.
+
+Имена элементов состоят из сегментов через точку (``orders.items``).
+Элемент с последним сегментом ``*`` - шаблон: правило на ``orders.*``
+действует на все элементы с префиксом ``orders.`` на любой глубине
+(``orders.items``, ``orders.items.lines``), но не на сам ``orders``;
+правило на ``*`` - на все элементы арендатора.
+
+Для каждой роли действуют ее самое специфичное разрешение и самый
+специфичный запрет: точное имя, затем ближайший шаблон вверх по иерархии.
+Поэтому явное правило на ``orders.refunds`` сужает для роли права шаблона
+``orders.*``. Правила всех ролей пользователя сводятся в одну маску по
+приоритетам (flags.decide).
+"""
+from .flags import decide
+
+SEPARATOR = '.'
+WILDCARD = '*'
+
+
+def is_wildcard(name):
+    return name == WILDCARD or name.endswith(SEPARATOR + WILDCARD)
+
+
+def name_error(name):
+    """Сообщение об ошибке в имени элемента или None."""
+    segments = name.split(SEPARATOR)
+    if any(not segment for segment in segments):
+        return 'Имя элемента не может содержать пустых сегментов'
+    if WILDCARD in segments[:-1] or any(
+        WILDCARD in segment and segment != WILDCARD for segment in segments
+    ):
+        return 'Шаблон * допустим только как последний сегмент имени'
+    return None
+
+
+def candidates(name):
+    """
+    Имена правил, применимых к элементу name, от самого специфичного:
+    ``a.b.c`` -> ``a.b.c``, ``a.b.*``, ``a.*``, ``*``. Для шаблона
+    ``a.b.*`` -> ``a.b.*``, ``a.*``, ``*``.
+    """
+    yield name
+    segments = name.split(SEPARATOR)
+    if segments[-1] == WILDCARD:
+        segments.pop()
+    for depth in range(len(segments) - 1, -1, -1):
+        yield SEPARATOR.join(segments[:depth] + [WILDCARD])
+
+
+def resolve_rule(rules, name, deny):
+    """
+    Самое специфичное правило {имя: Rule} роли для name среди запретов
+    (deny) или разрешений; None, если таких нет.
+    """
+    for candidate in candidates(name):
+        rule = rules.get(candidate)
+        if rule is not None and rule.deny == deny:
+            return rule
+    return None
+
+
+def combine_roles(rules_by_role, names=(), keep=()):
+    """
+    Маски пользователя {имя: маска} по правилам его ролей
+    [{имя: Rule}, ...].
+
+    Записи есть для каждого имени (элемента или шаблона), на которое есть
+    правило хотя бы у одной роли, и для имен names. Значение - решение
+    flags.decide по самым специфичным разрешению и запрету каждой роли.
+    Поиск самого специфичного имени в результате дает то же решение для
+    любого элемента. Нулевые маски сохраняются там, где они перекрывают
+    ненулевой шаблон выше, и для имен keep.
+    """
+    names = set(names)
+    for rules in rules_by_role:
+        names.update(rules)
+    combined = {}
+    for name in names:
+        combined[name] = decide(
+            rule
+            for rules in rules_by_role
+            for deny in (False, True)
+            if (rule := resolve_rule(rules, name, deny)) is not None
+        )
+    return {
+        name: mask for name, mask in combined.items()
+        if mask or name in keep or any(
+            combined.get(candidate)
+            for candidate in candidates(name) if candidate != name
+        )
+    }
+
+
+class _Node:
+    __slots__ = ('exact', 'wildcard', 'children')
+
+    def __init__(self):
+        self.exact = None
+        self.wildcard = None
+        self.children = {}
+
+
+class ElementTrie:
+    """
+    Префиксное дерево масок {имя: маска} по сегментам имен. Поиск маски
+    элемента - O(глубины имени) с семантикой самого специфичного правила.
+    """
+
+    __slots__ = ('_root',)
+
+    def __init__(self, masks):
+        self._root = _Node()
+        for name, mask in masks.items():
+            *prefix, last = name.split(SEPARATOR)
+            node = self._root
+            for segment in prefix:
+                node = node.children.setdefault(segment, _Node())
+            if last == WILDCARD:
+                node.wildcard = mask
+            else:
+                node = node.children.setdefault(last, _Node())
+                node.exact = mask
+
+    def resolve(self, name, default=0):
+        found = default
+        node = self._root
+        for segment in name.split(SEPARATOR):
+            # Шаблон узла действует на все имена глубже него.
+            if node.wildcard is not None:
+                found = node.wildcard
+            node = node.children.get(segment)
+            if node is None:
+                return found
+        return found if node.exact is None else node.exact
+
+
+class ElementMasks(dict):
+    """
+    Маски пользователя {имя элемента или шаблона: маска} с поиском по
+    иерархии. Дерево строится при первом поиске и живет вместе с записью
+    L1-кэша. valid_until - ближайший срок строк (см. permissions.effective).
+    """
+
+    valid_until = None
+
+    def resolve(self, name):
+        """Маска элемента name с учетом шаблонов."""
+        mask = self.get(name)
+        if mask is not None:
+            return mask
+        trie = self.__dict__.get('_trie')
+        if trie is None:
+            trie = self._trie = ElementTrie(self)
+        return trie.resolve(name)
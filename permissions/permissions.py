@@ -1,6 +1,46 @@
+import time
+
+from asgiref.sync import sync_to_async
 from rest_framework import permissions
 
-from .models import AccessRoleRule, BusinessElement, UserRole
+from backend.db_router import areplica_reads
+from backend.metrics import Counter, Histogram, QueryCounter
+from backend.profiling import phase
+
+from .authorization import (
+    aget_effective_permissions,
+    authorize,
+    is_owner,
+    same_tenant,
+)
+from .flags import ACTION_FLAGS
+
+# Стандартные действия ViewSet -> действие RBAC.
+VIEWSET_ACTIONS = {
+    'list': 'read',
+    'retrieve': 'read',
+    'create': 'create',
+    'update': 'update',
+    'partial_update': 'update',
+    'destroy': 'delete',
+}
+
+PERMISSION_CHECKS = Counter(
+    'rbac_permission_checks_total',
+    'Решения HasPermission по элементу, действию и результату.',
+    ('element', 'action', 'result')
+)
+PERMISSION_CHECK_SECONDS = Histogram(
+    'rbac_permission_check_seconds',
+    'Длительность одной проверки HasPermission.',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+             0.025, 0.05, 0.1)
+)
+PERMISSION_CHECK_QUERIES = Histogram(
+    'rbac_permission_check_queries',
+    'Число SQL-запросов одной проверки HasPermission.',
+    buckets=(0, 1, 2, 3, 5, 10, 20)
+)
 
 
 class HasPermission(permissions.BasePermission):
@@ -20,17 +60,7 @@ class HasPermission(permissions.BasePermission):
             return True  # Если элемент не указан, разрешаем доступ
 
         # Получаем действие (read, create, update, delete)
-        action = getattr(view, 'action', None)
-        if not action:
-            # Определяем действие по HTTP методу
-            if request.method in permissions.SAFE_METHODS:
-                action = 'read'
-            elif request.method == 'POST':
-                action = 'create'
-            elif request.method in ['PUT', 'PATCH']:
-                action = 'update'
-            elif request.method == 'DELETE':
-                action = 'delete'
+        action = self._get_action(request, view)
 
         # Проверяем права доступа
         return self._check_permission(
@@ -49,14 +79,7 @@ class HasPermission(permissions.BasePermission):
         if not element_name:
             return True
 
-        action = getattr(view, 'action', None)
-        if not action:
-            if request.method in permissions.SAFE_METHODS:
-                action = 'read'
-            elif request.method in ['PUT', 'PATCH']:
-                action = 'update'
-            elif request.method == 'DELETE':
-                action = 'delete'
+        action = self._get_action(request, view)
 
         # Проверяем права доступа с учетом владельца объекта
         return self._check_permission(
@@ -67,70 +90,112 @@ class HasPermission(permissions.BasePermission):
             obj=obj
         )
 
-    def _check_permission(self, user, element_name, action, request, obj=None):
-        """Внутренний метод для проверки прав доступа."""
-        try:
-            element = BusinessElement.objects.get(name=element_name)
-        except BusinessElement.DoesNotExist:
+    async def ahas_permission(self, request, view):
+        """has_permission для асинхронных view (permissions.async_views)."""
+        if not request.user or not request.user.is_authenticated:
             return False
 
-        # Получаем роли пользователя
-        user_roles = UserRole.objects.filter(
-            user=user
-        ).select_related('role')
-        if not user_roles.exists():
+        element_name = getattr(view, 'business_element', None)
+        if not element_name:
+            return True
+
+        action = self._get_action(request, view)
+
+        return await self._acheck_permission(
+            request.user,
+            element_name,
+            action,
+            request
+        )
+
+    async def ahas_object_permission(self, request, view, obj):
+        """has_object_permission для асинхронных view."""
+        if not request.user or not request.user.is_authenticated:
             return False
 
-        # Проверяем права для каждой роли
-        for user_role in user_roles:
-            access_rule = AccessRoleRule.objects.filter(
-                role=user_role.role,
-                element=element
-            ).first()
-
-            if not access_rule:
-                continue
-
-            # Проверяем права в зависимости от действия
-            if action == 'read':
-                if access_rule.read_all_permission:
-                    return True
-                if access_rule.read_permission and obj:
-                    # Проверяем владельца
-                    if self._is_owner(user, obj):
-                        return True
-
-            elif action == 'create':
-                if access_rule.create_permission:
-                    return True
-
-            elif action == 'update':
-                if access_rule.update_all_permission:
-                    return True
-                if access_rule.update_permission and obj:
-                    if self._is_owner(user, obj):
-                        return True
-
-            elif action == 'delete':
-                if access_rule.delete_all_permission:
-                    return True
-                if access_rule.delete_permission and obj:
-                    if self._is_owner(user, obj):
-                        return True
+        element_name = getattr(view, 'business_element', None)
+        if not element_name:
+            return True
+
+        action = self._get_action(request, view)
+
+        return await self._acheck_permission(
+            request.user,
+            element_name,
+            action,
+            request,
+            obj=obj
+        )
+
+    def _get_action(self, request, view):
+        """Действие RBAC (read, create, update, delete) для запроса."""
+        # У ViewSet'ов action - имя метода (list, retrieve, ...),
+        # переводим его в действие RBAC.
+        action = VIEWSET_ACTIONS.get(getattr(view, 'action', None))
+        if action:
+            return action
+        # Определяем действие по HTTP методу
+        if request.method in permissions.SAFE_METHODS:
+            return 'read'
+        if request.method == 'POST':
+            return 'create'
+        if request.method in ['PUT', 'PATCH']:
+            return 'update'
+        if request.method == 'DELETE':
+            return 'delete'
+        return None
 
+    def _check_permission(self, user, element_name, action, request, obj=None):
+        """Внутренний метод для проверки прав доступа."""
+        with phase('perm'), QueryCounter() as queries:
+            started = time.perf_counter()
+            allowed = self._decide(user, element_name, action, obj)
+            PERMISSION_CHECK_SECONDS.observe(time.perf_counter() - started)
+        PERMISSION_CHECK_QUERIES.observe(queries.count)
+        PERMISSION_CHECKS.inc(
+            element=element_name,
+            action=action,
+            result='allow' if allowed else 'deny'
+        )
+        return allowed
+
+    def _decide(self, user, element_name, action, obj):
+        # Права всех ролей пользователя, объединенные в маски по
+        # элементам, берутся из двухуровневого кэша.
+        return authorize(user, element_name, action, obj)
+
+    async def _acheck_permission(
+        self, user, element_name, action, request, obj=None
+    ):
+        """Асинхронный _check_permission."""
+        with phase('perm'):
+            started = time.perf_counter()
+            allowed = await self._adecide(user, element_name, action, obj)
+            PERMISSION_CHECK_SECONDS.observe(time.perf_counter() - started)
+        PERMISSION_CHECKS.inc(
+            element=element_name,
+            action=action,
+            result='allow' if allowed else 'deny'
+        )
+        return allowed
+
+    async def _adecide(self, user, element_name, action, obj):
+        if obj is not None and not same_tenant(user, obj):
+            return False
+        async with areplica_reads(user):
+            permissions_by_element = await aget_effective_permissions(user)
+        mask = permissions_by_element.resolve(element_name)
+
+        own_flag, all_flag = ACTION_FLAGS.get(action, (0, 0))
+        if mask & all_flag:
+            return True
+        if mask & own_flag and obj:
+            # Сравнение со связанным объектом может загрузить его из БД.
+            if await sync_to_async(self._is_owner)(user, obj):
+                return True
         return False
 
     def _is_owner(self, user, obj):
         """Проверка, является ли пользователь владельцем объекта."""
-        # Проверяем наличие поля owner или user
-        if hasattr(obj, 'owner'):
-            return obj.owner == user
-        if hasattr(obj, 'user'):
-            return obj.user == user
-        if hasattr(obj, 'user_id'):
-            return obj.user_id == user.id
-        # Если объект - это сам пользователь
-        if isinstance(obj, type(user)) and obj.id == user.id:
-            return True
-        return False
+        return is_owner(user, obj)
 
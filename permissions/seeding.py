@@ -0,0 +1,366 @@
+"""
+Генерация синтетических данных RBAC для нагрузочного тестирования.
+
+Данные детерминированы: при одинаковых параметрах и seed получаются те же
+пользователи, роли, правила и назначения. Запись идет пачками через
+bulk_create, на PostgreSQL - через COPY. Сигналы при этом не вызываются,
+поэтому эффективные права и версии данных обновляются в конце отдельно, а
+записи ленты изменений (permissions.feed) пишутся вместе с данными.
+"""
+import itertools
+import random
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import Tenant, User
+
+from . import effective, feed
+from .flags import PERMISSION_FIELDS
+from .models import (
+    AccessRoleRule,
+    BusinessElement,
+    Role,
+    UserEffectivePermission,
+    UserRole,
+)
+from .versions import (
+    CATALOG,
+    POLICY,
+    bump_version,
+    tenant_scope,
+    user_scope,
+)
+
+# Элементы, которые проверяют ViewSet'ы API; создаются первыми, чтобы по
+# сгенерированным данным можно было нагружать и HTTP-эндпоинты.
+API_ELEMENTS = ('roles', 'business_elements', 'access_rules', 'user_roles')
+
+UNIFORM = 'uniform'
+ZIPF = 'zipf'
+DISTRIBUTIONS = (UNIFORM, ZIPF)
+
+# Вероятность каждого флага в сгенерированном правиле.
+FLAG_PROBABILITIES = {
+    'read_permission': 0.9,
+    'read_all_permission': 0.4,
+    'create_permission': 0.3,
+    'update_permission': 0.5,
+    'update_all_permission': 0.2,
+    'delete_permission': 0.3,
+    'delete_all_permission': 0.1,
+}
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    roles: int = 100
+    elements: int = 20
+    # Диапазоны [min, max] числа ролей у пользователя и правил у роли.
+    roles_per_user: tuple = (1, 3)
+    rules_per_role: tuple = (5, 15)
+    # Популярность ролей: uniform - равномерно, zipf - несколько ролей
+    # назначены большинству пользователей.
+    role_distribution: str = UNIFORM
+    zipf_exponent: float = 1.1
+    seed: int = 42
+    batch_size: int = 5000
+    password: str = 'seedpass123'
+    prefix: str = 'seed'
+    use_copy: bool = True
+
+
+def parse_range(value):
+    """'2' -> (2, 2), '1-3' -> (1, 3)."""
+    low, _, high = value.partition('-')
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0 or high < low:
+        raise ValueError(f'Некорректный диапазон: {value}')
+    return low, high
+
+
+def _batches(rows, size):
+    iterator = iter(rows)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _copy_supported():
+    if connection.vendor != 'postgresql':
+        return False
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    return is_psycopg3
+
+
+def _insert(model, fields, rows, config):
+    """Записать кортежи значений полей fields в таблицу модели."""
+    if config.use_copy and _copy_supported():
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(name).column)
+            for name in fields
+        )
+        sql = (
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+            f'({columns}) FROM STDIN'
+        )
+        with connection.cursor() as cursor:
+            with cursor.cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        return
+    for batch in _batches(rows, config.batch_size):
+        model.objects.bulk_create(
+            [model(**dict(zip(fields, row))) for row in batch],
+            batch_size=config.batch_size
+        )
+
+
+def _ids(queryset):
+    return list(queryset.order_by('pk').values_list('pk', flat=True))
+
+
+def _pick(rng, population, count, cum_weights):
+    """count разных элементов population с заданными весами."""
+    count = min(count, len(population))
+    if cum_weights is None:
+        return sorted(rng.sample(population, count))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.add(rng.choices(population, cum_weights=cum_weights)[0])
+    return sorted(chosen)
+
+
+def _zipf_cum_weights(size, exponent):
+    return list(itertools.accumulate(
+        1 / (rank ** exponent) for rank in range(1, size + 1)
+    ))
+
+
+def seed(tenant, config):
+    """
+    Сгенерировать данные арендатору tenant.
+
+    Возвращает словарь с числом созданных объектов каждого типа.
+    """
+    rng = random.Random(config.seed)
+    now = timezone.now()
+    prefix = config.prefix
+
+    # Пароль хешируется один раз: bcrypt на каждого пользователя занял бы
+    # часы на миллионах строк.
+    hasher = User()
+    hasher.set_password(config.password)
+    password = hasher.password
+
+    with transaction.atomic():
+        element_names = list(API_ELEMENTS[:config.elements]) + [
+            f'{prefix}_element_{i}'
+            for i in range(config.elements - len(API_ELEMENTS))
+        ]
+        existing = set(BusinessElement.objects.filter(
+            tenant=tenant, name__in=API_ELEMENTS
+        ).values_list('name', flat=True))
+        _insert(
+            BusinessElement,
+            ('tenant_id', 'name', 'created_at', 'updated_at'),
+            (
+                (tenant.pk, name, now, now)
+                for name in element_names if name not in existing
+            ),
+            config
+        )
+        _insert(
+            Role,
+            ('tenant_id', 'name', 'created_at', 'updated_at'),
+            (
+                (tenant.pk, f'{prefix}_role_{i}', now, now)
+                for i in range(config.roles)
+            ),
+            config
+        )
+        element_ids = _ids(BusinessElement.objects.filter(
+            tenant=tenant, name__in=element_names
+        ))
+        role_ids = _ids(Role.objects.filter(
+            tenant=tenant, name__startswith=f'{prefix}_role_'
+        ))
+
+        def rules():
+            for role_id in role_ids:
+                count = rng.randint(*config.rules_per_role)
+                for element_id in sorted(rng.sample(
+                    element_ids, min(count, len(element_ids))
+                )):
+                    flags = [
+                        rng.random() < FLAG_PROBABILITIES[field]
+                        for field in PERMISSION_FIELDS
+                    ]
+                    yield (tenant.pk, role_id, element_id, *flags, now, now)
+
+        _insert(
+            AccessRoleRule,
+            (
+                'tenant_id', 'role_id', 'element_id',
+                *PERMISSION_FIELDS,
+                'created_at', 'updated_at',
+            ),
+            rules(),
+            config
+        )
+
+        _insert(
+            User,
+            (
+                'tenant_id', 'email', 'username', 'first_name', 'last_name',
+                'password', 'is_active', 'is_staff', 'is_superuser',
+                'date_joined', 'created_at', 'updated_at',
+            ),
+            (
+                (
+                    tenant.pk,
+                    f'{prefix}{i}@{tenant.slug}.example.com',
+                    f'{prefix}-{tenant.slug}-{i}',
+                    'Seed', f'User {i}',
+                    password, True, False, False,
+                    now, now, now,
+                )
+                for i in range(config.users)
+            ),
+            config
+        )
+        user_ids = _ids(User.objects.filter(
+            tenant=tenant, username__startswith=f'{prefix}-{tenant.slug}-'
+        ))
+
+        cum_weights = None
+        if config.role_distribution == ZIPF:
+            cum_weights = _zipf_cum_weights(
+                len(role_ids), config.zipf_exponent
+            )
+
+        def user_roles():
+            for user_id in user_ids:
+                count = rng.randint(*config.roles_per_user)
+                for role_id in _pick(rng, role_ids, count, cum_weights):
+                    yield (tenant.pk, user_id, role_id, now)
+
+        _insert(
+            UserRole,
+            ('tenant_id', 'user_id', 'role_id', 'created_at'),
+            user_roles(),
+            config
+        )
+
+        seeded_roles = Role.objects.filter(
+            tenant=tenant, name__startswith=f'{prefix}_role_'
+        )
+        for queryset in (
+            BusinessElement.objects.filter(
+                tenant=tenant, name__in=element_names
+            ).exclude(name__in=existing),
+            seeded_roles,
+            AccessRoleRule.objects.filter(role__in=seeded_roles),
+            UserRole.objects.filter(role__in=seeded_roles),
+        ):
+            feed.record_queryset(queryset)
+
+    return {
+        'elements': len(element_ids),
+        'roles': len(role_ids),
+        'rules': AccessRoleRule.objects.filter(role_id__in=role_ids).count(),
+        'users': len(user_ids),
+        'user_roles': UserRole.objects.filter(
+            tenant=tenant, role_id__in=role_ids
+        ).count(),
+    }
+
+
+def refresh_derived_data(tenant, batch_size=effective.BATCH_SIZE):
+    """
+    Пересобрать эффективные права пользователей арендатора и сменить
+    версии его данных.
+    """
+    for start, stop in effective.user_id_ranges(batch_size, tenant.pk):
+        with transaction.atomic():
+            effective.apply(*effective.range_diff(start, stop, tenant.pk))
+    bump_version(
+        tenant_scope(CATALOG, tenant.pk),
+        tenant_scope(POLICY, tenant.pk)
+    )
+
+
+def clear(tenant, prefix):
+    """
+    Удалить ранее сгенерированные данные арендатора.
+
+    Строки удаляются запросами DELETE без загрузки объектов и сигналов:
+    каскадное удаление миллионов назначений через ORM пересчитывало бы
+    эффективные права по одному пользователю. Поэтому права остальных
+    пользователей со сгенерированными ролями пересчитываются и версии
+    меняются явно; версии удаленных пользователей не меняются - их кэш
+    больше никто не прочитает. Элементы API_ELEMENTS не удаляются - на них
+    могут ссылаться настоящие правила.
+    """
+    users = User.objects.filter(
+        tenant=tenant, username__startswith=f'{prefix}-{tenant.slug}-'
+    )
+    roles = Role.objects.filter(
+        tenant=tenant, name__startswith=f'{prefix}_role_'
+    )
+    elements = BusinessElement.objects.filter(
+        tenant=tenant, name__startswith=f'{prefix}_element_'
+    )
+    querysets = (
+        UserEffectivePermission.objects.filter(user__in=users),
+        UserEffectivePermission.objects.filter(element__in=elements),
+        UserRole.objects.filter(user__in=users),
+        UserRole.objects.filter(role__in=roles),
+        AccessRoleRule.objects.filter(role__in=roles),
+        AccessRoleRule.objects.filter(element__in=elements),
+        users,
+        roles,
+        elements,
+    )
+    with transaction.atomic():
+        affected = list(
+            UserRole.objects.filter(role__in=roles).exclude(
+                user__in=users
+            ).order_by('user_id').values_list('user_id', flat=True).distinct()
+        )
+        for queryset in (
+            UserRole.objects.filter(Q(user__in=users) | Q(role__in=roles)),
+            AccessRoleRule.objects.filter(
+                Q(role__in=roles) | Q(element__in=elements)
+            ),
+            roles,
+            elements,
+        ):
+            feed.record_queryset(queryset, deleted=True)
+        for queryset in querysets:
+            effective.delete_rows(queryset)
+        for start in range(0, len(affected), effective.BATCH_SIZE):
+            effective.refresh_users(
+                affected[start:start + effective.BATCH_SIZE]
+            )
+        bump_version(
+            tenant_scope(CATALOG, tenant.pk),
+            tenant_scope(POLICY, tenant.pk),
+            *(user_scope(user_id) for user_id in affected)
+        )
+
+
+def has_seeded_data(tenant, prefix):
+    return Role.objects.filter(
+        tenant=tenant, name__startswith=f'{prefix}_role_'
+    ).exists()
+
+
+def get_tenant(slug):
+    tenant, _ = Tenant.objects.get_or_create(
+        slug=slug, defaults={'name': slug}
+    )
+    return tenant
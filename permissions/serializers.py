@@ -3,10 +3,16 @@ from rest_framework import serializers
 from accounts.models import User
 
 from .models import AccessRoleRule, BusinessElement, Role, UserRole
+from .namespaces import name_error
+from .tenancy import CurrentTenantDefault, TenantScopedSerializerMixin
 
 
 class RoleSerializer(serializers.ModelSerializer):
     """Сериализатор для ролей."""
+    # Имена уникальны в пределах арендатора: поле нужно валидатору
+    # уникальности (tenant, name).
+    tenant = serializers.HiddenField(default=CurrentTenantDefault())
+
     class Meta:
         model = Role
         fields = '__all__'
@@ -15,13 +21,25 @@ class RoleSerializer(serializers.ModelSerializer):
 
 class BusinessElementSerializer(serializers.ModelSerializer):
     """Сериализатор для бизнес-элементов."""
+    # См. RoleSerializer.
+    tenant = serializers.HiddenField(default=CurrentTenantDefault())
+
     class Meta:
         model = BusinessElement
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
 
+    def validate_name(self, value):
+        error = name_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
 
-class AccessRoleRuleSerializer(serializers.ModelSerializer):
+class AccessRoleRuleSerializer(
+    TenantScopedSerializerMixin,
+    serializers.ModelSerializer
+):
     """Сериализатор для правил доступа."""
     role_name = serializers.CharField(
         source='role.name',
@@ -35,10 +53,21 @@ class AccessRoleRuleSerializer(serializers.ModelSerializer):
     class Meta:
         model = AccessRoleRule
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('tenant', 'created_at', 'updated_at')
+
 
+def validate_period(valid_from, expires_at):
+    """Начало срока назначения должно быть раньше его окончания."""
+    if valid_from and expires_at and valid_from >= expires_at:
+        raise serializers.ValidationError({
+            'expires_at': 'Срок действия должен заканчиваться позже начала'
+        })
 
-class UserRoleSerializer(serializers.ModelSerializer):
+
+class UserRoleSerializer(
+    TenantScopedSerializerMixin,
+    serializers.ModelSerializer
+):
     """Сериализатор для связи пользователей с ролями."""
     role_name = serializers.CharField(
         source='role.name',
@@ -52,27 +81,42 @@ class UserRoleSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserRole
         fields = '__all__'
-        read_only_fields = ('created_at',)
+        read_only_fields = ('tenant', 'created_at')
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        # При частичном обновлении недостающая граница берется из объекта.
+        current = self.instance
+        validate_period(
+            attrs.get('valid_from', getattr(current, 'valid_from', None)),
+            attrs.get('expires_at', getattr(current, 'expires_at', None))
+        )
+        return attrs
 
 
 class AssignRoleSerializer(serializers.Serializer):
     """Сериализатор для назначения роли пользователю."""
     user_id = serializers.IntegerField()
     role_id = serializers.IntegerField()
+    valid_from = serializers.DateTimeField(required=False, allow_null=True)
+    expires_at = serializers.DateTimeField(required=False, allow_null=True)
 
     def validate(self, attrs):
         user_id = attrs.get('user_id')
         role_id = attrs.get('role_id')
+        validate_period(attrs.get('valid_from'), attrs.get('expires_at'))
+        # Пользователь и роль ищутся у арендатора из запроса.
+        tenant_id = self.context['request'].user.tenant_id
 
         try:
-            user = User.objects.get(id=user_id)
+            user = User.objects.get(id=user_id, tenant_id=tenant_id)
         except User.DoesNotExist:
             raise serializers.ValidationError({
                 "user_id": "Пользователь не найден"
             })
 
         try:
-            role = Role.objects.get(id=role_id)
+            role = Role.objects.get(id=role_id, tenant_id=tenant_id)
         except Role.DoesNotExist:
             raise serializers.ValidationError({
                 "role_id": "Роль не найдена"
@@ -0,0 +1,138 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from backend.db_router import stick_to_primary
+
+from . import effective, feed
+from .models import AccessRoleRule, BusinessElement, Role, UserRole
+from .versions import (
+    CATALOG,
+    POLICY,
+    bump_version,
+    tenant_scope,
+    user_scope,
+)
+
+
+@receiver(pre_save, sender=BusinessElement)
+def remember_element_name(sender, instance, **kwargs):
+    """Запомнить прежнее имя элемента перед изменением."""
+    instance._previous_name = None
+    if instance._state.adding:
+        return
+    if hasattr(instance, '_loaded_name'):
+        instance._previous_name = instance._loaded_name
+    else:
+        instance._previous_name = BusinessElement.objects.filter(
+            pk=instance.pk
+        ).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=BusinessElement)
+def element_renamed(sender, instance, created, **kwargs):
+    """
+    Новое имя меняет место элемента в иерархии: пересчитать права
+    пользователей с правилами на него. Версию политики затем меняет
+    catalog_changed.
+    """
+    previous = getattr(instance, '_previous_name', None)
+    if not created and previous is not None and previous != instance.name:
+        effective.refresh_element(instance.pk)
+    instance._loaded_name = instance.name
+
+
+@receiver(pre_save, sender=AccessRoleRule)
+def remember_rule_target(sender, instance, **kwargs):
+    """Запомнить прежние роль и элемент правила перед изменением."""
+    instance._previous_target = None
+    if not instance._state.adding:
+        instance._previous_target = AccessRoleRule.objects.filter(
+            pk=instance.pk
+        ).values_list('role_id', 'element_id', 'element__name').first()
+
+
+@receiver(post_save, sender=AccessRoleRule)
+@receiver(post_delete, sender=AccessRoleRule)
+def rule_effective_permissions(sender, instance, **kwargs):
+    """Пересчитать эффективные права владельцев роли на элемент правила."""
+    element_name = None
+    if AccessRoleRule.element.is_cached(instance):
+        element_name = instance.element.name
+    target = (instance.role_id, instance.element_id, element_name)
+    previous = getattr(instance, '_previous_target', None)
+    if previous and previous[:2] != target[:2]:
+        effective.refresh_role_element(*previous)
+    effective.refresh_role_element(*target)
+
+
+# Версии меняются после пересчета user_effective_permissions (receiver'ы
+# вызываются в порядке регистрации): проверка прав, прочитавшая строки
+# между сменой версии и пересчетом, закэшировала бы старые права под новой
+# версией, а в autocommit повторной смены версии после коммита нет.
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=BusinessElement)
+@receiver(post_delete, sender=BusinessElement)
+def catalog_changed(sender, instance, **kwargs):
+    """
+    Изменение ролей и бизнес-элементов меняет версию справочников
+    арендатора.
+    """
+    bump_version(
+        tenant_scope(CATALOG, instance.tenant_id),
+        tenant_scope(POLICY, instance.tenant_id)
+    )
+
+
+@receiver(post_save, sender=AccessRoleRule)
+@receiver(post_delete, sender=AccessRoleRule)
+def policy_changed(sender, instance, **kwargs):
+    """Изменение правил доступа меняет версию политики арендатора."""
+    bump_version(tenant_scope(POLICY, instance.tenant_id))
+
+
+@receiver(pre_save, sender=UserRole)
+def remember_user_role_owner(sender, instance, **kwargs):
+    """Запомнить прежнего пользователя назначения перед изменением."""
+    instance._previous_user_id = None
+    if not instance._state.adding:
+        instance._previous_user_id = UserRole.objects.filter(
+            pk=instance.pk
+        ).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def user_roles_changed(sender, instance, **kwargs):
+    """Изменение ролей пользователя меняет версию его прав."""
+    previous = getattr(instance, '_previous_user_id', None)
+    if previous is not None and previous != instance.user_id:
+        effective.refresh_user(previous)
+        bump_version(user_scope(previous))
+    # Сначала пересчет, затем версия (см. catalog_changed).
+    effective.refresh_user(instance.user_id)
+    bump_version(user_scope(instance.user_id))
+    # Проверки прав этого пользователя не должны читать старые роли
+    # с реплики.
+    stick_to_primary(instance.user_id)
+
+
+# Журнал ленты пишется последним: на PostgreSQL запись берет блокировку
+# журнала арендатора до конца транзакции (permissions.feed), и пересчет
+# прав выполняется до нее.
+@receiver(post_save, sender=Role)
+@receiver(post_save, sender=BusinessElement)
+@receiver(post_save, sender=AccessRoleRule)
+@receiver(post_save, sender=UserRole)
+def record_policy_change(sender, instance, **kwargs):
+    """Записать изменение в журнал ленты изменений политики."""
+    feed.record(instance)
+
+
+@receiver(post_delete, sender=Role)
+@receiver(post_delete, sender=BusinessElement)
+@receiver(post_delete, sender=AccessRoleRule)
+@receiver(post_delete, sender=UserRole)
+def record_policy_deletion(sender, instance, **kwargs):
+    """Записать удаление (tombstone) в журнал ленты изменений политики."""
+    feed.record(instance, deleted=True)
@@ -0,0 +1,236 @@
+"""
+Скомпилированный снимок политики доступа для проверки прав в других
+сервисах без обращения к этому сервису и к БД.
+
+Снимок собирает команда ``manage.py export_policy`` (permissions.export):
+роли, бизнес-элементы и правила доступа одного арендатора. Модуль
+зависит только от стандартной библиотеки и модулей permissions.flags и
+permissions.namespaces, Django не нужен: сервис-потребитель может
+установить этот пакет или скопировать три файла к себе.
+
+Формат (little-endian), версия FORMAT_VERSION:
+
+- заголовок HEADER: MAGIC, версия формата, число битов прав, арендатор,
+  версия политики (номер записи ленты изменений, permissions.feed), время
+  сборки (unix), число элементов и ролей;
+- индекс элементов: element_count + 1 смещений uint32 имен в блоке имен,
+  имена отсортированы по байтам UTF-8;
+- индекс ролей: role_count идентификаторов uint64 по возрастанию;
+- массивы правил ролей: для каждой роли element_count ячеек CELL
+  (приоритет, эффект NO_RULE/ALLOW/DENY, маска прав) в порядке индекса
+  элементов;
+- блок имен в UTF-8.
+
+Решение принимается так же, как в permissions.authorization: для каждой
+роли - самые специфичные разрешение и запрет по иерархии имен
+(permissions.namespaces), затем flags.decide по приоритетам.
+"""
+import bisect
+import mmap
+import os
+import struct
+
+from .flags import ACTION_FLAGS, PERMISSION_FIELDS, Rule, decide
+from .namespaces import candidates, resolve_rule
+
+MAGIC = b'RBACSNAP'
+FORMAT_VERSION = 2
+
+# Идентификатор арендатора - uint64, как и ролей; 4 байта выравнивания
+# ставят 64-битные поля на границу 8 байт.
+HEADER = struct.Struct('<8sHH4xQQQII')
+CELL = struct.Struct('<hBB')
+OFFSET = struct.Struct('<I')
+ROLE_ID = struct.Struct('<Q')
+
+NO_RULE, ALLOW, DENY = 0, 1, 2
+
+
+class SnapshotError(ValueError):
+    """Файл не является снимком политики поддерживаемой версии."""
+
+
+def _align(size, boundary=8):
+    return -size % boundary
+
+
+def pack(tenant_id, version, created_at, elements, roles):
+    """
+    Снимок в виде bytes.
+
+    elements - имена бизнес-элементов, roles - {id роли: {имя: Rule}}.
+    Правила на имена вне elements не попадают в снимок.
+    """
+    encoded = sorted({name.encode() for name in elements})
+    positions = {name.decode(): index for index, name in enumerate(encoded)}
+    role_ids = sorted(roles)
+
+    offsets = [0]
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name))
+    index = b''.join(OFFSET.pack(offset) for offset in offsets)
+    index += bytes(_align(HEADER.size + len(index)))
+
+    cells = bytearray(CELL.size * len(encoded) * len(role_ids))
+    for role_position, role_id in enumerate(role_ids):
+        base = role_position * len(encoded)
+        for name, rule in roles[role_id].items():
+            position = positions.get(name)
+            if position is None:
+                continue
+            CELL.pack_into(
+                cells, CELL.size * (base + position),
+                rule.priority, DENY if rule.deny else ALLOW, rule.mask
+            )
+
+    return b''.join((
+        HEADER.pack(
+            MAGIC, FORMAT_VERSION, len(PERMISSION_FIELDS), tenant_id,
+            version, created_at, len(encoded), len(role_ids)
+        ),
+        index,
+        b''.join(ROLE_ID.pack(role_id) for role_id in role_ids),
+        bytes(cells),
+        *encoded,
+    ))
+
+
+class PolicySnapshot:
+    """
+    Снимок политики, отображенный в память (mmap). Данные не копируются
+    и не разбираются при открытии: поиск элемента - двоичный поиск по
+    индексу имен, роли - по индексу ролей. Экземпляр можно использовать
+    из нескольких потоков.
+
+    Файл нужно заменять атомарно (permissions.export.write): открытые
+    снимки продолжают читать старую версию до переоткрытия.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            # Пустой файл mmap не отображает.
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise SnapshotError('Файл короче заголовка снимка')
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self._data.close()
+            raise
+
+    def _parse(self):
+        (magic, format_version, flag_count, self.tenant_id, self.version,
+         self.created_at, self.element_count,
+         self.role_count) = HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise SnapshotError('Файл не является снимком политики')
+        if format_version != FORMAT_VERSION:
+            raise SnapshotError(
+                f'Неподдерживаемая версия формата: {format_version}'
+            )
+        if flag_count != len(PERMISSION_FIELDS):
+            raise SnapshotError(
+                f'Снимок собран для {flag_count} битов прав, '
+                f'ожидается {len(PERMISSION_FIELDS)}'
+            )
+
+        index_size = OFFSET.size * (self.element_count + 1)
+        roles = HEADER.size + index_size + _align(HEADER.size + index_size)
+        self._cells = roles + ROLE_ID.size * self.role_count
+        self._names = (
+            self._cells + CELL.size * self.element_count * self.role_count
+        )
+        if len(self._data) < self._names:
+            raise SnapshotError('Снимок поврежден: файл обрезан')
+        (names_size,) = OFFSET.unpack_from(
+            self._data, HEADER.size + OFFSET.size * self.element_count
+        )
+        if len(self._data) != self._names + names_size:
+            raise SnapshotError('Снимок поврежден: неверный размер')
+        # Индексы читаются из отображения напрямую (порядок байтов
+        # little-endian совпадает с нативным на x86-64 и arm64).
+        self._offsets = memoryview(self._data)[
+            HEADER.size:HEADER.size + index_size
+        ].cast('I')
+        self.role_ids = memoryview(self._data)[roles:self._cells].cast('Q')
+
+    def close(self):
+        self._offsets.release()
+        self.role_ids.release()
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _name(self, position):
+        start = self._names + self._offsets[position]
+        return self._data[start:self._names + self._offsets[position + 1]]
+
+    def _element_position(self, name):
+        key = name.encode()
+        low, high = 0, self.element_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.element_count and self._name(low) == key:
+            return low
+        return None
+
+    def elements(self):
+        """Имена бизнес-элементов снимка в порядке индекса."""
+        return [
+            self._name(position).decode()
+            for position in range(self.element_count)
+        ]
+
+    def _role_position(self, role_id):
+        position = bisect.bisect_left(self.role_ids, role_id)
+        if position < self.role_count and self.role_ids[position] == role_id:
+            return position
+        return None
+
+    def mask(self, role_ids, element_name):
+        """
+        Маска прав ролей role_ids на элемент element_name с учетом
+        шаблонов, запретов и приоритетов. Неизвестные роли не дают прав.
+        """
+        # Имена правил, применимых к элементу, ищутся в индексе один раз.
+        names = [
+            (name, position) for name in candidates(element_name)
+            if (position := self._element_position(name)) is not None
+        ]
+        rules = []
+        for role_position in {
+            self._role_position(role_id) for role_id in role_ids
+        }:
+            if role_position is None:
+                continue
+            base = self._cells + CELL.size * role_position * self.element_count
+            role_rules = {}
+            for name, position in names:
+                priority, effect, flags = CELL.unpack_from(
+                    self._data, base + CELL.size * position
+                )
+                if effect != NO_RULE:
+                    role_rules[name] = Rule(priority, effect == DENY, flags)
+            for deny in (False, True):
+                rule = resolve_rule(role_rules, element_name, deny)
+                if rule is not None:
+                    rules.append(rule)
+        return decide(rules)
+
+    def decide(self, role_ids, element_name, action, owner=False):
+        """
+        Разрешено ли ролям role_ids действие action над элементом.
+        Права "только свои" действуют, только если вызывающий сервис сам
+        проверил владение объектом (owner=True).
+        """
+        own_flag, all_flag = ACTION_FLAGS.get(action, (0, 0))
+        mask = self.mask(role_ids, element_name)
+        return bool(mask & all_flag or owner and mask & own_flag)
@@ -0,0 +1,49 @@
+"""
+Разделение данных RBAC по арендаторам.
+
+Арендатор запроса - ``request.user.tenant_id``; для JWT он сверяется с
+claim токена (accounts.authentication.TenantJWTAuthentication).
+"""
+
+
+class CurrentTenantDefault:
+    """Значение по умолчанию для поля tenant: арендатор пользователя."""
+    requires_context = True
+
+    def __call__(self, serializer_field):
+        return serializer_field.context['request'].user.tenant
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+
+class TenantScopedViewMixin:
+    """ViewSet видит и создает объекты только арендатора пользователя."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            tenant_id=self.request.user.tenant_id
+        )
+
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.user.tenant)
+
+
+class TenantScopedSerializerMixin:
+    """
+    Связанные объекты (роль, элемент, пользователь) выбираются только у
+    арендатора пользователя из запроса.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None:
+            return fields
+        for field in fields.values():
+            queryset = getattr(field, 'queryset', None)
+            if queryset is not None:
+                field.queryset = queryset.filter(
+                    tenant_id=request.user.tenant_id
+                )
+        return fields
@@ -1,10 +1,92 @@
+import re
+import runpy
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Max
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework import status
-from rest_framework.test import APIClient
+from django.utils import timezone
+from rest_framework import mixins, status, viewsets
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate,
+)
+from rest_framework.views import APIView
+
+from accounts.authentication import tokens_for_user
+from accounts.models import Tenant
+from accounts.serializers import UserSerializer
+from backend.cache import Entry, LocalCache, TieredCache, rbac_cache
+from backend.db_router import (
+    PrimaryReplicaRouter,
+    ReplicaReadMixin,
+    fresh_reads,
+    is_sticky,
+    replica_reads,
+    stick_to_primary,
+)
+from backend.fast_serializers import get_read_plan
 
-from .models import AccessRoleRule, BusinessElement, Role, UserRole
+from . import authorization, feed, invalidation, matrix
+from .async_views import AsyncAPIViewMixin
+from .authorization import (
+    _cache_timeout,
+    allowed_ids,
+    authorize,
+    filter_allowed,
+    get_effective_permissions,
+    get_permissions_version,
+)
+from .feed import changes, compact
+from .flags import (
+    CREATE,
+    DELETE,
+    DELETE_ALL,
+    PERMISSION_FIELDS,
+    READ,
+    READ_ALL,
+    UPDATE_ALL,
+    Rule,
+    decide,
+)
+from .invalidation import Listener, enabled
+from .matrix import _compute_cells, get_cells
+from .models import (
+    AccessRoleRule,
+    BusinessElement,
+    CacheInvalidation,
+    PolicyChange,
+    Role,
+    UserEffectivePermission,
+    UserRole,
+)
+from .namespaces import ElementTrie
+from .permissions import HasPermission
+from .seeding import get_tenant
+from .serializers import (
+    AccessRoleRuleSerializer,
+    BusinessElementSerializer,
+    RoleSerializer,
+    UserRoleSerializer,
+)
+from .snapshot import PolicySnapshot, SnapshotError, pack
+from .tenancy import TenantScopedViewMixin
+from .versions import CATALOG, POLICY, get_version, tenant_scope, user_scope
+from .warmup import warm_on_startup, warm_up
 
 User = get_user_model()
 
@@ -251,6 +333,19 @@ class BusinessElementViewSetTest(TestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_element_name_validation(self):
+        """Шаблон * допустим только последним сегментом имени."""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('permissions:business-element-list')
+        for name in ('orders.*', '*'):
+            response = self.client.post(url, {'name': name})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        for name in ('orders.*.items', 'orders..items', 'orders.it*'):
+            response = self.client.post(url, {'name': name})
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+
 
 class AccessRoleRuleViewSetTest(TestCase):
     """Тесты для AccessRoleRuleViewSet."""
@@ -352,6 +447,28 @@ class UserRoleViewSetTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn('message', response.data)
 
+    def test_assign_role_with_period(self):
+        """Назначение на срок; конец срока должен быть позже начала."""
+        self.client.force_authenticate(user=self.user)
+        url = '/api/permissions/user-roles/assign/'
+        new_role = Role.objects.create(name='Temporary Role')
+        data = {
+            'user_id': self.user.id,
+            'role_id': new_role.id,
+            'valid_from': '2030-01-02T00:00:00Z',
+            'expires_at': '2030-01-01T00:00:00Z',
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expires_at', response.data)
+
+        data['expires_at'] = '2030-01-03T00:00:00Z'
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.data['user_role']['expires_at'], '2030-01-03T00:00:00Z'
+        )
+
     def test_assign_role_duplicate(self):
         """Тест назначения уже существующей роли."""
         self.client.force_authenticate(user=self.user)
@@ -373,6 +490,34 @@ class UserRoleViewSetTest(TestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_assign_role_again_updates_period(self):
+        """Повторное назначение меняет срок действия назначения."""
+        self.client.force_authenticate(user=self.user)
+        url = '/api/permissions/user-roles/assign/'
+        new_role = Role.objects.create(name='Temporary Role')
+        data = {
+            'user_id': self.user.id,
+            'role_id': new_role.id,
+            'expires_at': '2030-01-01T00:00:00Z',
+        }
+        self.client.post(url, data)
+        version = get_version(user_scope(self.user.pk))
+
+        data['expires_at'] = '2031-01-01T00:00:00Z'
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['user_role']['expires_at'], '2031-01-01T00:00:00Z'
+        )
+        user_role = UserRole.objects.get(user=self.user, role=new_role)
+        self.assertEqual(user_role.expires_at.year, 2031)
+        self.assertGreater(get_version(user_scope(self.user.pk)), version)
+
+        # Тот же срок ничего не меняет.
+        version = get_version(user_scope(self.user.pk))
+        self.client.post(url, data)
+        self.assertEqual(get_version(user_scope(self.user.pk)), version)
+
     def test_remove_role(self):
         """Тест удаления роли у пользователя."""
         self.client.force_authenticate(user=self.user)
@@ -554,3 +699,2216 @@ class HasPermissionTest(TestCase):
                 self.user = user
         obj = TestObj(other_user)
         self.assertFalse(permission._is_owner(self.user, obj))
+
+
+class FastSerializerTest(TestCase):
+    """Тесты для быстрого пути чтения сериализаторов."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        self.users = [
+            User.objects.create_user(
+                email=f'user{i}@example.com',
+                username=f'user{i}',
+                first_name='Test',
+                last_name='User',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        self.roles = [
+            Role.objects.create(name=f'Role {i}', description=None)
+            for i in range(3)
+        ]
+        self.roles[0].description = 'С описанием'
+        self.roles[0].save()
+        self.elements = [
+            BusinessElement.objects.create(name=f'element_{i}')
+            for i in range(2)
+        ]
+        for i, role in enumerate(self.roles):
+            for element in self.elements:
+                AccessRoleRule.objects.create(
+                    role=role,
+                    element=element,
+                    read_permission=bool(i % 2),
+                    update_all_permission=True
+                )
+            UserRole.objects.create(user=self.users[i], role=role)
+
+    def assertPlanMatchesSerializer(self, serializer_class, queryset):
+        plan = get_read_plan(serializer_class)
+        self.assertIsNotNone(plan)
+        expected = serializer_class(queryset, many=True).data
+        actual = plan.render(plan.values(queryset))
+        self.assertEqual(actual, expected)
+        # Порядок ключей тоже должен совпадать.
+        self.assertEqual(
+            [list(row) for row in actual],
+            [list(row) for row in expected]
+        )
+
+    def test_access_rule_plan_matches_serializer(self):
+        """План AccessRoleRuleSerializer совпадает с сериализатором."""
+        self.assertPlanMatchesSerializer(
+            AccessRoleRuleSerializer,
+            AccessRoleRule.objects.select_related('role', 'element')
+        )
+
+    def test_user_role_plan_matches_serializer(self):
+        """План UserRoleSerializer совпадает с сериализатором."""
+        self.assertPlanMatchesSerializer(
+            UserRoleSerializer,
+            UserRole.objects.select_related('user', 'role')
+        )
+
+    def test_catalog_plans_match_serializers(self):
+        """Планы для ролей и бизнес-элементов, включая NULL значения."""
+        self.assertPlanMatchesSerializer(RoleSerializer, Role.objects.all())
+        self.assertPlanMatchesSerializer(
+            BusinessElementSerializer,
+            BusinessElement.objects.all()
+        )
+
+    def test_unsupported_serializer_has_no_plan(self):
+        """SerializerMethodField не компилируется в план."""
+        self.assertIsNone(get_read_plan(UserSerializer))
+
+    def test_list_endpoint_matches_serializer(self):
+        """Ответ list совпадает с обычным сериализатором и пагинацией."""
+        element = BusinessElement.objects.create(name='access_rules')
+        AccessRoleRule.objects.create(
+            role=self.roles[0],
+            element=element,
+            read_all_permission=True
+        )
+        client = APIClient()
+        client.force_authenticate(user=self.users[0])
+        response = client.get(reverse('permissions:access-rule-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        queryset = AccessRoleRule.objects.select_related('role', 'element')
+        expected = AccessRoleRuleSerializer(queryset, many=True).data
+        self.assertEqual(response.json()['count'], len(expected))
+        self.assertEqual(
+            response.json()['results'],
+            [dict(row) for row in expected]
+        )
+
+
+class CatalogCacheTest(TestCase):
+    """Тесты HTTP-кэширования справочников."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='admin@example.com',
+            username='admin',
+            first_name='Admin',
+            last_name='User',
+            password='admin123'
+        )
+        self.role = Role.objects.create(name='Admin Role')
+        self.element = BusinessElement.objects.create(name='roles')
+        AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.element,
+            read_all_permission=True,
+            create_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=self.role)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('permissions:role-list')
+
+    def test_list_has_etag_and_cache_control(self):
+        """Ответ содержит ETag и Cache-Control."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+    def test_if_none_match_returns_not_modified(self):
+        """Совпадающий ETag дает 304 без тела."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_repeat_read_served_from_cache(self):
+        """Повторное чтение не выполняет запросов, кроме проверки прав."""
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertFalse(
+            any('FROM "roles"' in query['sql']
+                for query in queries.captured_queries)
+        )
+
+    def test_write_invalidates_cache(self):
+        """Запись в справочник меняет ETag и содержимое."""
+        first = self.client.get(self.url)
+        Role.objects.create(name='Another Role')
+        second = self.client.get(self.url)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertEqual(second.json()['count'], 2)
+
+    def test_query_string_is_part_of_key(self):
+        """Разные параметры запроса кэшируются отдельно."""
+        first = self.client.get(self.url)
+        second = self.client.get(self.url, {'page': 1})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+
+class PermissionMatrixTest(TestCase):
+    """Тесты для матрицы прав."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='admin@example.com',
+            username='admin',
+            first_name='Admin',
+            last_name='User',
+            password='admin123'
+        )
+        self.role = Role.objects.create(name='Admin Role')
+        self.other_role = Role.objects.create(name='Other Role')
+        self.element = BusinessElement.objects.create(name='access_rules')
+        self.other_element = BusinessElement.objects.create(name='orders')
+        AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.element,
+            read_all_permission=True
+        )
+        self.rule = AccessRoleRule.objects.create(
+            role=self.other_role,
+            element=self.other_element,
+            read_permission=True,
+            delete_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=self.role)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('permissions:matrix')
+
+    def test_dense_matrix(self):
+        """Плотная матрица: маски построчно, 0 для пустых ячеек."""
+        response = self.client.get(self.url, {'encoding': 'dense'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['encoding'], 'dense')
+        self.assertEqual(data['roles'], [self.role.id, self.other_role.id])
+        self.assertEqual(
+            data['elements'],
+            [self.element.id, self.other_element.id]
+        )
+        self.assertEqual(data['flags'], [READ_ALL, 0, 0, READ | DELETE_ALL])
+
+    def test_sparse_matrix(self):
+        """Разреженная матрица: только ненулевые ячейки по индексам."""
+        response = self.client.get(self.url, {'encoding': 'sparse'})
+        data = response.json()
+        self.assertEqual(
+            data['cells'],
+            [[0, 0, READ_ALL], [1, 1, READ | DELETE_ALL]]
+        )
+        self.assertEqual(data['effects'], [])
+
+    def test_matrix_cached_until_policy_changes(self):
+        """Матрица кэшируется и меняется вместе с версией политики."""
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.rule.delete_all_permission = False
+        self.rule.save()
+        third = self.client.get(self.url)
+        self.assertNotEqual(first['ETag'], third['ETag'])
+        self.assertGreater(third.json()['version'], first.json()['version'])
+
+    def test_delta_since_version(self):
+        """Режим delta возвращает только изменившиеся ячейки."""
+        version = self.client.get(self.url).json()['version']
+        self.rule.delete_all_permission = False
+        self.rule.save()
+        AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.other_element,
+            create_permission=True
+        )
+
+        response = self.client.get(self.url, {'since_version': version})
+        data = response.json()
+        self.assertEqual(data['encoding'], 'delta')
+        self.assertEqual(data['since_version'], version)
+        cells = {
+            (data['roles'][r], data['elements'][e]): mask
+            for r, e, mask in data['cells']
+        }
+        self.assertEqual(cells, {
+            (self.role.id, self.other_element.id): CREATE,
+            (self.other_role.id, self.other_element.id): READ,
+        })
+
+    def test_delta_reports_revoked_cells(self):
+        """Удаленное правило попадает в delta с маской 0."""
+        version = self.client.get(self.url).json()['version']
+        self.rule.delete()
+        data = self.client.get(self.url, {'since_version': version}).json()
+        self.assertEqual(data['roles'], [self.other_role.id])
+        self.assertEqual(data['elements'], [self.other_element.id])
+        self.assertEqual(data['cells'], [[0, 0, 0]])
+
+    def test_delta_unknown_version_returns_full_matrix(self):
+        """Если снимка версии нет, возвращается полная матрица."""
+        response = self.client.get(self.url, {'since_version': 1})
+        self.assertIn(response.json()['encoding'], ('dense', 'sparse'))
+
+    def test_invalid_parameters(self):
+        """Некорректные параметры дают 400."""
+        response = self.client.get(self.url, {'encoding': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'since_version': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_matrix_computed_in_one_query(self):
+        """Снимок матрицы строится одним запросом."""
+        with self.assertNumQueries(1):
+            _compute_cells(self.user.tenant_id)
+
+
+class QueryPlanTest(TestCase):
+    """
+    Регрессионные тесты планов запросов: горячие запросы RBAC должны
+    использовать индексы, а списки - читать строки в порядке индекса.
+    """
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        self.user = User.objects.create_user(
+            email='plan@example.com',
+            username='planuser',
+            first_name='Plan',
+            last_name='User',
+            password='planpass123'
+        )
+        self.role = Role.objects.create(name='Plan Role')
+        self.element = BusinessElement.objects.create(name='plans')
+        AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.element,
+            read_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=self.role)
+
+    def _explain(self, queryset, ordered):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # На маленьких таблицах PostgreSQL всегда выбирает Seq Scan,
+        # поэтому проверяем, что индексный план вообще возможен.
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            if ordered:
+                cursor.execute('SET enable_sort = off')
+        try:
+            return queryset.explain()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+                cursor.execute('RESET enable_sort')
+
+    def assertUsesIndexes(self, queryset, ordered=False):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('EXPLAIN проверяется только для SQLite и PostgreSQL')
+
+        plan = self._explain(queryset, ordered)
+        if connection.vendor == 'sqlite':
+            full_scans = [
+                line for line in plan.splitlines()
+                if re.search(r'\bSCAN (?!CONSTANT)\S+$', line)
+            ]
+            has_sort = 'USE TEMP B-TREE FOR ORDER BY' in plan
+        else:
+            full_scans = [
+                line for line in plan.splitlines() if 'Seq Scan' in line
+            ]
+            has_sort = re.search(r'(^|->)\s*Sort\b', plan, re.M) is not None
+
+        self.assertEqual(full_scans, [], plan)
+        if ordered:
+            self.assertFalse(has_sort, plan)
+
+    def test_business_element_by_name(self):
+        """Поиск бизнес-элемента арендатора по имени."""
+        self.assertUsesIndexes(
+            BusinessElement.objects.filter(
+                tenant_id=self.element.tenant_id,
+                name='plans'
+            )
+        )
+
+    def test_user_by_email(self):
+        """Поиск пользователя по email."""
+        self.assertUsesIndexes(User.objects.filter(email='plan@example.com'))
+
+    def test_user_roles_by_user(self):
+        """Роли пользователя для проверки прав."""
+        self.assertUsesIndexes(
+            UserRole.objects.filter(user=self.user).select_related('role')
+        )
+
+    def test_access_rule_by_element_and_role(self):
+        """Правило доступа по паре (элемент, роль)."""
+        self.assertUsesIndexes(
+            AccessRoleRule.objects.filter(
+                element=self.element,
+                role=self.role
+            )
+        )
+
+    def test_access_rules_by_element_covering(self):
+        """Права ролей для элемента читаются из покрывающего индекса."""
+        queryset = AccessRoleRule.objects.filter(
+            element=self.element
+        ).values_list('role_id', *PERMISSION_FIELDS)
+        self.assertUsesIndexes(queryset)
+
+    def test_effective_permissions_query(self):
+        """Агрегирующий запрос эффективных прав."""
+        queryset = AccessRoleRule.objects.filter(
+            role__user_roles__user=self.user
+        ).order_by().values('element__name').annotate(
+            read=Max('read_all_permission')
+        )
+        self.assertUsesIndexes(queryset)
+
+    def test_user_roles_list_without_sort(self):
+        """Список ролей пользователей не требует сортировки."""
+        self.assertUsesIndexes(
+            UserRole.objects.select_related('user', 'role')[:20],
+            ordered=True
+        )
+
+    def test_access_rules_list_without_sort(self):
+        """Список правил доступа не требует сортировки."""
+        self.assertUsesIndexes(
+            AccessRoleRule.objects.select_related('role', 'element')[:20],
+            ordered=True
+        )
+
+    def test_tenant_lists_without_sort(self):
+        """Списки арендатора читаются из индексов (tenant_id, ...)."""
+        tenant_id = self.role.tenant_id
+        for queryset in (
+            Role.objects.filter(tenant_id=tenant_id),
+            BusinessElement.objects.filter(tenant_id=tenant_id),
+            AccessRoleRule.objects.filter(tenant_id=tenant_id),
+            UserRole.objects.filter(tenant_id=tenant_id),
+            User.objects.filter(tenant_id=tenant_id).order_by('email'),
+        ):
+            with self.subTest(model=queryset.model.__name__):
+                self.assertUsesIndexes(queryset[:20], ordered=True)
+
+
+class ReplicaRouterTest(TestCase):
+    """Тесты маршрутизации чтения на реплики."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.user = User.objects.create_user(
+            email='replica@example.com',
+            username='replicauser',
+            first_name='Replica',
+            last_name='User',
+            password='replicapass123'
+        )
+        self.other_user = User.objects.create_user(
+            email='other@example.com',
+            username='otheruser',
+            first_name='Other',
+            last_name='User',
+            password='otherpass123'
+        )
+        self.role = Role.objects.create(name='Replica Role')
+
+    def _read_alias(self):
+        return PrimaryReplicaRouter().db_for_read(Role)
+
+    def test_reads_use_primary_without_replicas(self):
+        """Без реплик все читается из default."""
+        with override_settings(DATABASE_REPLICAS=[]):
+            with replica_reads(self.user):
+                self.assertEqual(self._read_alias(), 'default')
+
+    def test_reads_use_replica_inside_context(self):
+        """Внутри replica_reads чтение идет на реплику."""
+        with override_settings(DATABASE_REPLICAS=['replica_0']):
+            self.assertEqual(self._read_alias(), 'default')
+            with replica_reads(self.user):
+                self.assertEqual(self._read_alias(), 'replica_0')
+                self.assertEqual(
+                    PrimaryReplicaRouter().db_for_write(Role),
+                    'default'
+                )
+            self.assertEqual(self._read_alias(), 'default')
+
+    def test_user_sticks_to_primary_after_role_change(self):
+        """После изменения ролей пользователь читает из default."""
+        with override_settings(DATABASE_REPLICAS=['replica_0']):
+            UserRole.objects.create(user=self.user, role=self.role)
+            with replica_reads(self.user):
+                self.assertEqual(self._read_alias(), 'default')
+            with replica_reads(self.other_user):
+                self.assertEqual(self._read_alias(), 'replica_0')
+
+    def test_cache_fill_after_policy_change_reads_primary(self):
+        """После изменения политики кэш заполняется из default."""
+        element = BusinessElement.objects.create(name='replica_element')
+        with override_settings(DATABASE_REPLICAS=['replica_0']):
+            AccessRoleRule.objects.create(
+                role=self.role, element=element, read_all_permission=True
+            )
+            policy = tenant_scope(POLICY, self.user.tenant_id)
+            catalog = tenant_scope(CATALOG, self.user.tenant_id + 1)
+            with replica_reads(self.other_user):
+                with fresh_reads(policy):
+                    self.assertEqual(self._read_alias(), 'default')
+                with fresh_reads(catalog):
+                    self.assertEqual(self._read_alias(), 'replica_0')
+                self.assertEqual(self._read_alias(), 'replica_0')
+
+    def test_sticky_window_expires(self):
+        """Закрепление за default ограничено по времени."""
+        with override_settings(
+            DATABASE_REPLICAS=['replica_0'],
+            REPLICA_STICKY_SECONDS=0
+        ):
+            stick_to_primary(self.user.pk)
+            self.assertFalse(is_sticky(self.user.pk))
+
+    def test_mixin_routes_safe_requests_and_sticks_writes(self):
+        """Mixin: GET читает с реплики, POST закрепляет за default."""
+        test_case = self
+
+        class ProbeView(ReplicaReadMixin, APIView):
+            def get(self, request):
+                return Response({'alias': test_case._read_alias()})
+
+            def post(self, request):
+                return Response({'alias': test_case._read_alias()})
+
+        factory = APIRequestFactory()
+        with override_settings(DATABASE_REPLICAS=['replica_0']):
+            request = factory.get('/probe/')
+            force_authenticate(request, user=self.user)
+            response = ProbeView.as_view()(request)
+            self.assertEqual(response.data['alias'], 'replica_0')
+            # После ответа чтение снова идет в default.
+            self.assertEqual(self._read_alias(), 'default')
+
+            request = factory.post('/probe/')
+            force_authenticate(request, user=self.user)
+            response = ProbeView.as_view()(request)
+            self.assertEqual(response.data['alias'], 'default')
+            self.assertTrue(is_sticky(self.user.pk))
+
+
+class TieredCacheTest(TestCase):
+    """Тесты двухуровневого кэша."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        self.cache = TieredCache()
+        self.cache.clear()
+
+    def test_local_cache_lru_and_ttl(self):
+        """L1 вытесняет самые старые записи и истекшие по TTL."""
+        local = LocalCache(max_entries=2)
+        far = time.time() + 60
+        local.set('a', Entry(1, far, 0))
+        local.set('b', Entry(2, far, 0))
+        local.get('a')
+        local.set('c', Entry(3, far, 0))
+        self.assertIsNone(local.get('b'))
+        self.assertEqual(local.get('a').value, 1)
+        local.set('d', Entry(4, time.time() - 1, 0))
+        self.assertIsNone(local.get('d'))
+
+    def test_l2_value_promoted_to_l1(self):
+        """Значение из L2 попадает в L1 другого процесса."""
+        self.cache.set('key', 'value', 60)
+        other = TieredCache()
+        self.assertEqual(len(other.local), 0)
+        self.assertEqual(other.get('key'), 'value')
+        self.assertEqual(len(other.local), 1)
+
+    def test_single_flight_across_threads_and_processes(self):
+        """Конкурентные запросы холодного ключа загружают его один раз."""
+        calls = []
+        calls_lock = threading.Lock()
+
+        def loader():
+            with calls_lock:
+                calls.append(1)
+            time.sleep(0.2)
+            return {'roles': 1}
+
+        # Два экземпляра с общим L2 имитируют два процесса.
+        instances = [self.cache, TieredCache()]
+        results = []
+        start = threading.Barrier(100)
+
+        def worker(index):
+            start.wait()
+            results.append(
+                instances[index % 2].get_or_load('cold', loader, 60)
+            )
+
+        threads = [
+            threading.Thread(target=worker, args=(index,))
+            for index in range(100)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'roles': 1}] * 100)
+
+    def test_early_refresh(self):
+        """Близкое к истечению значение пересчитывается заранее."""
+        self.cache.set('key', 'old', 60, delta=1000)
+        with override_settings(RBAC_CACHE_EARLY_REFRESH_BETA=0):
+            self.assertEqual(
+                self.cache.get_or_load('key', lambda: 'new', 60),
+                'old'
+            )
+        # Загрузка "длится" дольше оставшегося срока - обновляем.
+        with mock.patch('backend.cache.random.random', return_value=0.5):
+            self.assertEqual(
+                self.cache.get_or_load('key', lambda: 'new', 60),
+                'new'
+            )
+
+    def test_permission_check_uses_cache(self):
+        """Повторная проверка прав не обращается к БД."""
+        user = User.objects.create_user(
+            email='cached@example.com',
+            username='cacheduser',
+            first_name='Cached',
+            last_name='User',
+            password='cachedpass123'
+        )
+        role = Role.objects.create(name='Cached Role')
+        element = BusinessElement.objects.create(name='roles')
+        AccessRoleRule.objects.create(
+            role=role,
+            element=element,
+            read_all_permission=True
+        )
+        UserRole.objects.create(user=user, role=role)
+        permission = HasPermission()
+        self.assertTrue(
+            permission._check_permission(user, 'roles', 'read', None)
+        )
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                permission._check_permission(user, 'roles', 'read', None)
+            )
+            self.assertFalse(
+                permission._check_permission(user, 'roles', 'delete', None)
+            )
+
+
+class EffectivePermissionsTableTest(TestCase):
+    """Тесты таблицы эффективных прав пользователей."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            username='user',
+            first_name='Test',
+            last_name='User',
+            password='user123'
+        )
+        self.reader = Role.objects.create(name='Reader')
+        self.editor = Role.objects.create(name='Editor')
+        self.element = BusinessElement.objects.create(name='orders')
+        AccessRoleRule.objects.create(
+            role=self.reader,
+            element=self.element,
+            read_permission=True
+        )
+        self.editor_rule = AccessRoleRule.objects.create(
+            role=self.editor,
+            element=self.element,
+            update_all_permission=True
+        )
+
+    def flags(self):
+        return dict(
+            UserEffectivePermission.objects.filter(
+                user=self.user
+            ).values_list('element_id', 'flags')
+        )
+
+    def test_versions_bumped_after_refresh(self):
+        """Версия меняется только после пересчета строк таблицы."""
+        calls = mock.Mock()
+        with mock.patch('permissions.signals.effective', calls.effective), \
+                mock.patch('permissions.signals.bump_version', calls.bump):
+            UserRole.objects.create(user=self.user, role=self.reader)
+            self.editor_rule.read_all_permission = True
+            self.editor_rule.save()
+        names = [name for name, _, _ in calls.mock_calls]
+        self.assertEqual(names, [
+            'effective.refresh_user', 'bump',
+            'effective.refresh_role_element', 'bump',
+        ])
+
+    def test_user_roles_update_table(self):
+        """Назначение и снятие ролей пересчитывает права пользователя."""
+        reader = UserRole.objects.create(user=self.user, role=self.reader)
+        self.assertEqual(self.flags(), {self.element.id: READ})
+        UserRole.objects.create(user=self.user, role=self.editor)
+        self.assertEqual(self.flags(), {self.element.id: READ | UPDATE_ALL})
+        reader.delete()
+        self.assertEqual(self.flags(), {self.element.id: UPDATE_ALL})
+
+    def test_rule_changes_update_table(self):
+        """Изменение, перенос и удаление правила пересчитывает права."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        UserRole.objects.create(user=self.user, role=self.editor)
+        other = BusinessElement.objects.create(name='products')
+
+        self.editor_rule.delete_permission = True
+        self.editor_rule.save()
+        self.assertEqual(
+            self.flags(),
+            {self.element.id: READ | UPDATE_ALL | DELETE}
+        )
+
+        self.editor_rule.element = other
+        self.editor_rule.save()
+        self.assertEqual(
+            self.flags(),
+            {self.element.id: READ, other.id: UPDATE_ALL | DELETE}
+        )
+
+        self.editor_rule.delete()
+        self.assertEqual(self.flags(), {self.element.id: READ})
+
+        self.element.delete()
+        self.assertEqual(self.flags(), {})
+
+    def test_check_and_rebuild_commands(self):
+        """Проверка находит расхождения, пересборка их устраняет."""
+        UserRole.objects.create(user=self.user, role=self.reader)
+        UserEffectivePermission.objects.all().delete()
+
+        with self.assertRaises(CommandError):
+            call_command('check_effective_permissions', stdout=StringIO())
+
+        call_command('rebuild_effective_permissions', stdout=StringIO())
+        self.assertEqual(self.flags(), {self.element.id: READ})
+        call_command('check_effective_permissions', stdout=StringIO())
+
+        UserEffectivePermission.objects.filter(user=self.user).update(flags=0)
+        call_command(
+            'check_effective_permissions',
+            '--fix',
+            stdout=StringIO()
+        )
+        self.assertEqual(self.flags(), {self.element.id: READ})
+
+
+class TenantIsolationTest(TestCase):
+    """Тесты разделения данных RBAC по арендаторам."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.client = APIClient()
+        self.tenants = [
+            Tenant.objects.create(name='Acme', slug='acme'),
+            Tenant.objects.create(name='Globex', slug='globex'),
+        ]
+        self.users = []
+        self.roles = []
+        for tenant in self.tenants:
+            user = User.objects.create_user(
+                email=f'admin@{tenant.slug}.example.com',
+                username=f'admin-{tenant.slug}',
+                first_name='Admin',
+                last_name='User',
+                password='admin123',
+                tenant=tenant
+            )
+            # Одинаковые имена ролей и элементов у разных арендаторов.
+            role = Role.objects.create(name='Admin', tenant=tenant)
+            for name in ('roles', 'access_rules'):
+                element = BusinessElement.objects.create(
+                    name=name,
+                    tenant=tenant
+                )
+                AccessRoleRule.objects.create(
+                    role=role,
+                    element=element,
+                    read_all_permission=True,
+                    create_permission=True
+                )
+            UserRole.objects.create(user=user, role=role)
+            self.users.append(user)
+            self.roles.append(role)
+
+    def test_tenant_copied_from_role(self):
+        """Правила и назначения получают арендатора роли."""
+        for tenant, role in zip(self.tenants, self.roles):
+            self.assertEqual(
+                set(role.access_rules.values_list('tenant_id', flat=True)),
+                {tenant.id}
+            )
+            self.assertEqual(
+                role.user_roles.get().tenant_id,
+                tenant.id
+            )
+
+    def test_lists_scoped_to_tenant(self):
+        """Пользователь видит только роли своего арендатора."""
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.get(reverse('permissions:role-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [role['id'] for role in response.data['results']],
+            [self.roles[0].id]
+        )
+        response = self.client.get(
+            reverse('permissions:role-detail', args=[self.roles[1].id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_within_tenant(self):
+        """Создание проверяет уникальность имени в пределах арендатора."""
+        self.client.force_authenticate(user=self.users[0])
+        url = reverse('permissions:role-list')
+        response = self.client.post(url, {'name': 'Manager'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Role.objects.get(pk=response.data['id']).tenant,
+            self.tenants[0]
+        )
+        response = self.client.post(url, {'name': 'Admin'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_foreign_tenant_objects_rejected(self):
+        """Нельзя сослаться на роль или пользователя другого арендатора."""
+        self.client.force_authenticate(user=self.users[0])
+        element = BusinessElement.objects.get(
+            tenant=self.tenants[0],
+            name='roles'
+        )
+        response = self.client.post(
+            reverse('permissions:access-rule-list'),
+            {'role': self.roles[1].id, 'element': element.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('role', response.data)
+
+    def test_versions_partitioned_by_tenant(self):
+        """Изменения у одного арендатора не меняют версии другого."""
+        scopes = [
+            tenant_scope(scope, tenant.id)
+            for tenant in self.tenants
+            for scope in (CATALOG, POLICY)
+        ]
+        before = [get_version(scope) for scope in scopes]
+        Role.objects.create(name='Viewer', tenant=self.tenants[1])
+        after = [get_version(scope) for scope in scopes]
+        self.assertEqual(after[:2], before[:2])
+        self.assertGreater(after[2], before[2])
+        self.assertGreater(after[3], before[3])
+
+
+class SeedRbacCommandTest(TestCase):
+    """Тесты генерации синтетических данных RBAC."""
+
+    def seed(self, tenant, *args):
+        call_command(
+            'seed_rbac',
+            '--users', '30',
+            '--roles', '6',
+            '--elements', '8',
+            '--roles-per-user', '1-3',
+            '--rules-per-role', '2-4',
+            '--tenant', tenant,
+            *args,
+            stdout=StringIO()
+        )
+
+    def assignments(self, tenant):
+        """Назначения в виде (номер пользователя, номер роли)."""
+        return sorted(
+            (
+                int(username.rsplit('-', 1)[1]),
+                int(role_name.rsplit('_', 1)[1])
+            )
+            for username, role_name in UserRole.objects.filter(
+                tenant__slug=tenant
+            ).values_list('user__username', 'role__name')
+        )
+
+    def test_seed_counts_and_consistency(self):
+        """Созданы все объекты, эффективные права согласованы."""
+        self.seed('acme', '--role-distribution', 'zipf')
+        users = User.objects.filter(tenant__slug='acme')
+        self.assertEqual(users.count(), 30)
+        self.assertEqual(Role.objects.filter(tenant__slug='acme').count(), 6)
+        self.assertTrue(
+            BusinessElement.objects.filter(
+                tenant__slug='acme',
+                name='roles'
+            ).exists()
+        )
+        per_user = UserRole.objects.filter(tenant__slug='acme').count()
+        self.assertGreaterEqual(per_user, 30)
+        self.assertLessEqual(per_user, 90)
+        self.assertTrue(users.first().check_password('seedpass123'))
+        call_command('check_effective_permissions', stdout=StringIO())
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый seed дает одинаковые назначения."""
+        self.seed('acme')
+        self.seed('globex')
+        self.assertEqual(self.assignments('acme'), self.assignments('globex'))
+        self.seed('initech', '--seed', '7')
+        self.assertNotEqual(
+            self.assignments('acme'),
+            self.assignments('initech')
+        )
+
+    def test_reseed_requires_clear(self):
+        """Повторный запуск требует --clear и заменяет данные."""
+        self.seed('acme')
+        with self.assertRaises(CommandError):
+            self.seed('acme')
+        self.seed('acme', '--clear')
+        self.assertEqual(User.objects.filter(tenant__slug='acme').count(), 30)
+
+    def test_refresh_limited_to_tenant(self):
+        """Пересчет после генерации не трогает других арендаторов."""
+        user = User.objects.create_user(
+            email='outsider@example.com',
+            username='outsider',
+            first_name='Out',
+            last_name='Sider',
+            password='outsiderpass123'
+        )
+        element = BusinessElement.objects.create(name='orders')
+        # Расхождение у пользователя другого арендатора остается.
+        UserEffectivePermission.objects.create(
+            user=user, element=element, flags=1
+        )
+        self.seed('acme')
+        self.assertTrue(
+            UserEffectivePermission.objects.filter(user=user).exists()
+        )
+
+    def test_clear_refreshes_other_holders(self):
+        """--clear пересчитывает права и версии владельцев удаленных ролей."""
+        self.seed('acme')
+        tenant = get_tenant('acme')
+        user = User.objects.create_user(
+            email='holder@example.com',
+            username='holder',
+            first_name='Role',
+            last_name='Holder',
+            password='holderpass123',
+            tenant=tenant
+        )
+        role = Role.objects.filter(
+            tenant=tenant, access_rules__element__name='roles'
+        ).first()
+        role.access_rules.filter(element__name='roles').update(
+            read_all_permission=True
+        )
+        UserRole.objects.create(user=user, role=role)
+        self.assertTrue(authorize(user, 'roles', 'read'))
+        version = get_permissions_version(user)
+
+        self.seed('acme', '--clear', '--rules-per-role', '0')
+        self.assertNotEqual(get_permissions_version(user), version)
+        self.assertFalse(authorize(user, 'roles', 'read'))
+
+
+class WarmupTest(TestCase):
+    """Тесты прогрева кэшей."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.users = []
+        role = Role.objects.create(name='Warm Role')
+        element = BusinessElement.objects.create(name='roles')
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_all_permission=True
+        )
+        for i in range(3):
+            user = User.objects.create_user(
+                email=f'warm{i}@example.com',
+                username=f'warm{i}',
+                first_name='Warm',
+                last_name='User',
+                password='warmpass123',
+                last_login=timezone.now() - timezone.timedelta(days=i)
+            )
+            UserRole.objects.create(user=user, role=role)
+            self.users.append(user)
+        rbac_cache.clear()
+
+    def test_warm_up_loads_hot_users_and_policy(self):
+        """После прогрева проверки недавних пользователей не ходят в БД."""
+        report = warm_up(users=2)
+        self.assertEqual(
+            [name for name, _, _ in report],
+            ['settings', 'urls', 'catalog', 'policy', 'users']
+        )
+        self.assertEqual(dict((n, c) for n, c, _ in report)['users'], 2)
+
+        permission = HasPermission()
+        tenant_id = self.users[0].tenant_id
+        with CaptureQueriesContext(connection) as captured:
+            for user in self.users[:2]:
+                self.assertTrue(
+                    permission._check_permission(user, 'roles', 'read', None)
+                )
+            cells = matrix.get_cells(
+                tenant_id, get_version(tenant_scope(POLICY, tenant_id))
+            )
+        self.assertEqual(len(captured), 0)
+        self.assertEqual(len(cells), 1)
+
+        # Давно входивший пользователь не прогревался.
+        with CaptureQueriesContext(connection) as captured:
+            permission._check_permission(self.users[2], 'roles', 'read', None)
+        self.assertEqual(len(captured), 1)
+
+    def test_command_reports_duration(self):
+        """Команда выводит время прогрева по шагам."""
+        out = StringIO()
+        call_command('warm_caches', '--users', '3', stdout=out)
+        self.assertIn('Прогрев кэшей за', out.getvalue())
+        self.assertIn('users: 3', out.getvalue())
+
+    def test_startup_keeps_worker_pools(self):
+        """Прогрев в воркере возвращает соединения, но не закрывает пулы."""
+        with override_settings(WARMUP_ON_STARTUP=True), \
+                mock.patch.object(connections, 'close_all') as close_all, \
+                mock.patch.object(
+                    connection, 'close_pool', create=True
+                ) as close_pool, \
+                self.assertLogs('permissions.warmup', 'INFO') as logs:
+            warm_on_startup()
+        close_all.assert_called_once_with()
+        close_pool.assert_not_called()
+        self.assertIn('Прогрев кэшей за', logs.output[0])
+
+    def test_gunicorn_master_closes_pools(self):
+        """Мастер gunicorn закрывает соединения и пулы до запуска воркеров."""
+        config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        with mock.patch.object(connections, 'close_all') as close_all, \
+                mock.patch.object(
+                    connection, 'close_pool', create=True
+                ) as close_pool:
+            config['when_ready'](server=None)
+        close_all.assert_called_once_with()
+        close_pool.assert_called_once_with()
+
+
+class AsyncPermissionTest(TestCase):
+    """Тесты асинхронного пути аутентификации и проверки прав."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.user = User.objects.create_user(
+            email='async@example.com',
+            username='async',
+            first_name='Async',
+            last_name='User',
+            password='asyncpass123'
+        )
+        self.role = Role.objects.create(name='Async Role')
+        element = BusinessElement.objects.create(name='roles')
+        AccessRoleRule.objects.create(
+            role=self.role, element=element, read_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=self.role)
+
+    def view(self, actions, sync=False):
+        class AsyncRoleViewSet(
+            AsyncAPIViewMixin,
+            TenantScopedViewMixin,
+            viewsets.GenericViewSet
+        ):
+            queryset = Role.objects.all()
+            serializer_class = RoleSerializer
+            permission_classes = [IsAuthenticated, HasPermission]
+            business_element = 'roles'
+
+            async def list(self, request):
+                return Response([
+                    name async for name in self.get_queryset().order_by(
+                        'name'
+                    ).values_list('name', flat=True)
+                ])
+
+            async def retrieve(self, request, pk=None):
+                role = await self.aget_object()
+                return Response({'name': role.name})
+
+        class SyncHandlersViewSet(
+            AsyncAPIViewMixin,
+            TenantScopedViewMixin,
+            mixins.ListModelMixin,
+            viewsets.GenericViewSet
+        ):
+            # Обработчики DRF синхронные и читают ORM.
+            queryset = Role.objects.order_by('name')
+            serializer_class = RoleSerializer
+            permission_classes = [IsAuthenticated, HasPermission]
+            business_element = 'roles'
+
+        if sync:
+            return SyncHandlersViewSet.as_view(actions)
+        return AsyncRoleViewSet.as_view(actions)
+
+    def call(self, actions, user=None, sync=False, **kwargs):
+        headers = {}
+        if user is not None:
+            token = tokens_for_user(user)['access']
+            headers['Authorization'] = f'Bearer {token}'
+        request = AsyncRequestFactory().get('/', headers=headers)
+        response = async_to_sync(self.view(actions, sync))(request, **kwargs)
+        response.render()
+        return response
+
+    def test_async_path_used(self):
+        """Асинхронный view проверяет права корутинами."""
+        with mock.patch.object(
+            HasPermission, 'has_permission', side_effect=AssertionError
+        ):
+            response = self.call({'get': 'list'}, self.user)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, ['Async Role'])
+
+    def test_sync_handlers_run_in_thread(self):
+        """Унаследованные синхронные обработчики DRF работают с ORM."""
+        response = self.call({'get': 'list'}, self.user, sync=True)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [role['name'] for role in response.data['results']],
+            ['Async Role']
+        )
+
+    def test_shares_cache_with_sync_path(self):
+        """Права, загруженные асинхронно, читаются синхронным путем из L1."""
+        self.call({'get': 'list'}, self.user)
+
+        with CaptureQueriesContext(connection) as captured:
+            permissions = get_effective_permissions(self.user)
+        self.assertEqual(len(captured), 0)
+        self.assertIn('roles', permissions)
+
+    def test_denied_and_unauthenticated(self):
+        """Без правила - 403, без токена - 401."""
+        other = User.objects.create_user(
+            email='other@example.com',
+            username='other',
+            first_name='Other',
+            last_name='User',
+            password='otherpass123'
+        )
+        self.assertEqual(
+            self.call({'get': 'list'}, other).status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+        self.assertEqual(
+            self.call({'get': 'list'}).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_object_permission_and_tenant(self):
+        """aget_object проверяет права на объект и арендатора."""
+        tenant = Tenant.objects.create(name='Other', slug='other')
+        foreign = Role.objects.create(name='Foreign', tenant=tenant)
+
+        response = self.call(
+            {'get': 'retrieve'}, self.user, pk=self.role.pk
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'name': 'Async Role'})
+
+        response = self.call({'get': 'retrieve'}, self.user, pk=foreign.pk)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AuthorizationServiceTest(TestCase):
+    """Тесты API авторизации без DRF (authorize, filter_allowed)."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.user = User.objects.create_user(
+            email='service@example.com',
+            username='service',
+            first_name='Service',
+            last_name='User',
+            password='servicepass123'
+        )
+        self.other = User.objects.create_user(
+            email='other@example.com',
+            username='other',
+            first_name='Other',
+            last_name='User',
+            password='otherpass123'
+        )
+        self.role = Role.objects.create(name='Service Role')
+        self.user_roles = BusinessElement.objects.create(name='user_roles')
+        self.roles = BusinessElement.objects.create(name='roles')
+        AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.user_roles,
+            read_all_permission=True,
+            update_permission=True
+        )
+        AccessRoleRule.objects.create(
+            role=self.role, element=self.roles, update_permission=True
+        )
+        self.own = UserRole.objects.create(user=self.user, role=self.role)
+        self.foreign = [
+            UserRole.objects.create(
+                user=self.other,
+                role=Role.objects.create(name=f'Role {index}')
+            )
+            for index in range(50)
+        ]
+
+    def test_filter_allowed_own(self):
+        """Права "свои": только объекты пользователя."""
+        allowed = filter_allowed(
+            self.user, 'user_roles', 'update', UserRole.objects.all()
+        )
+        self.assertEqual(list(allowed), [self.own])
+
+    def test_bulk_decision_single_query(self):
+        """Решение по любому числу объектов - один запрос."""
+        get_effective_permissions(self.user)
+        ids = [self.own.pk] + [user_role.pk for user_role in self.foreign]
+
+        with self.assertNumQueries(1):
+            allowed = allowed_ids(
+                self.user, 'user_roles', 'update', UserRole.objects.all(),
+                ids=ids
+            )
+        self.assertEqual(allowed, {self.own.pk})
+
+        with self.assertNumQueries(1):
+            allowed = allowed_ids(
+                self.user, 'user_roles', 'read', UserRole.objects.all()
+            )
+        self.assertEqual(allowed, set(ids))
+
+    def test_all_flag_limited_to_tenant(self):
+        """Права "все" не открывают объекты другого арендатора."""
+        tenant = Tenant.objects.create(name='Other', slug='other')
+        foreign = UserRole.objects.create(
+            user=User.objects.create_user(
+                email='foreign@example.com',
+                username='foreign',
+                first_name='Foreign',
+                last_name='User',
+                password='foreignpass123',
+                tenant=tenant
+            ),
+            role=Role.objects.create(name='Foreign', tenant=tenant)
+        )
+        allowed = filter_allowed(
+            self.user, 'user_roles', 'read', UserRole.objects.all()
+        )
+        self.assertNotIn(foreign, allowed)
+        self.assertEqual(allowed.count(), 51)
+        self.assertFalse(authorize(self.user, 'user_roles', 'read', foreign))
+
+    def test_no_permission_no_query(self):
+        """Без прав - пустой результат без обращения к БД."""
+        get_effective_permissions(self.user)
+        with self.assertNumQueries(0):
+            allowed = allowed_ids(
+                self.user, 'user_roles', 'delete', UserRole.objects.all()
+            )
+            # У ролей нет владельца: права "свои" ничего не открывают.
+            owned_roles = allowed_ids(
+                self.user, 'roles', 'update', Role.objects.all()
+            )
+        self.assertEqual(allowed, set())
+        self.assertEqual(owned_roles, set())
+
+    def test_authorize(self):
+        """authorize по элементу и по объекту."""
+        self.assertTrue(authorize(self.user, 'user_roles', 'read'))
+        # Права "свои" без объекта не дают доступа.
+        self.assertFalse(authorize(self.user, 'user_roles', 'update'))
+        self.assertTrue(
+            authorize(self.user, 'user_roles', 'update', self.own)
+        )
+        self.assertFalse(
+            authorize(self.user, 'user_roles', 'update', self.foreign[0])
+        )
+        self.assertFalse(authorize(self.user, 'user_roles', 'delete'))
+
+
+class NamespaceTest(TestCase):
+    """Тесты иерархических имен элементов и правил-шаблонов."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.user = User.objects.create_user(
+            email='namespace@example.com',
+            username='namespace',
+            first_name='Namespace',
+            last_name='User',
+            password='namespacepass123'
+        )
+        self.role = Role.objects.create(name='Orders')
+        self.elements = {
+            name: BusinessElement.objects.create(name=name)
+            for name in ('orders', 'orders.*', 'orders.items',
+                         'orders.refunds')
+        }
+        self.wildcard_rule = AccessRoleRule.objects.create(
+            role=self.role,
+            element=self.elements['orders.*'],
+            read_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=self.role)
+
+    def allowed(self, element_name, action='read'):
+        return authorize(self.user, element_name, action)
+
+    def test_trie_most_specific_match(self):
+        """Дерево выбирает самое специфичное имя."""
+        trie = ElementTrie({
+            '*': 1, 'orders.*': 2, 'orders.items': 4, 'orders.items.*': 8,
+        })
+        self.assertEqual(trie.resolve('users'), 1)
+        self.assertEqual(trie.resolve('orders'), 1)
+        self.assertEqual(trie.resolve('orders.refunds'), 2)
+        self.assertEqual(trie.resolve('orders.refunds.lines'), 2)
+        self.assertEqual(trie.resolve('orders.items'), 4)
+        self.assertEqual(trie.resolve('orders.items.lines'), 8)
+        self.assertEqual(ElementTrie({}).resolve('orders'), 0)
+
+    def test_wildcard_rule(self):
+        """Правило на orders.* действует на элементы под orders."""
+        self.assertTrue(self.allowed('orders.items'))
+        self.assertTrue(self.allowed('orders.items.lines'))
+        # Элемента может не быть в справочнике.
+        self.assertTrue(self.allowed('orders.archive'))
+        self.assertFalse(self.allowed('orders'))
+        self.assertFalse(self.allowed('orders.items', 'delete'))
+        # Строка только у шаблона, не у каждого элемента.
+        self.assertEqual(
+            list(self.user.effective_permissions.values_list(
+                'element__name', flat=True
+            )),
+            ['orders.*']
+        )
+
+    def test_specific_rule_narrows_role_wildcard(self):
+        """Явное правило роли перекрывает ее шаблон, но не чужую роль."""
+        AccessRoleRule.objects.create(
+            role=self.role, element=self.elements['orders.refunds']
+        )
+        self.assertFalse(self.allowed('orders.refunds'))
+        self.assertTrue(self.allowed('orders.items'))
+
+        other = Role.objects.create(name='Everything')
+        root = BusinessElement.objects.create(name='*')
+        AccessRoleRule.objects.create(
+            role=other, element=root, read_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=other)
+        self.assertTrue(self.allowed('orders.refunds'))
+        self.assertTrue(self.allowed('orders'))
+
+    def test_wildcard_rule_change_and_rename(self):
+        """Изменение шаблона и переименование элемента пересчитывают права."""
+        AccessRoleRule.objects.create(
+            role=self.role, element=self.elements['orders.refunds']
+        )
+        self.wildcard_rule.read_all_permission = False
+        self.wildcard_rule.delete_all_permission = True
+        self.wildcard_rule.save()
+        self.assertFalse(self.allowed('orders.items'))
+        self.assertTrue(self.allowed('orders.items', 'delete'))
+        self.assertFalse(self.allowed('orders.refunds', 'delete'))
+
+        refunds = BusinessElement.objects.get(name='orders.refunds')
+        refunds.name = 'billing.refunds'
+        refunds.save()
+        self.assertTrue(self.allowed('orders.refunds', 'delete'))
+        self.assertFalse(self.allowed('billing.refunds', 'delete'))
+
+        # Инкрементальные пересчеты совпадают с полным.
+        call_command('check_effective_permissions', stdout=StringIO())
+
+
+class DenyRuleTest(TestCase):
+    """Тесты запрещающих правил и приоритетов."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.user = User.objects.create_user(
+            email='contractor@example.com',
+            username='contractor',
+            first_name='Contractor',
+            last_name='User',
+            password='contractorpass123'
+        )
+        self.staff = Role.objects.create(name='Staff')
+        self.contractor = Role.objects.create(name='Contractor')
+        self.invoices = BusinessElement.objects.create(name='invoices')
+        AccessRoleRule.objects.create(
+            role=self.staff,
+            element=self.invoices,
+            read_all_permission=True,
+            delete_all_permission=True
+        )
+        self.deny = AccessRoleRule.objects.create(
+            role=self.contractor,
+            element=self.invoices,
+            delete_all_permission=True,
+            effect=AccessRoleRule.DENY
+        )
+        UserRole.objects.create(user=self.user, role=self.staff)
+        UserRole.objects.create(user=self.user, role=self.contractor)
+
+    def allowed(self, action):
+        return authorize(self.user, 'invoices', action)
+
+    def test_decide(self):
+        """Бит решает старшее по приоритету правило, при равенстве - запрет."""
+        self.assertEqual(decide([Rule(0, False, 3), Rule(0, True, 2)]), 1)
+        self.assertEqual(decide([Rule(1, False, 3), Rule(0, True, 2)]), 3)
+        self.assertEqual(decide([Rule(0, True, 2), Rule(1, True, 1)]), 0)
+        self.assertEqual(decide([]), 0)
+
+    def test_deny_overrides_other_role(self):
+        """Запрет роли сильнее разрешения другой роли того же приоритета."""
+        self.assertTrue(self.allowed('read'))
+        self.assertFalse(self.allowed('delete'))
+
+    def test_priority(self):
+        """Разрешение с большим приоритетом перекрывает запрет."""
+        rule = self.staff.access_rules.get()
+        rule.priority = 10
+        rule.save()
+        self.assertTrue(self.allowed('delete'))
+
+        self.deny.priority = 100
+        self.deny.save()
+        self.assertFalse(self.allowed('delete'))
+
+    def test_wildcard_deny(self):
+        """Запрет на шаблоне действует вместе с разрешением роли."""
+        everything = BusinessElement.objects.create(name='*')
+        self.deny.delete()
+        AccessRoleRule.objects.create(
+            role=self.contractor,
+            element=everything,
+            read_all_permission=True,
+            delete_all_permission=True,
+            effect=AccessRoleRule.DENY
+        )
+        self.assertFalse(self.allowed('read'))
+        self.assertFalse(self.allowed('delete'))
+        # Нулевые маски без ненулевого шаблона выше не хранятся.
+        self.assertFalse(self.user.effective_permissions.exists())
+
+    def test_matrix_has_denies_and_priorities(self):
+        """Ячейки матрицы хранят запрет и приоритет правила."""
+        cells = get_cells(self.user.tenant_id, 'test')
+        self.assertEqual(
+            cells[(self.staff.pk, self.invoices.pk)],
+            Rule(0, False, READ_ALL | DELETE_ALL)
+        )
+        self.assertEqual(
+            cells[(self.contractor.pk, self.invoices.pk)],
+            Rule(0, True, DELETE_ALL)
+        )
+
+    def test_matrix_deny_with_higher_priority_masks_allow(self):
+        """По матрице запрет с большим приоритетом снимает разрешение."""
+        rule = self.staff.access_rules.get()
+        rule.priority = 10
+        rule.save()
+        self.deny.priority = 100
+        self.deny.save()
+
+        tenant_id = self.user.tenant_id
+        version = get_version(tenant_scope(POLICY, tenant_id))
+        data = matrix.encode(get_cells(tenant_id, version), version, 'sparse')
+        staff = data['roles'].index(self.staff.pk)
+        contractor = data['roles'].index(self.contractor.pk)
+        self.assertEqual(data['effects'], sorted([
+            [staff, 0, AccessRoleRule.ALLOW, 10],
+            [contractor, 0, AccessRoleRule.DENY, 100],
+        ]))
+
+        effects = {
+            (role, element): (effect == AccessRoleRule.DENY, priority)
+            for role, element, effect, priority in data['effects']
+        }
+        rules = [
+            Rule(priority, deny, mask)
+            for role, element, mask in data['cells']
+            for deny, priority in [effects.get((role, element), (False, 0))]
+        ]
+        self.assertEqual(decide(rules), READ_ALL)
+        self.assertTrue(self.allowed('read'))
+        self.assertFalse(self.allowed('delete'))
+
+
+class UserRoleValidityTest(TestCase):
+    """Тесты назначений ролей с ограниченным сроком действия."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.now = timezone.now()
+        self.hour = timedelta(hours=1)
+        self.user = User.objects.create_user(
+            email='temporary@example.com',
+            username='temporary',
+            first_name='Temporary',
+            last_name='User',
+            password='temporarypass123'
+        )
+        self.role = Role.objects.create(name='Temporary')
+        AccessRoleRule.objects.create(
+            role=self.role,
+            element=BusinessElement.objects.create(name='roles'),
+            read_all_permission=True
+        )
+
+    def allowed(self, at=None):
+        """Право на чтение ролей в момент at (с холодным кэшем)."""
+        rbac_cache.clear()
+        with mock.patch(
+            'django.utils.timezone.now', return_value=at or self.now
+        ):
+            return authorize(self.user, 'roles', 'read')
+
+    def test_expiry(self):
+        """Истекшее назначение перестает действовать при чтении прав."""
+        UserRole.objects.create(
+            user=self.user, role=self.role, expires_at=self.now + self.hour
+        )
+        self.assertTrue(self.allowed())
+        # Кэш живет не дольше срока назначения.
+        self.assertLessEqual(
+            _cache_timeout(get_effective_permissions(self.user)), 3600
+        )
+
+        self.assertFalse(self.allowed(self.now + 2 * self.hour))
+        self.assertFalse(self.user.effective_permissions.exists())
+
+    def test_reread_after_expiry_uses_primary(self):
+        """Пересчитанные при чтении права читаются из основной БД."""
+        UserRole.objects.create(
+            user=self.user, role=self.role, expires_at=self.now + self.hour
+        )
+        aliases = []
+        rows = authorization._rows
+
+        def read_rows(user):
+            aliases.append(
+                PrimaryReplicaRouter().db_for_read(UserEffectivePermission)
+            )
+            return list(rows(user).using('default'))
+
+        with override_settings(DATABASE_REPLICAS=['replica_0']), \
+                replica_reads(self.user), \
+                mock.patch.object(authorization, '_rows', read_rows), \
+                mock.patch(
+                    'django.utils.timezone.now',
+                    return_value=self.now + 2 * self.hour
+                ):
+            masks = authorization._compute_effective_permissions(self.user)
+
+        self.assertEqual(aliases, ['replica_0', 'default'])
+        self.assertNotIn('roles', masks)
+
+    def test_valid_from(self):
+        """Назначение начинает действовать с valid_from."""
+        UserRole.objects.create(
+            user=self.user, role=self.role, valid_from=self.now + self.hour
+        )
+        self.assertFalse(self.allowed())
+        # Строка без прав хранит момент начала действия.
+        self.assertEqual(
+            self.user.effective_permissions.get().valid_until,
+            self.now + self.hour
+        )
+        self.assertTrue(self.allowed(self.now + 2 * self.hour))
+        self.assertIsNone(self.user.effective_permissions.get().valid_until)
+
+    def test_already_expired(self):
+        """Назначение с прошедшим сроком прав не дает."""
+        UserRole.objects.create(
+            user=self.user, role=self.role, expires_at=self.now - self.hour
+        )
+        self.assertFalse(self.allowed())
+
+    def test_period_constraint(self):
+        """Начало срока не может быть позже окончания."""
+        with self.assertRaises(IntegrityError):
+            UserRole.objects.create(
+                user=self.user,
+                role=self.role,
+                valid_from=self.now,
+                expires_at=self.now - self.hour
+            )
+
+    def test_sweeper(self):
+        """sweep_user_roles удаляет истекшие назначения пачками."""
+        users = [self.user] + [
+            User.objects.create_user(
+                email=f'expired{index}@example.com',
+                username=f'expired{index}',
+                first_name='Expired',
+                last_name='User',
+                password='expiredpass123'
+            )
+            for index in range(2)
+        ]
+        for user in users:
+            UserRole.objects.create(
+                user=user, role=self.role, expires_at=self.now + self.hour
+            )
+        kept = UserRole.objects.create(
+            user=users[1], role=Role.objects.create(name='Permanent')
+        )
+        # Срок истек без сигналов: таблица прав еще не пересчитана.
+        UserRole.objects.filter(role=self.role).update(
+            expires_at=self.now - self.hour
+        )
+        version = get_version(user_scope(self.user.pk))
+
+        output = StringIO()
+        call_command('sweep_user_roles', '--batch-size', '2', stdout=output)
+
+        self.assertIn('Удалено истекших назначений: 3', output.getvalue())
+        self.assertEqual(list(UserRole.objects.all()), [kept])
+        self.assertFalse(self.user.effective_permissions.exists())
+        self.assertNotEqual(get_version(user_scope(self.user.pk)), version)
+
+
+class CacheInvalidationTest(TestCase):
+    """Тесты рассылки инвалидаций кэша прав между процессами."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.user = User.objects.create_user(
+            email='listener@example.com',
+            username='listener',
+            first_name='Listener',
+            last_name='User',
+            password='listenerpass123'
+        )
+        self.listener = Listener()
+
+    def test_enabled(self):
+        """По умолчанию рассылка включена только для LocMemCache."""
+        self.assertTrue(enabled())
+        redis = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            },
+        }
+        with override_settings(CACHES=redis):
+            self.assertFalse(enabled())
+        with override_settings(RBAC_INVALIDATION_BUS='False'):
+            self.assertFalse(enabled())
+
+    def test_publish_in_transaction(self):
+        """Изменение прав пишет событие в своей транзакции."""
+        role = Role.objects.create(name='Published')
+        CacheInvalidation.objects.all().delete()
+        UserRole.objects.create(user=self.user, role=role)
+        self.assertEqual(
+            list(CacheInvalidation.objects.values_list('scope', flat=True)),
+            [user_scope(self.user.pk)]
+        )
+
+        CacheInvalidation.objects.all().delete()
+        try:
+            with transaction.atomic():
+                UserRole.objects.filter(user=self.user).delete()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(CacheInvalidation.objects.exists())
+
+    def test_poll_applies_foreign_events(self):
+        """Слушатель сбрасывает только области из событий других процессов."""
+        scope = user_scope(self.user.pk)
+        policy = tenant_scope(POLICY, self.user.tenant_id)
+        versions = get_version(scope), get_version(policy)
+        self.listener.poll()
+
+        CacheInvalidation.objects.create(scope=scope, origin='other:1')
+        CacheInvalidation.objects.create(
+            scope=policy, origin=self.listener.origin
+        )
+        self.assertEqual(self.listener.poll(), 1)
+        self.assertEqual(get_version(scope), versions[0] + 1)
+        self.assertEqual(get_version(policy), versions[1])
+
+        # Прочитанные события не применяются повторно.
+        self.assertEqual(self.listener.poll(), 0)
+        self.assertEqual(get_version(scope), versions[0] + 1)
+
+    def test_permissions_reloaded_after_event(self):
+        """После события слушателя права читаются заново."""
+        role = Role.objects.create(name='Remote')
+        AccessRoleRule.objects.create(
+            role=role,
+            element=BusinessElement.objects.create(name='remote'),
+            read_all_permission=True
+        )
+        self.assertFalse(authorize(self.user, 'remote', 'read'))
+        # Назначение другим процессом: версии этого процесса не меняются.
+        with mock.patch('permissions.signals.bump_version'):
+            UserRole.objects.create(user=self.user, role=role)
+        self.assertFalse(authorize(self.user, 'remote', 'read'))
+
+        self.listener.poll()
+        CacheInvalidation.objects.create(
+            scope=user_scope(self.user.pk), origin='other:1'
+        )
+        self.listener.poll()
+        self.assertTrue(authorize(self.user, 'remote', 'read'))
+
+    def test_prune(self):
+        """Старые события удаляются."""
+        old = CacheInvalidation.objects.create(scope='user:1', origin='a:1')
+        CacheInvalidation.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        fresh = CacheInvalidation.objects.create(scope='user:2', origin='a:1')
+        self.assertEqual(self.listener.prune(), 1)
+        self.assertEqual(list(CacheInvalidation.objects.all()), [fresh])
+
+    def test_writer_prunes_after_commit(self):
+        """Без слушателя старые события удаляет пишущий процесс."""
+        old = CacheInvalidation.objects.create(scope='user:1', origin='a:1')
+        CacheInvalidation.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        role = Role.objects.create(name='Pruning')
+        with mock.patch.object(invalidation, '_pruned_at', 0.0), \
+                self.captureOnCommitCallbacks(execute=True):
+            UserRole.objects.create(user=self.user, role=role)
+            # Удаление не входит в транзакцию изменения.
+            self.assertTrue(
+                CacheInvalidation.objects.filter(pk=old.pk).exists()
+            )
+        self.assertFalse(CacheInvalidation.objects.filter(pk=old.pk).exists())
+
+    def test_prune_command(self):
+        """prune_invalidations удаляет старые события."""
+        CacheInvalidation.objects.create(scope='user:1', origin='a:1')
+        CacheInvalidation.objects.update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        out = StringIO()
+        call_command('prune_invalidations', stdout=out)
+        self.assertIn('Удалено событий инвалидации: 1', out.getvalue())
+        self.assertFalse(CacheInvalidation.objects.exists())
+
+    def test_poll_reads_events_of_long_transactions(self):
+        """Окно слушателя включает начало незакоммиченных транзакций."""
+        scope = user_scope(self.user.pk)
+        CacheInvalidation.objects.create(scope='user:0', origin='other:1')
+        self.listener.poll()
+        version = get_version(scope)
+
+        # Событие транзакции, начатой минуту назад и закоммиченной только
+        # сейчас: оно старше окна RBAC_INVALIDATION_LOOKBACK.
+        started = timezone.now() - timedelta(minutes=1)
+        late = CacheInvalidation.objects.create(scope=scope, origin='other:1')
+        CacheInvalidation.objects.filter(pk=late.pk).update(
+            created_at=started
+        )
+        with mock.patch.object(
+            self.listener, '_in_flight', return_value=started
+        ):
+            self.assertEqual(self.listener.poll(), 1)
+        self.assertEqual(get_version(scope), version + 1)
+
+
+class PolicyChangeFeedTest(TestCase):
+    """Тесты ленты изменений политики."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        settings_override = override_settings(POLICY_FEED_SETTLE_SECONDS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='mirror@example.com',
+            username='mirror',
+            first_name='Mirror',
+            last_name='Service',
+            password='mirrorpass123'
+        )
+        self.role = Role.objects.create(name='Mirror')
+        for name in ('access_rules', 'roles', 'business_elements'):
+            AccessRoleRule.objects.create(
+                role=self.role,
+                element=BusinessElement.objects.create(name=name),
+                read_all_permission=True
+            )
+        UserRole.objects.create(user=self.user, role=self.role)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('permissions:changes')
+
+    def feed(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_mirror(self):
+        """Потребитель поддерживает копию по страницам изменений."""
+        mirror = {}
+        version = 0
+        while True:
+            page = self.feed(since=version, limit=2)
+            for change in page['changes']:
+                key = change['type'], change['id']
+                if change['deleted']:
+                    mirror.pop(key, None)
+                else:
+                    mirror[key] = change['data']
+            version = page['version']
+            if not page['has_more']:
+                break
+        self.assertEqual(mirror[('role', self.role.pk)]['name'], 'Mirror')
+        self.assertEqual(
+            len([key for key in mirror if key[0] == 'access_rule']), 3
+        )
+        # Назначения ролей пользователь читать не может.
+        self.assertFalse([key for key in mirror if key[0] == 'user_role'])
+
+        rule = AccessRoleRule.objects.filter(role=self.role).first()
+        rule.delete_all_permission = True
+        rule.save()
+        self.role.description = 'Изменена'
+        self.role.save()
+        self.role.description = 'Изменена дважды'
+        self.role.save()
+        other = Role.objects.create(name='Removed')
+        other_id = other.pk
+        other.delete()
+
+        page = self.feed(since=version)
+        latest = {
+            (change['type'], change['id']): change
+            for change in page['changes']
+        }
+        # Три изменения роли сведены к последнему.
+        self.assertEqual(len(page['changes']), 3)
+        self.assertEqual(
+            latest['role', self.role.pk]['data']['description'],
+            'Изменена дважды'
+        )
+        self.assertTrue(
+            latest['access_rule', rule.pk]['data']['delete_all_permission']
+        )
+        self.assertEqual(
+            latest['role', other_id],
+            {
+                'version': page['version'],
+                'type': 'role',
+                'id': other_id,
+                'deleted': True,
+                'data': None,
+            }
+        )
+        self.assertEqual(self.feed(since=page['version'])['changes'], [])
+
+    def test_cascade_tombstones(self):
+        """Каскадное удаление дает tombstone'ы связанных объектов."""
+        rule = AccessRoleRule.objects.create(
+            role=self.role,
+            element=BusinessElement.objects.create(name='orders'),
+            read_permission=True
+        )
+        version = self.feed()['version']
+        rule.element.delete()
+        deleted = {
+            (change['type'], change['id'])
+            for change in self.feed(since=version)['changes']
+            if change['deleted']
+        }
+        self.assertEqual(
+            deleted,
+            {('access_rule', rule.pk), ('business_element', rule.element_id)}
+        )
+
+    def test_settle_window(self):
+        """Свежие записи журнала не выдаются до окончания окна."""
+        version = self.feed()['version']
+        Role.objects.create(name='Fresh')
+        with self.settings(POLICY_FEED_SETTLE_SECONDS=60):
+            page = self.feed(since=version)
+        self.assertEqual(page, {
+            'version': version, 'has_more': False, 'changes': [],
+        })
+
+    def test_commit_ordered_journal(self):
+        """
+        На PostgreSQL запись журнала блокирует журнал арендатора до
+        коммита, и окно выдержки не нужно.
+        """
+        locks = []
+
+        def intercept(execute, sql, params, many, context):
+            if 'pg_advisory_xact_lock' in sql:
+                locks.append(params)
+                return None
+            return execute(sql, params, many, context)
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                connection.execute_wrapper(intercept):
+            feed._lock_journal([2, 1, 2])
+        self.assertEqual(
+            locks, [[feed.JOURNAL_LOCK, 1], [feed.JOURNAL_LOCK, 2]]
+        )
+
+        version = self.feed()['version']
+        role = Role.objects.create(name='Committed')
+        with self.settings(POLICY_FEED_SETTLE_SECONDS=60), \
+                mock.patch.object(
+                    feed, '_commit_ordered', return_value=True
+                ):
+            page = self.feed(since=version)
+        self.assertEqual(
+            [(change['type'], change['id']) for change in page['changes']],
+            [('role', role.pk)]
+        )
+
+    def test_invalid_params(self):
+        """Некорректные since и limit отклоняются."""
+        for params in ({'since': 'abc'}, {'since': -1}, {'limit': 0}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+
+    def test_compact(self):
+        """Сжатие журнала оставляет последнюю запись каждого объекта."""
+        for description in ('one', 'two', 'three'):
+            self.role.description = description
+            self.role.save()
+        before = self.feed()
+        self.assertGreater(compact(), 0)
+        self.assertEqual(PolicyChange.objects.filter(
+            kind=PolicyChange.ROLE, object_id=self.role.pk
+        ).count(), 1)
+        self.assertEqual(self.feed(), before)
+
+    def test_sweeper_tombstones(self):
+        """sweep_user_roles пишет tombstone'ы удаленных назначений."""
+        user_role = UserRole.objects.create(
+            user=User.objects.create_user(
+                email='expired@example.com',
+                username='expired',
+                first_name='Expired',
+                last_name='User',
+                password='expiredpass123'
+            ),
+            role=self.role,
+            expires_at=timezone.now() + timedelta(hours=1)
+        )
+        UserRole.objects.filter(pk=user_role.pk).update(
+            expires_at=timezone.now() - timedelta(hours=1)
+        )
+        call_command('sweep_user_roles', stdout=StringIO())
+        page = changes(
+            self.user.tenant_id, 0, 1000, [PolicyChange.USER_ROLE]
+        )
+        self.assertIn(
+            {
+                'version': page['version'],
+                'type': 'user_role',
+                'id': user_role.pk,
+                'deleted': True,
+                'data': None,
+            },
+            page['changes']
+        )
+
+
+class ForwardAuthTest(TestCase):
+    """Тесты forward-auth для обратных прокси."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        self.user = User.objects.create_user(
+            email='proxy@example.com',
+            username='proxy',
+            first_name='Proxy',
+            last_name='User',
+            password='proxypass123'
+        )
+        role = Role.objects.create(name='Orders reader')
+        AccessRoleRule.objects.create(
+            role=role,
+            element=BusinessElement.objects.create(name='orders'),
+            read_all_permission=True
+        )
+        UserRole.objects.create(user=self.user, role=role)
+        self.token = tokens_for_user(self.user)['access']
+        self.url = reverse('permissions:forward-auth')
+
+    def check(self, token=None, **headers):
+        if token is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        return self.client.get(self.url, **headers)
+
+    def test_allowed(self):
+        """Разрешенный запрос: 200 и заголовки пользователя."""
+        response = self.check(
+            self.token, HTTP_X_RBAC_ELEMENT='orders', HTTP_X_RBAC_ACTION='read'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Auth-User-Id'], str(self.user.pk))
+        self.assertEqual(response['X-Auth-User-Email'], 'proxy@example.com')
+        self.assertEqual(
+            response['X-Auth-Tenant-Id'], str(self.user.tenant_id)
+        )
+        # Остальные middleware не выполнялись.
+        self.assertNotIn('X-Frame-Options', response)
+
+    def test_warm_check_without_queries(self):
+        """С теплым кэшем проверка не обращается к БД."""
+        self.check(
+            self.token, HTTP_X_RBAC_ELEMENT='orders', HTTP_X_RBAC_ACTION='read'
+        )
+        with self.assertNumQueries(0):
+            response = self.check(
+                self.token,
+                HTTP_X_RBAC_ELEMENT='orders',
+                HTTP_X_ORIGINAL_METHOD='GET'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_denied(self):
+        """Без прав или без элемента - 403."""
+        cases = (
+            {'HTTP_X_RBAC_ELEMENT': 'orders', 'HTTP_X_RBAC_ACTION': 'delete'},
+            {
+                'HTTP_X_RBAC_ELEMENT': 'orders',
+                'HTTP_X_FORWARDED_METHOD': 'POST',
+            },
+            {'HTTP_X_RBAC_ELEMENT': 'orders', 'HTTP_X_RBAC_ACTION': 'drop'},
+            {'HTTP_X_RBAC_ELEMENT': 'invoices', 'HTTP_X_RBAC_ACTION': 'read'},
+            {'HTTP_X_RBAC_ACTION': 'read'},
+        )
+        for headers in cases:
+            with self.subTest(headers=headers):
+                self.assertEqual(
+                    self.check(self.token, **headers).status_code, 403
+                )
+
+    def test_query_params(self):
+        """Элемент и действие можно передать параметрами URL."""
+        response = self.client.get(
+            self.url,
+            {'element': 'orders', 'action': 'read'},
+            HTTP_AUTHORIZATION=f'Bearer {self.token}'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_unauthenticated(self):
+        """Без действующего токена - 401."""
+        for token in (None, 'broken'):
+            response = self.check(token, HTTP_X_RBAC_ELEMENT='orders')
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+        # Пользователя перевели к другому арендатору.
+        self.user.tenant = Tenant.objects.create(slug='other', name='Other')
+        self.user.save()
+        response = self.check(self.token, HTTP_X_RBAC_ELEMENT='orders')
+        self.assertEqual(response.status_code, 401)
+
+
+class PolicySnapshotTest(TestCase):
+    """Тесты снимка политики и команды export_policy."""
+
+    def setUp(self):
+        """Настройка тестовых данных."""
+        rbac_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/policy.rbac'
+        self.user = User.objects.create_user(
+            email='snapshot@example.com',
+            username='snapshot',
+            first_name='Snapshot',
+            last_name='User',
+            password='snapshotpass123'
+        )
+        self.staff = Role.objects.create(name='Staff')
+        self.auditor = Role.objects.create(name='Auditor')
+        self.elements = {
+            name: BusinessElement.objects.create(name=name)
+            for name in ('orders', 'orders.*', 'orders.refunds', 'invoices')
+        }
+        self.rule(self.staff, 'orders.*', read_all_permission=True,
+                  update_permission=True)
+        self.rule(self.staff, 'invoices', read_all_permission=True,
+                  delete_all_permission=True)
+        self.rule(self.auditor, 'orders.refunds', read_all_permission=True,
+                  effect=AccessRoleRule.DENY)
+        self.rule(self.auditor, 'invoices', delete_all_permission=True,
+                  effect=AccessRoleRule.DENY, priority=-1)
+        UserRole.objects.create(user=self.user, role=self.staff)
+        UserRole.objects.create(user=self.user, role=self.auditor)
+
+    def rule(self, role, name, **fields):
+        return AccessRoleRule.objects.create(
+            role=role, element=self.elements[name], **fields
+        )
+
+    def export(self, *args):
+        call_command(
+            'export_policy', '--output', self.path, *args, stdout=StringIO()
+        )
+        snapshot = PolicySnapshot(self.path)
+        self.addCleanup(snapshot.close)
+        return snapshot
+
+    def test_matches_authorize(self):
+        """Решения снимка совпадают с решениями сервиса."""
+        snapshot = self.export()
+        role_ids = [self.staff.pk, self.auditor.pk]
+        for name in ('orders', 'orders.items', 'orders.refunds',
+                     'orders.refunds.lines', 'invoices', 'users'):
+            for action in ('read', 'create', 'update', 'delete'):
+                with self.subTest(element=name, action=action):
+                    self.assertEqual(
+                        snapshot.decide(role_ids, name, action),
+                        authorize(self.user, name, action)
+                    )
+        self.assertTrue(snapshot.decide([self.staff.pk], 'orders.refunds',
+                                        'read'))
+        self.assertFalse(snapshot.decide(role_ids, 'orders.refunds', 'read'))
+        self.assertTrue(snapshot.decide(role_ids, 'invoices', 'delete'))
+
+    def test_owner_and_unknown_roles(self):
+        """Права на свои объекты - только с owner; чужие роли без прав."""
+        snapshot = self.export()
+        self.assertFalse(snapshot.decide([self.staff.pk], 'orders.items',
+                                         'update'))
+        self.assertTrue(snapshot.decide([self.staff.pk], 'orders.items',
+                                        'update', owner=True))
+        self.assertFalse(snapshot.decide([0, 10 ** 6], 'invoices', 'read'))
+        self.assertFalse(snapshot.decide([], 'invoices', 'read'))
+        self.assertFalse(snapshot.decide([self.staff.pk], 'invoices', 'drop'))
+
+    def test_header(self):
+        """Заголовок: арендатор, версия ленты, индексы элементов и ролей."""
+        with self.settings(POLICY_FEED_SETTLE_SECONDS=0):
+            snapshot = self.export()
+        self.assertEqual(snapshot.tenant_id, self.user.tenant_id)
+        self.assertEqual(
+            snapshot.version, PolicyChange.objects.latest('id').id
+        )
+        self.assertEqual(
+            snapshot.elements(),
+            ['invoices', 'orders', 'orders.*', 'orders.refunds']
+        )
+        self.assertEqual(
+            list(snapshot.role_ids), sorted([self.staff.pk, self.auditor.pk])
+        )
+
+    def test_version_excludes_unsettled_changes(self):
+        """Версия снимка не включает записи, еще не выданные лентой."""
+        settled = PolicyChange.objects.latest('id')
+        PolicyChange.objects.update(
+            created_at=timezone.now() - timedelta(minutes=1)
+        )
+        Role.objects.create(name='Fresh')
+        with self.settings(POLICY_FEED_SETTLE_SECONDS=30):
+            snapshot = self.export()
+        self.assertEqual(snapshot.version, settled.id)
+
+    def test_tenant_isolation(self):
+        """Снимок содержит только политику выбранного арендатора."""
+        tenant = Tenant.objects.create(slug='other', name='Other')
+        role = Role.objects.create(name='Staff', tenant=tenant)
+        element = BusinessElement.objects.create(name='orders', tenant=tenant)
+        AccessRoleRule.objects.create(
+            role=role, element=element, read_all_permission=True
+        )
+        snapshot = self.export('--tenant', 'other')
+        self.assertEqual(snapshot.elements(), ['orders'])
+        self.assertEqual(list(snapshot.role_ids), [role.pk])
+        self.assertTrue(snapshot.decide([role.pk], 'orders', 'read'))
+        self.assertFalse(snapshot.decide([self.staff.pk], 'invoices', 'read'))
+
+        with self.assertRaises(CommandError):
+            self.export('--tenant', 'missing')
+
+    def test_large_tenant_id(self):
+        """Идентификатор арендатора хранится как uint64."""
+        tenant_id = 2 ** 40 + 1
+        with open(self.path, 'wb') as file:
+            file.write(pack(tenant_id, 7, 0, ['orders'], {}))
+        snapshot = PolicySnapshot(self.path)
+        self.addCleanup(snapshot.close)
+        self.assertEqual(snapshot.tenant_id, tenant_id)
+        self.assertEqual(snapshot.version, 7)
+        self.assertEqual(snapshot.elements(), ['orders'])
+
+    def test_invalid_file(self):
+        """Чужой или обрезанный файл не открывается."""
+        self.export().close()
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        for broken in (b'', b'x' * len(data), data[:-1]):
+            with open(self.path, 'wb') as file:
+                file.write(broken)
+            with self.subTest(size=len(broken)):
+                with self.assertRaises(SnapshotError):
+                    PolicySnapshot(self.path)
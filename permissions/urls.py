@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .forward_auth import forward_auth
 from .views import (
     RoleViewSet,
     BusinessElementViewSet,
     AccessRoleRuleViewSet,
-    UserRoleViewSet
+    UserRoleViewSet,
+    PermissionMatrixView,
+    PolicyChangeFeedView
 )
 
 app_name = 'permissions'
@@ -16,6 +19,9 @@ router.register(r'access-rules', AccessRoleRuleViewSet, basename='access-rule')
 router.register(r'user-roles', UserRoleViewSet, basename='user-role')
 
 urlpatterns = [
+    path('matrix/', PermissionMatrixView.as_view(), name='matrix'),
+    path('changes/', PolicyChangeFeedView.as_view(), name='changes'),
+    path('forward-auth/', forward_auth, name='forward-auth'),
     path('', include(router.urls)),
 ]
 
@@ -0,0 +1,105 @@
+"""
+Счетчики версий данных RBAC.
+
+Версия хранится в общем кэше (L2) и увеличивается при каждой записи в
+соответствующие модели. По версии строятся ETag и ключи кэша, поэтому
+после изменения данных старые записи кэша просто перестают читаться.
+"""
+import time
+
+from django.db import connection, transaction
+
+from backend.cache import rbac_cache
+from backend.db_router import mark_written
+
+# Справочники ролей и бизнес-элементов арендатора.
+CATALOG = 'catalog'
+# Политика доступа арендатора: роли, бизнес-элементы и правила доступа.
+POLICY = 'policy'
+
+
+def tenant_scope(scope, tenant_id):
+    """
+    Область версий CATALOG или POLICY конкретного арендатора.
+
+    Изменения у одного арендатора не сбрасывают кэш остальных.
+    """
+    return f'tenant:{tenant_id}:{scope}'
+
+
+def user_scope(user_id):
+    """Область версий ролей конкретного пользователя."""
+    return f'user:{user_id}'
+
+
+def _key(scope):
+    return f'rbac:version:{scope}'
+
+
+def _initial_version():
+    # Если ключ вытеснен из кэша, новая версия должна быть больше любой
+    # выданной ранее, иначе клиенты получат старые ETag.
+    return time.time_ns() // 1000
+
+
+def get_version(scope):
+    """Текущая версия области данных."""
+    cache = rbac_cache.shared
+    key = _key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_versions(*scopes):
+    """Версии нескольких областей одним обращением к общему кэшу."""
+    cache = rbac_cache.shared
+    keys = [_key(scope) for scope in scopes]
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, _initial_version(), timeout=None)
+        versions.update(await cache.aget_many(missing))
+    return [versions[key] for key in keys]
+
+
+def bump_local(scope):
+    """
+    Увеличить версию области только в кэше текущего процесса, без
+    рассылки (для событий от других процессов, см. permissions.invalidation).
+    """
+    _bump(scope)
+
+
+def _bump(scope):
+    cache = rbac_cache.shared
+    key = _key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+    # Реплики могут еще не получить изменение (backend.db_router).
+    mark_written(scope)
+
+
+def bump_version(*scopes):
+    """
+    Увеличить версии областей данных.
+
+    Внутри транзакции версия увеличивается еще раз после коммита: запрос,
+    прочитавший старые данные до коммита, не закэширует их под новой версией.
+    Если включена рассылка инвалидаций, в той же транзакции записываются
+    события для других процессов.
+    """
+    # Импорт здесь: permissions.invalidation сам импортирует этот модуль.
+    from .invalidation import enabled, publish
+
+    for scope in scopes:
+        _bump(scope)
+    if scopes and enabled():
+        publish(scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: [_bump(scope) for scope in scopes])
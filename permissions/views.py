@@ -1,8 +1,16 @@
+from django.conf import settings
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from backend.db_router import ReplicaReadMixin
+from backend.fast_serializers import FastListMixin
+from backend.metrics import ViewMetricsMixin
+
+from . import feed, matrix
+from .caching import VersionedCacheMixin
 from .models import AccessRoleRule, BusinessElement, Role, UserRole
 from .permissions import HasPermission
 from .serializers import (
@@ -12,25 +20,47 @@ from .serializers import (
     RoleSerializer,
     UserRoleSerializer,
 )
+from .tenancy import TenantScopedViewMixin
+from .versions import CATALOG, POLICY
 
 
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(
+    ViewMetricsMixin,
+    TenantScopedViewMixin,
+    ReplicaReadMixin,
+    VersionedCacheMixin,
+    viewsets.ModelViewSet
+):
     """ViewSet для управления ролями."""
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = [IsAuthenticated, HasPermission]
     business_element = 'roles'
+    cache_scope = CATALOG
 
 
-class BusinessElementViewSet(viewsets.ModelViewSet):
+class BusinessElementViewSet(
+    ViewMetricsMixin,
+    TenantScopedViewMixin,
+    ReplicaReadMixin,
+    VersionedCacheMixin,
+    viewsets.ModelViewSet
+):
     """ViewSet для управления бизнес-элементами."""
     queryset = BusinessElement.objects.all()
     serializer_class = BusinessElementSerializer
     permission_classes = [IsAuthenticated, HasPermission]
     business_element = 'business_elements'
+    cache_scope = CATALOG
 
 
-class AccessRoleRuleViewSet(viewsets.ModelViewSet):
+class AccessRoleRuleViewSet(
+    ViewMetricsMixin,
+    TenantScopedViewMixin,
+    ReplicaReadMixin,
+    FastListMixin,
+    viewsets.ModelViewSet
+):
     """ViewSet для управления правилами доступа."""
     queryset = AccessRoleRule.objects.select_related(
         'role',
@@ -41,7 +71,13 @@ class AccessRoleRuleViewSet(viewsets.ModelViewSet):
     business_element = 'access_rules'
 
 
-class UserRoleViewSet(viewsets.ModelViewSet):
+class UserRoleViewSet(
+    ViewMetricsMixin,
+    TenantScopedViewMixin,
+    ReplicaReadMixin,
+    FastListMixin,
+    viewsets.ModelViewSet
+):
     """ViewSet для управления ролями пользователей."""
     queryset = UserRole.objects.select_related('user', 'role').all()
     serializer_class = UserRoleSerializer
@@ -51,15 +87,33 @@ class UserRoleViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], url_path='assign')
     def assign_role(self, request):
         """Назначить роль пользователю."""
-        serializer = AssignRoleSerializer(data=request.data)
+        serializer = AssignRoleSerializer(
+            data=request.data,
+            context={'request': request}
+        )
         if serializer.is_valid():
             user = serializer.validated_data['user']
             role = serializer.validated_data['role']
 
+            period = {
+                'valid_from': serializer.validated_data.get('valid_from'),
+                'expires_at': serializer.validated_data.get('expires_at'),
+            }
             user_role, created = UserRole.objects.get_or_create(
                 user=user,
-                role=role
+                role=role,
+                defaults=period
             )
+            # Повторное назначение задает новый срок действия; сохранение
+            # только при изменении, чтобы не сбрасывать версии прав зря.
+            changed = [
+                field for field, value in period.items()
+                if getattr(user_role, field) != value
+            ]
+            if changed:
+                for field in changed:
+                    setattr(user_role, field, period[field])
+                user_role.save(update_fields=changed)
 
             if created:
                 return Response({
@@ -97,6 +151,7 @@ class UserRoleViewSet(viewsets.ModelViewSet):
 
         try:
             user_role = UserRole.objects.get(
+                tenant_id=request.user.tenant_id,
                 user_id=user_id,
                 role_id=role_id
             )
@@ -109,3 +164,95 @@ class UserRoleViewSet(viewsets.ModelViewSet):
                 {'error': 'Связь пользователя с ролью не найдена'},
                 status=status.HTTP_404_NOT_FOUND
             )
+
+
+class PermissionMatrixView(ReplicaReadMixin, VersionedCacheMixin, APIView):
+    """
+    Матрица прав роль x бизнес-элемент.
+
+    Параметры: ``encoding`` (auto, dense, sparse) и ``since_version`` для
+    получения только изменений с указанной версии политики.
+    """
+    permission_classes = [IsAuthenticated, HasPermission]
+    business_element = 'access_rules'
+    cache_scope = POLICY
+
+    def get(self, request):
+        return self._cached_read(request, self._get_matrix)
+
+    def _get_matrix(self, request):
+        encoding = request.query_params.get('encoding', matrix.AUTO)
+        if encoding not in matrix.ENCODINGS:
+            return Response(
+                {'error': (
+                    'Параметр encoding должен быть одним из: '
+                    + ', '.join(matrix.ENCODINGS)
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        since_version = request.query_params.get('since_version')
+        if since_version is not None:
+            try:
+                since_version = int(since_version)
+            except ValueError:
+                return Response(
+                    {'error': 'Параметр since_version должен быть числом'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        version = self.data_version
+        cells = matrix.get_cells(self.tenant_id, version)
+        if since_version is not None:
+            data = matrix.encode_delta(
+                cells, self.tenant_id, version, since_version
+            )
+            if data is not None:
+                return Response(data, status=status.HTTP_200_OK)
+        # Без since_version или если старого снимка уже нет - полная матрица.
+        return Response(
+            matrix.encode(cells, version, encoding),
+            status=status.HTTP_200_OK
+        )
+
+
+class PolicyChangeFeedView(ReplicaReadMixin, APIView):
+    """
+    Лента изменений ролей, бизнес-элементов, правил и назначений ролей.
+
+    Параметры: ``since`` - последняя примененная версия (0 - с начала
+    журнала) и ``limit`` - число записей журнала на странице. В ленту
+    попадают только типы объектов, которые пользователь может читать
+    целиком (см. permissions.feed).
+    """
+    permission_classes = [IsAuthenticated, HasPermission]
+    business_element = 'access_rules'
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get(
+                'limit', settings.POLICY_FEED_PAGE_SIZE
+            ))
+        except ValueError:
+            return Response(
+                {'error': 'Параметры since и limit должны быть числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if since < 0 or not 0 < limit <= settings.POLICY_FEED_MAX_PAGE_SIZE:
+            return Response(
+                {'error': (
+                    'since не может быть отрицательным, limit должен быть '
+                    f'от 1 до {settings.POLICY_FEED_MAX_PAGE_SIZE}'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            feed.changes(
+                request.user.tenant_id,
+                since,
+                limit,
+                feed.readable_kinds(request.user)
+            ),
+            status=status.HTTP_200_OK
+        )
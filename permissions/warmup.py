@@ -0,0 +1,145 @@
+"""
+Прогрев кэшей перед приемом запросов.
+
+``warm_settings`` без обращения к БД загружает ленивые настройки DRF и
+simplejwt (классы аутентификации, прав, алгоритм и ключ токенов) и
+вызывается из ``PermissionsConfig.ready()``.
+
+``warm_up`` дополнительно строит URL-резолвер, получает версии данных
+арендаторов, загружает снимки политики (роль x элемент) всех арендаторов
+и, если задано, эффективные права N недавно входивших пользователей.
+Его вызывают хук ``post_worker_init`` gunicorn при WARMUP_ON_STARTUP (в
+каждом воркере до приема запросов) и команда ``manage.py warm_caches``.
+"""
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import F
+from django.urls import get_resolver
+
+from . import matrix
+from .authorization import warm_effective_permissions
+from .versions import CATALOG, POLICY, get_version, tenant_scope
+
+logger = logging.getLogger('permissions.warmup')
+
+DRF_SETTINGS = (
+    'DEFAULT_AUTHENTICATION_CLASSES',
+    'DEFAULT_PERMISSION_CLASSES',
+    'DEFAULT_PAGINATION_CLASS',
+    'DEFAULT_RENDERER_CLASSES',
+    'DEFAULT_PARSER_CLASSES',
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+    'DEFAULT_THROTTLE_CLASSES',
+    'EXCEPTION_HANDLER',
+    'PAGE_SIZE',
+)
+
+
+def warm_settings():
+    """Загрузить настройки DRF и simplejwt; число загруженных настроек."""
+    from rest_framework.settings import api_settings as drf_settings
+    from rest_framework_simplejwt.settings import (
+        api_settings as jwt_settings,
+    )
+    from rest_framework_simplejwt.state import token_backend
+
+    for name in DRF_SETTINGS:
+        getattr(drf_settings, name)
+    for name in jwt_settings.defaults:
+        getattr(jwt_settings, name)
+    # Создает объект алгоритма PyJWT.
+    token_backend.get_leeway()
+    return len(DRF_SETTINGS) + len(jwt_settings.defaults)
+
+
+def _warm_urls():
+    resolver = get_resolver()
+    resolver._populate()
+    return len(resolver.reverse_dict)
+
+
+def _tenant_ids():
+    from accounts.models import Tenant
+    return list(Tenant.objects.values_list('pk', flat=True))
+
+
+def _warm_catalog(tenant_ids):
+    for tenant_id in tenant_ids:
+        get_version(tenant_scope(CATALOG, tenant_id))
+    return len(tenant_ids)
+
+
+def _warm_policy(tenant_ids):
+    return matrix.warm({
+        tenant_id: get_version(tenant_scope(POLICY, tenant_id))
+        for tenant_id in tenant_ids
+    })
+
+
+def _warm_users(count):
+    from accounts.models import User
+    users = User.objects.filter(
+        is_active=True, last_login__isnull=False
+    ).order_by(F('last_login').desc())[:count]
+    return warm_effective_permissions(users)
+
+
+def warm_up(users=0):
+    """
+    Прогреть кэши. users - сколько недавно входивших пользователей
+    загрузить. Возвращает [(шаг, число объектов, секунды)].
+    """
+    report = []
+
+    def step(name, function, *args):
+        started = perf_counter()
+        count = function(*args)
+        report.append((name, count, perf_counter() - started))
+
+    step('settings', warm_settings)
+    step('urls', _warm_urls)
+    tenant_ids = _tenant_ids()
+    step('catalog', _warm_catalog, tenant_ids)
+    step('policy', _warm_policy, tenant_ids)
+    if users:
+        step('users', _warm_users, users)
+    return report
+
+
+def format_report(report):
+    total = sum(seconds for _, _, seconds in report)
+    steps = ', '.join(
+        f'{name}: {count} за {seconds * 1000:.1f} мс'
+        for name, count, seconds in report
+    )
+    return f'Прогрев кэшей за {total * 1000:.1f} мс ({steps})'
+
+
+def warm_on_startup():
+    """Прогрев при запуске воркера; ошибки БД не мешают запуску."""
+    if not settings.WARMUP_ON_STARTUP:
+        return
+    try:
+        report = warm_up(settings.WARMUP_USERS)
+    except DatabaseError:
+        logger.warning('Прогрев кэшей пропущен: БД недоступна', exc_info=True)
+        return
+    finally:
+        # Запросы обслуживают другие потоки со своими соединениями; с
+        # DB_POOL close_all() возвращает соединение в пул воркера.
+        connections.close_all()
+    logger.info(format_report(report))
+
+
+def close_pools():
+    """
+    Закрыть пулы соединений psycopg всех баз текущего процесса (мастер
+    gunicorn перед запуском воркеров).
+    """
+    for connection in connections.all():
+        close_pool = getattr(connection, 'close_pool', None)
+        if close_pool is not None:
+            close_pool()